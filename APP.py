@@ -1,97 +1,234 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from docx import Document
-import re
-from docxtpl import DocxTemplate
-import zipfile
+import os
+import shutil
+import time
+
+from configuracion import CAMPOS_CORREO, CAMPOS_CORREO_GRUPO, VARIABLES_GRUPO, configuracion_a_json
+from contexto import FORMATOS_COLUMNA, contextos_por_fila, preparar_textos
+from indice_plantilla import indexar_plantilla
+from ingesta import FORMATOS_BASE, columnas_requeridas, leer_base
+from medicion import Medidor
+from nombres import ReglaNombre, con_extension
+from pdfs import ESTADO_AMBIGUO, ESTADO_NO_ENCONTRADO, IndicePdfs, mapping_de_generados
+from plantilla import hash_bytes
 
 # ------------------------
 # Funciones auxiliares
 # ------------------------
-
-def leer_excel(archivo_subido):
-    try:
-        df = pd.read_excel(archivo_subido)
-        # Creamos un ID interno por fila para usar más adelante
-        if "ID_INTERNO" not in df.columns:
-            df.insert(0, "ID_INTERNO", range(1, len(df) + 1))
-        return df, None
-    except Exception as e:
-        return None, f"Error al leer el Excel: {e}"
-
-def leer_word_como_parrafos(archivo_subido):
-    try:
-        doc = Document(archivo_subido)
-        # Filtramos párrafos vacíos para que la vista previa sea más limpia
-        parrafos = [p.text for p in doc.paragraphs if p.text.strip() != ""]
-        return parrafos, None
-    except Exception as e:
-        return None, f"Error al leer el Word: {e}"
-
-# ------------------------
-# Configuración básica de la app
-# ------------------------
-
-st.set_page_config(
-    page_title="Generador de documentos judiciales",
-    layout="wide"
-)
-
-st.title("📄 Generador de documentos judiciales")
-st.caption("Fase inicial: combinar base en Excel + plantilla Word usando placeholders {{...}}.")
-
-# Estado de sesión
-if "df_base" not in st.session_state:
-    st.session_state.df_base = None
-
-if "parrafos_plantilla" not in st.session_state:
-    st.session_state.parrafos_plantilla = None
-
-if "plantilla_bytes" not in st.session_state:
-    st.session_state.plantilla_bytes = None
-
-if "mapeo_placeholders" not in st.session_state:
-    st.session_state.mapeo_placeholders = {}
-
-if "resultados_docx" not in st.session_state:
-    st.session_state.resultados_docx = None
-
-if "regla_nombre_archivo" not in st.session_state:
-    st.session_state.regla_nombre_archivo = "Memorial_{{RADICADO}}_{{DEMANDADO}}.docx"
-
-col1, col2 = st.columns(2)
+# Cada paso es un fragmento (st.fragment): al interactuar con un widget solo se
+# vuelve a ejecutar ese paso. Cuando un paso cambia algo que usan los pasos
+# siguientes (base, plantilla, vinculación, regla de nombre, ZIP de PDFs) pide
+# una ejecución completa con st.rerun(). Las importaciones pesadas (docxtpl,
+# smtplib, email...) se hacen dentro del paso que las necesita.
+
+@st.cache_resource
+def obtener_diario():
+    from diario import DiarioTrabajos
+
+    # Un solo diario (conexión SQLite) compartido por todas las sesiones
+    return DiarioTrabajos()
+
+@st.cache_resource
+def obtener_almacen():
+    from almacen import AlmacenArtefactos
+    from diario import DIR_TRABAJOS
+
+    # Plantillas, ZIP subidos y salidas en disco; en la sesión solo quedan claves y rutas
+    return AlmacenArtefactos(os.path.join(DIR_TRABAJOS, "artefactos"))
+
+def bytes_plantilla():
+    # None si la plantilla ya fue expulsada del almacén (hay que volver a cargarla)
+    return obtener_almacen().leer(st.session_state.clave_plantilla)
+
+@st.cache_resource
+def obtener_cache_documentos():
+    from cache_documentos import CacheDocumentos
+    from diario import DIR_TRABAJOS
+
+    # Documentos ya generados, por huella de plantilla + valores (compartida entre sesiones)
+    return CacheDocumentos(os.path.join(DIR_TRABAJOS, "cache_documentos"))
+
+# Claves de sesión de las plantillas de correo del paso ⑥
+CLAVES_PLANTILLAS_CORREO = [
+    "plantilla_para",
+    "plantilla_cc",
+    "plantilla_bcc",
+    "plantilla_asunto",
+    "plantilla_cuerpo",
+]
+
+# Claves de sesión de las plantillas del envío agrupado (asunto, cuerpo, línea)
+CLAVES_PLANTILLAS_GRUPO = [
+    "plantilla_grupo_asunto",
+    "plantilla_grupo_cuerpo",
+    "plantilla_grupo_linea",
+]
+
+# Valores iniciales de esas plantillas. Los pasos anteriores también los usan
+# mientras el paso ⑥ no se ha mostrado (sus claves aún no existen en la sesión)
+PLANTILLAS_CORREO_POR_DEFECTO = {
+    "plantilla_para": "{{EMAIL}}",
+    "plantilla_cc": "",
+    "plantilla_bcc": "",
+    "plantilla_asunto": "Memorial proceso {{RADICADO}} contra {{DEMANDADO}}",
+    "plantilla_cuerpo": (
+        "Señor(a) {{JUZGADO}},\n\n"
+        "Adjunto remito el memorial correspondiente al proceso {{RADICADO}} "
+        "seguido por {{DEMANDANTE}} contra {{DEMANDADO}}.\n\n"
+        "Cordialmente,\n"
+        "{{ABOGADO}}\n"
+        "{{TARJETA_PROFESIONAL}}"
+    ),
+    # Envío agrupado: {{CANTIDAD}} y {{DETALLE}} son variables de grupo (configuracion.VARIABLES_GRUPO)
+    "plantilla_grupo_asunto": "Memoriales para {{JUZGADO}} ({{CANTIDAD}} documentos)",
+    "plantilla_grupo_cuerpo": (
+        "Señor(a) {{JUZGADO}},\n\n"
+        "Adjunto remito los memoriales de los siguientes procesos:\n\n{{DETALLE}}\n\n"
+        "Cordialmente,\n"
+        "{{ABOGADO}}\n"
+        "{{TARJETA_PROFESIONAL}}"
+    ),
+    "plantilla_grupo_linea": "- Proceso {{RADICADO}} contra {{DEMANDADO}}",
+}
+
+def texto_plantilla_correo(clave):
+    return st.session_state.get(clave, PLANTILLAS_CORREO_POR_DEFECTO[clave])
+
+# Los archivos ya leídos se reutilizan entre reruns (y entre sesiones) mientras su
+# contenido no cambie. Se guardan pocos para no llenar la memoria del servidor.
+MAX_ARCHIVOS_EN_CACHE = 4
+
+@st.cache_resource(max_entries=MAX_ARCHIVOS_EN_CACHE, show_spinner="Leyendo la base...")
+def leer_base_cacheado(hash_contenido, nombre_archivo, columnas, _contenido):
+    return leer_base(_contenido, nombre_archivo, columnas)
+
+@st.cache_resource(max_entries=MAX_ARCHIVOS_EN_CACHE, show_spinner="Leyendo la plantilla...")
+def leer_word_cacheado(hash_contenido, _contenido):
+    # Índice de variables de todo el documento, una vez por plantilla
+    return indexar_plantilla(_contenido)
+
+def memo_sesion(nombre, clave, calcular):
+    # Guarda en la sesión el último resultado de `calcular` y lo reutiliza
+    # mientras `clave` (las entradas de las que depende) no cambie
+    guardado = st.session_state.get(f"_memo_{nombre}")
+    if guardado is not None and guardado[0] == clave:
+        return guardado[1]
+    valor = calcular()
+    st.session_state[f"_memo_{nombre}"] = (clave, valor)
+    return valor
+
+def clave_dict(d):
+    return tuple(sorted(d.items()))
+
+def obtener_medidor():
+    # Tiempos y memoria de esta sesión, por etapa (ver panel "Rendimiento")
+    if "medidor" not in st.session_state:
+        st.session_state.medidor = Medidor()
+    return st.session_state.medidor
+
+def mostrar_mediciones(prefijo=""):
+    medidor = obtener_medidor()
+    resumen = medidor.resumen(prefijo)
+    if not resumen:
+        st.caption("Aún no hay mediciones.")
+        return
+    st.dataframe(pd.DataFrame(resumen), hide_index=True)
+
+    lentas = medidor.filas_lentas(prefijo)
+    if lentas:
+        st.markdown("**Filas más lentas:**")
+        st.dataframe(pd.DataFrame(lentas).head(10), hide_index=True)
+
+def cerrar_indice_pdfs():
+    if st.session_state.indice_pdfs is not None:
+        st.session_state.indice_pdfs.cerrar()
+    st.session_state.indice_pdfs = None
+    st.session_state.clave_zip_pdfs = None
+    st.session_state.pdf_mapping = None
+
+def huella_base_actual():
+    from diario import huella_base
+
+    return memo_sesion(
+        "huella_base",
+        st.session_state.clave_base,
+        lambda: huella_base(st.session_state.df_base)
+    )
 
 # ------------------------
 # PASO 1: Cargar Excel
 # ------------------------
-with col1:
-    st.subheader("① Cargar base de datos (Excel)")
+@st.fragment
+def paso_1_base():
+    st.subheader("① Cargar base de datos (Excel, CSV o Parquet)")
 
     archivo_excel = st.file_uploader(
-        "Sube la base en Excel (.xlsx o .xls):",
-        type=["xlsx", "xls"],
+        "Sube la base en Excel (.xlsx o .xls), CSV o Parquet:",
+        type=FORMATOS_BASE,
         key="uploader_excel"
     )
 
-    if archivo_excel is not None:
-        df, error = leer_excel(archivo_excel)
-        if error:
-            st.error(error)
-        else:
-            st.session_state.df_base = df
-            st.success(f"Base cargada correctamente. Registros: {len(df)}")
+    # Con una configuración ya armada (vinculación, nombre, correos) se pueden leer
+    # solo las columnas que se usan: la carga es más rápida y ocupa menos memoria
+    columnas_config = [
+        columna
+        for columna in columnas_requeridas(
+            st.session_state.mapeo_placeholders,
+            st.session_state.regla_nombre_archivo,
+            [texto_plantilla_correo(k) for k in CLAVES_PLANTILLAS_CORREO + CLAVES_PLANTILLAS_GRUPO]
+        )
+        if columna not in VARIABLES_GRUPO
+    ]
+    solo_columnas_usadas = st.checkbox(
+        "Leer solo las columnas que usa la configuración actual",
+        value=False,
+        disabled=not st.session_state.mapeo_placeholders,
+        help="Columnas: " + ", ".join(columnas_config)
+    )
 
-            st.markdown("**Vista previa de las primeras filas:**")
-            st.dataframe(df.head(10))
+    if archivo_excel is None:
+        return
+
+    contenido_excel = archivo_excel.getvalue()
+    columnas = tuple(columnas_config) if solo_columnas_usadas else None
+    clave_base = (hash_bytes(contenido_excel), columnas)
+    df, info_carga, error = leer_base_cacheado(
+        clave_base[0],
+        archivo_excel.name,
+        columnas,
+        contenido_excel
+    )
+    if error:
+        st.error(error)
+        return
+
+    if st.session_state.clave_base != clave_base:
+        # Base nueva: los demás pasos dependen de ella
+        obtener_medidor().sumar("① lectura de la base", info_carga["segundos"], info_carga["filas"])
+        st.session_state.df_base = df
+        st.session_state.clave_base = clave_base
+        st.rerun()
+
+    st.success(f"Base cargada correctamente. Registros: {len(df)}")
+    st.caption(
+        f"Leída con {info_carga['motor']} en {info_carga['segundos']:.2f} s · "
+        f"{info_carga['filas']} filas × {info_carga['columnas']} columnas · "
+        f"archivo {info_carga['tamano_archivo_mb']:.1f} MB · "
+        f"{info_carga['memoria_mb']:.1f} MB en memoria"
+    )
+
+    st.markdown("**Vista previa de las primeras filas:**")
+    st.dataframe(df.head(10))
 
-            st.markdown("**Columnas detectadas en la base:**")
-            st.write(list(df.columns))
+    st.markdown("**Columnas detectadas en la base:**")
+    st.write(list(df.columns))
 
 # ------------------------
 # PASO 2: Cargar Word
 # ------------------------
-with col2:
+@st.fragment
+def paso_2_plantilla():
     st.subheader("② Cargar plantilla (Word)")
 
     archivo_word = st.file_uploader(
@@ -100,642 +237,1422 @@ with col2:
         key="uploader_word"
     )
 
-    if archivo_word is not None:
-        parrafos, error = leer_word_como_parrafos(archivo_word)
-        if error:
-            st.error(error)
-        else:
-            st.session_state.parrafos_plantilla = parrafos
-            # Guardamos los bytes de la plantilla para usarlos al generar los .docx
-            st.session_state.plantilla_bytes = archivo_word.getvalue()
-
-            st.success("Plantilla Word cargada correctamente.")
-
-            st.markdown("**Vista previa de los párrafos (solo texto):**")
-            for i, p in enumerate(parrafos, start=1):
-                st.markdown(f"**{i}.** {p}")
+    if archivo_word is None:
+        return
+
+    contenido_word = archivo_word.getvalue()
+    clave_plantilla = hash_bytes(contenido_word)
+    inicio = time.perf_counter()
+    indice, error = leer_word_cacheado(clave_plantilla, contenido_word)
+    if error:
+        st.error(error)
+        return
+
+    # La plantilla queda en el almacén en disco bajo su hash (la misma clave). Se
+    # vuelve a guardar si fue expulsada: al subir de nuevo el mismo archivo la
+    # clave no cambia, pero el archivo ya no está
+    almacen = obtener_almacen()
+    faltaba = almacen.ruta(clave_plantilla) is None
+    if faltaba:
+        almacen.guardar(contenido_word)
+
+    if st.session_state.clave_plantilla != clave_plantilla:
+        obtener_medidor().sumar("② lectura de la plantilla", time.perf_counter() - inicio, 1)
+        st.session_state.indice_plantilla = indice
+        st.session_state.clave_plantilla = clave_plantilla
+        st.rerun()
+    if faltaba and almacen.ruta(clave_plantilla) is not None:
+        # Los pasos siguientes avisaban que faltaba la plantilla
+        st.rerun()
+
+    st.success("Plantilla Word cargada correctamente.")
+
+    st.markdown("**Vista previa de los párrafos (solo texto):**")
+    for p in indice.parrafos:
+        st.markdown(f"**{p['id']}.** _({p['ubicacion']})_ {p['texto']}")
 
 # ------------------------
-# Estado general
+# PASO 3: Marcado de campos ({{...}}) + previsualización
 # ------------------------
-st.markdown("---")
-st.subheader("Estado general")
+# Las últimas filas previsualizadas quedan en memoria: ir y volver entre filas es inmediato
+MAX_PREVISUALIZACIONES = 16
+
+@st.cache_resource(max_entries=MAX_PREVISUALIZACIONES, show_spinner="Generando la previsualización...")
+def previsualizar_cacheado(hash_plantilla, clave_contexto, _contexto):
+    from generacion import previsualizar_documento
+
+    # El contexto (placeholder -> valor ya formateado) resume la fila, la vinculación
+    # y los formatos: dos filas con los mismos valores comparten la previsualización
+    return previsualizar_documento(obtener_almacen().leer(hash_plantilla), _contexto)
+
+@st.fragment
+def paso_3_marcado():
+    df = st.session_state.df_base
+    indice = st.session_state.indice_plantilla
+
+    # Para detectar si este paso cambió algo que usan los pasos siguientes
+    mapeo_antes = dict(st.session_state.mapeo_placeholders)
+    formatos_antes = dict(st.session_state.formatos_columnas)
+
+    st.write(
+        "Detectamos variables dentro del texto con el formato {{NOMBRE}}, también en tablas, "
+        "encabezados, pies de página y cuadros de texto. "
+        "Aquí puedes vincular cada variable a una columna de la base."
+    )
 
-if st.session_state.df_base is not None:
-    st.success("✅ Base de datos (Excel) cargada.")
-else:
-    st.warning("⚠️ Aún no has cargado la base de datos (Excel).")
+    opciones = ["(No vincular)"] + list(df.columns)
 
-if st.session_state.parrafos_plantilla is not None:
-    st.success("✅ Plantilla Word cargada.")
-else:
-    st.warning("⚠️ Aún no has cargado la plantilla (Word).")
+    # ---- Marcado de variables ----
+    # Las variables y dónde aparece cada una salen del índice armado al leer la plantilla
+    st.caption(
+        f"{len(indice.placeholders)} variables distintas en "
+        f"{len(indice.parrafos_con_variables)} párrafos."
+    )
+    for ph in indice.placeholders:
+        info = indice.por_placeholder[ph]
+
+        # Valor actual si ya habíamos mapeado esta variable antes
+        valor_actual = st.session_state.mapeo_placeholders.get(ph, "(No vincular)")
+        index_default = opciones.index(valor_actual) if valor_actual in df.columns else 0
+
+        col_select = st.selectbox(
+            f"Vincular la variable '{{{{{ph}}}}}' a una columna de la base:",
+            options=opciones,
+            index=index_default,
+            key=f"ph_{ph}",
+            help=f"Aparece {info['veces']} veces en: {', '.join(info['ubicaciones'])}."
+        )
+
+        # Actualizar mapeo global
+        if col_select != "(No vincular)":
+            st.session_state.mapeo_placeholders[ph] = col_select
+        elif ph in st.session_state.mapeo_placeholders:
+            # Si el usuario elige "No vincular", la quitamos del diccionario
+            del st.session_state.mapeo_placeholders[ph]
+
+    with st.expander("Ver los párrafos donde aparece cada variable"):
+        for p in indice.parrafos_con_variables:
+            st.markdown(f"**Párrafo {p['id']}** _({p['ubicacion']})_: {', '.join(p['placeholders'])}")
+            st.write(p["texto"])
+
+    st.markdown("### 📝 Resumen de variables vinculadas")
+
+    if st.session_state.mapeo_placeholders:
+        st.write(st.session_state.mapeo_placeholders)
+    else:
+        st.info("Aún no has vinculado ninguna variable {{...}} a columnas de la base.")
+
+    # Aviso de variables detectadas pero no mapeadas
+    no_mapeadas = indice.sin_vincular(st.session_state.mapeo_placeholders)
+    if no_mapeadas:
+        st.warning(
+            f"Estas variables fueron detectadas en la plantilla pero no están vinculadas a ninguna columna: "
+            f"{', '.join(no_mapeadas)}"
+        )
+
+    # ---- Formato de los valores de cada columna vinculada ----
+    if st.session_state.mapeo_placeholders:
+        with st.expander("🔢 Formato de los valores (números, fechas, moneda)"):
+            st.caption(
+                "Define cómo se escribe el valor de cada columna en los documentos, "
+                "los nombres de archivo y los correos."
+            )
+            opciones_formato = list(FORMATOS_COLUMNA.keys())
+            for col in sorted(set(st.session_state.mapeo_placeholders.values())):
+                formato_actual = st.session_state.formatos_columnas.get(col, "auto")
+                formato = st.selectbox(
+                    f"Formato de la columna '{col}':",
+                    options=opciones_formato,
+                    index=opciones_formato.index(formato_actual),
+                    format_func=FORMATOS_COLUMNA.get,
+                    key=f"formato_{col}"
+                )
+                st.session_state.formatos_columnas[col] = formato
+
+    if (st.session_state.mapeo_placeholders != mapeo_antes
+            or st.session_state.formatos_columnas != formatos_antes):
+        # La vinculación y los formatos los usan los pasos ④, ⑤ y ⑥
+        st.rerun()
+
+    mapeo = st.session_state.mapeo_placeholders
+    formatos = st.session_state.formatos_columnas
+
+    # ------------------------
+    # Previsualización con una fila de ejemplo
+    # ------------------------
+    st.markdown("---")
+    st.subheader("👁️ Previsualización del documento con una fila de la base")
+
+    if not mapeo:
+        st.info("Primero vincula al menos una variable {{...}} a alguna columna para poder previsualizar.")
+        return
+
+    # Selector de fila de ejemplo
+    total_filas = len(df)
+    fila_idx = st.number_input(
+        "Selecciona el número de fila de la base para usar como ejemplo (1 = primera fila):",
+        min_value=1,
+        max_value=total_filas,
+        value=1,
+        step=1
+    )
+
+    if obtener_almacen().ruta(st.session_state.clave_plantilla) is None:
+        st.warning("La plantilla ya no está en el servidor. Vuelve a cargar el archivo Word en el paso ②.")
+        return
+
+    with obtener_medidor().etapa("③ previsualización", 1):
+        # Solo formateamos la fila elegida, igual que en la generación
+        contexto = contextos_por_fila(
+            preparar_textos(df.iloc[[fila_idx - 1]], mapeo.values(), formatos), mapeo
+        )[0]
+        docx, textos, error = previsualizar_cacheado(
+            st.session_state.clave_plantilla,
+            clave_dict(contexto),
+            contexto
+        )
+    if error:
+        st.error(error)
+        return
+
+    st.caption(f"Mostrando previsualización usando la fila {fila_idx} de {total_filas}.")
+
+    st.download_button(
+        label="⬇️ Descargar el documento de esta fila (.docx)",
+        data=docx,
+        file_name=f"previsualizacion_fila_{fila_idx}.docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+
+    # Texto del documento ya generado, párrafo por párrafo
+    st.markdown("### Resultado previsualizado:")
+
+    for i, (ubicacion, texto) in enumerate(textos, start=1):
+        st.markdown(f"**Párrafo {i}** _({ubicacion})_:")
+        st.write(texto)
 
 # ------------------------
-# PASO 3: Marcado de campos ({{...}}) + previsualización
+# PASO 4: Nombre de archivo y generación de documentos (.docx o .pdf)
 # ------------------------
+def leer_archivo(ruta):
+    with open(ruta, "rb") as archivo:
+        return archivo.read()
+
+def boton_descarga_parte(parte, clave, etiqueta=None):
+    # `data` es una función: el ZIP se lee del disco solo al hacer clic, no en cada
+    # ejecución de la app (con bytes o un archivo abierto, Streamlit lo carga entero
+    # en memoria al dibujar el botón). "ignore" evita que el clic vuelva a ejecutar
+    # la app (y corte una generación en curso)
+    ruta = parte["ruta"]
+    st.download_button(
+        label=etiqueta or f"⬇️ Descargar {parte['nombre']}",
+        data=lambda: leer_archivo(ruta),
+        file_name=parte["nombre"],
+        mime="application/zip",
+        on_click="ignore",
+        key=clave
+    )
 
-st.markdown("---")
-st.header("③ Marcado de campos en la plantilla y previsualización")
+def borrar_salida_generada(salida_zip):
+    if salida_zip is not None:
+        shutil.rmtree(salida_zip.directorio, ignore_errors=True)
 
-# Verificamos que ambos estén cargados
-if st.session_state.df_base is None or st.session_state.parrafos_plantilla is None:
-    st.warning("Carga primero la base de datos (Excel) y la plantilla (Word).")
-    st.stop()
+def mostrar_resultado_generacion(resultados, salida_zip, extension):
+    if not obtener_almacen().usar_salida(salida_zip.directorio):
+        st.warning("Los documentos generados ya no están en el servidor. Vuelve a generarlos.")
+        return
 
-df = st.session_state.df_base
-parrafos = st.session_state.parrafos_plantilla
+    st.success(f"Se generaron {len(resultados)} documentos {extension}.")
 
-# Diccionario global: nombre_placeholder -> columna_excel
-if "mapeo_placeholders" not in st.session_state:
-    st.session_state.mapeo_placeholders = {}
+    from generacion import ORIGEN_CACHE, ORIGEN_DIARIO, ORIGEN_RENDER
 
-st.write(
-    "Detectamos variables dentro del texto con el formato {{NOMBRE}}. "
-    "Aquí puedes vincular cada variable a una columna de la base."
-)
+    por_origen = pd.Series([r["origen"] for r in resultados]).value_counts()
+    st.caption(
+        f"Renderizados: {por_origen.get(ORIGEN_RENDER, 0)} · "
+        f"reutilizados sin cambios (caché): {por_origen.get(ORIGEN_CACHE, 0)} · "
+        f"recuperados del diario: {por_origen.get(ORIGEN_DIARIO, 0)}"
+    )
 
-# Para también poder avisar si hay placeholders sin mapear
-placeholders_detectados_global = set()
+    st.markdown("### Ejemplo de archivos generados:")
+    st.dataframe(pd.DataFrame(resultados).head(10))
 
-# ---- Marcado de variables por párrafo ----
-for idx, p in enumerate(parrafos):
-    # Buscar placeholders tipo {{ NOMBRE }} dentro del párrafo
-    placeholders = re.findall(r"{{\s*([^}]+?)\s*}}", p)
+    partes = salida_zip.partes
+    if len(partes) == 1:
+        boton_descarga_parte(
+            partes[0], f"descarga_{extension}", "⬇️ Descargar todos los documentos (.zip)"
+        )
+    elif partes:
+        # Con muchas partes, una tabla y una lista para elegir en lugar de un botón por ZIP
+        st.markdown(f"### 📦 La salida quedó en {len(partes)} archivos ZIP")
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "archivo": parte["nombre"],
+                    "grupo": parte["grupo"],
+                    "documentos": parte["documentos"],
+                    "MB": round(parte["bytes"] / (1024 * 1024), 1)
+                }
+                for parte in partes
+            ]),
+            hide_index=True
+        )
+        elegida = st.selectbox(
+            "ZIP a descargar:",
+            range(len(partes)),
+            format_func=lambda i: partes[i]["nombre"],
+            key=f"parte_elegida_{extension}"
+        )
+        boton_descarga_parte(partes[elegida], f"descarga_{extension}")
+
+    with st.expander("⏱️ Tiempos de la generación"):
+        mostrar_mediciones("④ generación")
+
+@st.fragment
+def paso_4_generacion():
+    from diario import ESTADO_OK, ETAPA_RENDER, ReanudacionRender, id_trabajo
+    from generacion import (
+        SALIDA_DOCX,
+        SALIDA_PDF,
+        generar_documentos,
+        workers_disponibles,
+    )
+    from particiones import SalidaParticionada, grupos_por_nombre
 
-    if not placeholders:
-        continue
+    df = st.session_state.df_base
+    mapeo = st.session_state.mapeo_placeholders
+    formatos = st.session_state.formatos_columnas
 
-    placeholders_unicos = sorted(set(placeholders))
-    placeholders_detectados_global.update(placeholders_unicos)
+    st.write("Con la configuración actual se generará un documento por cada fila de la base de datos.")
 
-    with st.expander(f"Párrafo {idx+1}"):
-        st.markdown("### Contenido del párrafo:")
-        st.write(p)
+    # ------------------------
+    # Regla de nombres de archivo personalizada
+    # ------------------------
+    st.markdown("### 🏷️ Nombre de archivo personalizado")
 
-        st.markdown("### Variables detectadas en este párrafo:")
+    st.caption(
+        "Define cómo se debe llamar cada documento generado. "
+        "Puedes usar texto y variables de la base entre llaves, ejemplo:\n"
+        "**Memorial_{{RADICADO}}_{{DEMANDADO}}.docx**"
+    )
 
-        for ph in placeholders_unicos:
-            # Valor actual si ya habíamos mapeado esta variable antes
-            valor_actual = st.session_state.mapeo_placeholders.get(ph, "(No vincular)")
+    regla_nombre = st.text_input(
+        "Escribe la regla del nombre del archivo:",
+        value=st.session_state.regla_nombre_archivo
+    )
+    if regla_nombre != st.session_state.regla_nombre_archivo:
+        # El paso ⑤ busca los PDF con esta misma regla
+        st.session_state.regla_nombre_archivo = regla_nombre
+        st.rerun()
+
+    # Compilamos la regla una sola vez: la usan este paso y el paso ⑤
+    regla = ReglaNombre(regla_nombre, mapeo, df.columns)
+
+    if regla.placeholders:
+        st.write("Variables detectadas en el nombre del archivo:")
+        st.write(regla.placeholders)
+
+        # Ver cuáles se pueden resolver (mapeo o columna directa) y cuáles no
+        resolvibles = regla.resolvibles
+        no_resolvibles = regla.no_resolvibles
+
+        if resolvibles:
+            st.success(f"Variables que se pueden resolver con la base: {', '.join(resolvibles)}")
+        if no_resolvibles:
+            st.warning(
+                "Estas variables del nombre no tienen mapeo ni columna con el mismo nombre, "
+                "y por ahora quedarán vacías en el nombre: "
+                + ", ".join(no_resolvibles)
+            )
+    else:
+        st.info(
+            "No se detectaron variables {{...}} en el nombre. "
+            "Se usará el mismo nombre para todos los archivos con un consecutivo."
+        )
 
-            opciones = ["(No vincular)"] + list(df.columns)
+    # Nombres de toda la base evaluados de una sola pasada (sin extensión)
+    clave_nombres = (st.session_state.clave_base, regla_nombre, clave_dict(mapeo), clave_dict(formatos))
+    def calcular_nombres():
+        with obtener_medidor().etapa("④ nombres de archivo", len(df)):
+            return regla.evaluar(preparar_textos(df, regla.columnas_necesarias, formatos))
 
-            # Determinar índice por defecto del selectbox
-            if valor_actual in df.columns:
-                index_default = opciones.index(valor_actual)
-            else:
-                index_default = 0
+    nombres_base, nombres_duplicados = memo_sesion("nombres", clave_nombres, calcular_nombres)
+    st.session_state.nombres_base = nombres_base
+    st.session_state.clave_nombres = clave_nombres
 
-            col_select = st.selectbox(
-                f"Vincular la variable '{{{{{ph}}}}}' a una columna de la base:",
-                options=opciones,
-                index=index_default,
-                key=f"ph_{idx}_{ph}"
-            )
+    if nombres_duplicados:
+        st.warning(
+            f"La regla genera {len(nombres_duplicados)} nombres repetidos "
+            f"({sum(nombres_duplicados.values())} filas). Para no sobrescribir archivos dentro del ZIP "
+            "se les agregará un consecutivo (_2, _3...). Revisa la regla si no es lo esperado."
+        )
+        with st.expander("Ver nombres repetidos"):
+            st.dataframe(pd.DataFrame(
+                {"nombre": list(nombres_duplicados.keys()), "filas": list(nombres_duplicados.values())}
+            ))
 
-            # Actualizar mapeo global
-            if col_select != "(No vincular)":
-                st.session_state.mapeo_placeholders[ph] = col_select
-            else:
-                # Si el usuario elige "No vincular", la quitamos del diccionario (si existía)
-                if ph in st.session_state.mapeo_placeholders:
-                    del st.session_state.mapeo_placeholders[ph]
+    # ---- Configuración para el modo por lotes (python lote.py) ----
+    st.download_button(
+        label="💾 Descargar configuración (.json) para el modo por lotes",
+        data=configuracion_a_json(
+            mapeo,
+            formatos,
+            regla_nombre,
+            {
+                campo: texto_plantilla_correo(clave)
+                for campo, clave in zip(CAMPOS_CORREO, CLAVES_PLANTILLAS_CORREO)
+            },
+            {
+                campo: texto_plantilla_correo(clave)
+                for campo, clave in zip(CAMPOS_CORREO_GRUPO, CLAVES_PLANTILLAS_GRUPO)
+            }
+        ),
+        file_name="configuracion.json",
+        mime="application/json",
+        help="Vinculación, formatos, regla de nombre y plantillas de correo, para correr "
+             "la generación y el envío sin navegador con lote.py."
+    )
 
-st.markdown("### 📝 Resumen de variables vinculadas")
+    # ------------------------
+    # Formato de salida
+    # ------------------------
+    st.markdown("### 📄 Formato de salida")
 
-if st.session_state.mapeo_placeholders:
-    st.write(st.session_state.mapeo_placeholders)
-else:
-    st.info("Aún no has vinculado ninguna variable {{...}} a columnas de la base.")
+    formato_salida = st.radio(
+        "¿Qué documentos quieres generar?",
+        ["Word (.docx)", "PDF directo (sin conversión externa)"],
+        horizontal=True
+    )
+    salida = SALIDA_PDF if formato_salida.startswith("PDF") else SALIDA_DOCX
+    extension = "." + salida
+
+    if salida == SALIDA_PDF:
+        st.caption(
+            "Cada PDF se arma con el texto de los párrafos de la plantilla (alineación y negrita). "
+            "No incluye tablas, imágenes ni encabezados del Word. Los PDF quedan asociados a cada "
+            "registro para adjuntarlos en el paso ⑥, sin convertir ni subir ningún ZIP en el paso ⑤."
+        )
+
+    # ------------------------
+    # Botón para generar documentos
+    # ------------------------
+    st.markdown("### ⚙️ Procesamiento en paralelo")
+
+    col_workers, col_lote = st.columns(2)
+    with col_workers:
+        workers = st.number_input(
+            "Procesos en paralelo:",
+            min_value=1,
+            max_value=workers_disponibles(),
+            value=min(4, workers_disponibles()),
+            step=1,
+            help="Cantidad de núcleos que se usan para generar los documentos."
+        )
+    with col_lote:
+        tam_lote = st.number_input(
+            "Documentos por lote:",
+            min_value=1,
+            value=50,
+            step=10,
+            help="Cada proceso recibe los documentos en lotes de este tamaño."
+        )
 
-# Aviso de variables detectadas pero no mapeadas
-no_mapeadas = placeholders_detectados_global.difference(st.session_state.mapeo_placeholders.keys())
-if no_mapeadas:
-    st.warning(
-        f"Estas variables fueron detectadas en la plantilla pero no están vinculadas a ninguna columna: "
-        f"{', '.join(sorted(no_mapeadas))}"
+    comprimir_zip = st.checkbox(
+        f"Comprimir los {extension} dentro del ZIP",
+        value=False,
+        help="Los .docx y .pdf ya vienen comprimidos; volver a comprimirlos casi no reduce el tamaño y gasta CPU."
     )
 
+    # ---- Salida partida en varios ZIP (por tamaño, cantidad y/o columna) ----
+    st.markdown("### 📦 Archivos de salida")
+    col_limite, col_grupo = st.columns(2)
+    with col_limite:
+        tipo_limite = st.radio(
+            "Partir el ZIP:",
+            ["No partir", "Por tamaño (MB)", "Por cantidad de documentos"],
+            help="Con bases grandes, varios ZIP más chicos se descargan mejor que uno de varios GB."
+        )
+        max_mb = max_documentos = None
+        if tipo_limite == "Por tamaño (MB)":
+            max_mb = st.number_input("Tamaño máximo de cada ZIP (MB):", min_value=1, value=500, step=100)
+        elif tipo_limite == "Por cantidad de documentos":
+            max_documentos = st.number_input("Documentos por ZIP:", min_value=1, value=5000, step=500)
+    with col_grupo:
+        columna_grupo = st.selectbox(
+            "Un ZIP por cada valor de la columna:",
+            ["(sin agrupar)"] + list(df.columns),
+            help="Ej. JUZGADO o ABOGADO, para repartir los documentos sin volver a ordenarlos a mano."
+        )
+        if columna_grupo == "(sin agrupar)":
+            columna_grupo = None
+        else:
+            st.caption(f"{df[columna_grupo].nunique(dropna=False)} valores distintos en {columna_grupo}.")
+
+    # ---- Caché de documentos: solo se renderiza lo que cambió ----
+    usar_cache = st.checkbox(
+        "Reutilizar los documentos que no cambiaron (caché local)",
+        value=True,
+        help="Si solo cambiaron algunas filas o una columna vinculada, solo se vuelven a generar "
+             "esos documentos; los demás se copian de la caché."
+    )
+    if usar_cache:
+        cache_documentos = obtener_cache_documentos()
+        col_info_cache, col_vaciar_cache = st.columns([3, 1])
+        with col_info_cache:
+            st.caption(
+                f"Caché: {cache_documentos.cantidad} documentos, "
+                f"{cache_documentos.tamano / (1024 * 1024):.1f} MB de "
+                f"{cache_documentos.max_bytes / (1024 * 1024):.0f} MB."
+            )
+        with col_vaciar_cache:
+            if st.button("🗑️ Vaciar caché"):
+                cache_documentos.vaciar()
+                st.rerun(scope="fragment")
+
+    # ---- Diario en disco para reanudar generaciones interrumpidas ----
+    usar_diario_render = st.checkbox(
+        "Guardar el avance en disco y reanudar si la generación se interrumpe",
+        value=True,
+        help="Si la pestaña se recarga o la app se reinicia, solo se generan los documentos que faltaban."
+    )
+
+    reanudacion = None
+    if usar_diario_render:
+        diario = obtener_diario()
+        tipo_render = "render" if salida == SALIDA_DOCX else "render_pdf"
+        trabajo_render = id_trabajo(
+            tipo_render,
+            st.session_state.clave_plantilla,
+            huella_base_actual(),
+            mapeo,
+            formatos
+        )
+        ya_generados = diario.resumen(trabajo_render, ETAPA_RENDER).get(ESTADO_OK, 0)
+        if ya_generados:
+            st.info(
+                f"Hay un trabajo anterior con {ya_generados} de {len(df)} documentos ya generados "
+                "para esta misma base, plantilla y vinculación. Esos documentos no se vuelven a generar."
+            )
+            if st.button("🗑️ Descartar el avance guardado y empezar de cero"):
+                diario.reiniciar(trabajo_render)
+                st.rerun(scope="fragment")
+
+    if st.button(f"▶️ Generar documentos {extension}"):
+        plantilla_bytes = bytes_plantilla()
+        if plantilla_bytes is None:
+            st.error("La plantilla ya no está en el servidor. Vuelve a cargar el archivo Word en el paso ②.")
+            return
+
+        # Borramos los ZIP de una generación anterior para liberar el disco
+        if salida == SALIDA_PDF:
+            # Los PDF nuevos reemplazan a los asociados antes (generados o subidos en ⑤)
+            cerrar_indice_pdfs()
+            borrar_salida_generada(st.session_state.salida_pdfs_generados)
+            st.session_state.salida_pdfs_generados = None
+            st.session_state.resultados_pdf = None
+        else:
+            borrar_salida_generada(st.session_state.salida_docx)
+            st.session_state.salida_docx = None
+            st.session_state.resultados_docx = None
+
+        nombres_archivo = con_extension(nombres_base, extension)
+        grupo_por_nombre = None
+        if columna_grupo is not None:
+            grupo_por_nombre = grupos_por_nombre(
+                nombres_archivo,
+                preparar_textos(df, [columna_grupo], formatos)[columna_grupo]
+            )
+
+        # Cada parte se puede descargar apenas se completa, sin esperar al resto
+        aviso_partes = st.empty()
+
+        def al_completar(parte):
+            with aviso_partes.container():
+                st.caption(f"{len(salida_zip.partes)} ZIP completos. El último:")
+                boton_descarga_parte(parte, f"en_curso_{parte['nombre']}")
+
+        salida_zip = SalidaParticionada(
+            obtener_almacen().nueva_salida(),
+            "documentos_generados",
+            extension,
+            comprimir=comprimir_zip,
+            max_mb=max_mb,
+            max_documentos=max_documentos,
+            grupo_por_nombre=grupo_por_nombre,
+            al_completar=al_completar if max_mb or max_documentos or columna_grupo else None
+        )
+
+        if usar_diario_render:
+            diario.iniciar(trabajo_render, tipo_render, len(df))
+            reanudacion = ReanudacionRender(diario, trabajo_render)
+
+        progreso = st.progress(0)
+
+        # Las mediciones de la generación anterior se reemplazan
+        medidor = obtener_medidor()
+        medidor.reiniciar("④ generación")
+
+        resultados = generar_documentos(
+            df,
+            plantilla_bytes,
+            mapeo,
+            nombres_archivo,
+            salida_zip,
+            workers=int(workers),
+            tam_lote=int(tam_lote),
+            al_avanzar=progreso.progress,
+            formatos=formatos,
+            reanudacion=reanudacion,
+            salida=salida,
+            medidor=medidor,
+            cache=obtener_cache_documentos() if usar_cache else None
+        )
+
+        salida_zip.cerrar()
+        aviso_partes.empty()
+        if reanudacion is not None:
+            reanudacion.terminar()
+        for resultado in resultados:
+            resultado["zip"] = salida_zip.parte_de[resultado["nombre_archivo"]]
+
+        if salida == SALIDA_PDF:
+            # Los PDF quedan directamente en el índice de adjuntos del paso ⑥
+            pdf_mapping = mapping_de_generados(resultados)
+            indice_pdfs = IndicePdfs(salida_zip.rutas)
+            indice_pdfs.asociar(pdf_mapping)
+            st.session_state.indice_pdfs = indice_pdfs
+            st.session_state.clave_zip_pdfs = ("generados", salida_zip.directorio)
+            st.session_state.pdf_mapping = pdf_mapping
+            st.session_state.salida_pdfs_generados = salida_zip
+            st.session_state.resultados_pdf = resultados
+            # Los pasos ⑤ y ⑥ dependen de los PDF recién generados
+            st.rerun()
+
+        # Guardamos el resumen en sesión por si lo necesitamos luego (para correos)
+        st.session_state.salida_docx = salida_zip
+        st.session_state.resultados_docx = resultados
+
+    # El resultado queda visible al cambiar de ZIP a descargar u otra opción del paso
+    if salida == SALIDA_PDF and st.session_state.resultados_pdf is not None:
+        mostrar_resultado_generacion(
+            st.session_state.resultados_pdf, st.session_state.salida_pdfs_generados, extension
+        )
+    elif salida == SALIDA_DOCX and st.session_state.resultados_docx is not None:
+        mostrar_resultado_generacion(
+            st.session_state.resultados_docx, st.session_state.salida_docx, extension
+        )
+
 # ------------------------
-# Previsualización con una fila de ejemplo
+# PASO 5: Cargar PDFs generados externamente y mapearlos
 # ------------------------
-st.markdown("---")
-st.subheader("👁️ Previsualización del documento con una fila de la base")
+@st.fragment
+def paso_5_pdfs():
+    clave_zip_pdfs = st.session_state.clave_zip_pdfs
+    if clave_zip_pdfs is not None and clave_zip_pdfs[0] == "generados":
+        st.success(
+            f"Se usarán los {len(st.session_state.pdf_mapping)} PDF generados en el paso ④. "
+            "No hace falta convertir ni subir un ZIP."
+        )
+        if st.button("📤 Subir un ZIP con otros PDF en su lugar"):
+            cerrar_indice_pdfs()
+            st.rerun()
+        return
+
+    st.write(
+        "Después de generar los .docx y convertirlos a PDF por fuera, "
+        "sube aquí un archivo .zip con todos los PDF. "
+        "Los nombres de los PDF deben seguir la misma regla que usaste para los .docx, "
+        "por ejemplo: **Memorial_{{RADICADO}}_{{DEMANDADO}}.pdf**"
+    )
 
-if not st.session_state.mapeo_placeholders:
-    st.info("Primero vincula al menos una variable {{...}} a alguna columna para poder previsualizar.")
-else:
-    # Selector de fila de ejemplo
-    total_filas = len(df)
-    fila_idx = st.number_input(
-        "Selecciona el número de fila de la base para usar como ejemplo (1 = primera fila):",
-        min_value=1,
-        max_value=total_filas,
-        value=1,
-        step=1
+    if st.session_state.indice_pdfs is None:
+        zip_pdfs = st.file_uploader(
+            "Sube el archivo ZIP con todos los PDF:",
+            type=["zip"],
+            key=f"uploader_zip_pdfs_{st.session_state.version_uploader_pdfs}"
+        )
+        if zip_pdfs is None:
+            return
+
+        # El ZIP se copia al almacén en disco y cada PDF se lee desde ahí. Con una clave
+        # nueva para el uploader, Streamlit suelta su copia en memoria del archivo.
+        with obtener_medidor().etapa("⑤ lectura del ZIP de PDF"):
+            almacen = obtener_almacen()
+            clave_archivo = almacen.guardar(zip_pdfs)
+            st.session_state.indice_pdfs = IndicePdfs(almacen.ruta(clave_archivo))
+        st.session_state.clave_zip_pdfs = ("subido", clave_archivo, zip_pdfs.name)
+        st.session_state.version_uploader_pdfs += 1
+        st.rerun(scope="fragment")
+
+    indice_pdfs = st.session_state.indice_pdfs
+    clave_zip = st.session_state.clave_zip_pdfs
+
+    st.success(f"ZIP cargado: {clave_zip[2]}")
+    if st.button("📤 Subir otro ZIP"):
+        cerrar_indice_pdfs()
+        st.rerun()
+
+    st.write(f"Archivos detectados dentro del ZIP: {len(indice_pdfs.nombres)}")
+    with st.expander("Ver archivos del ZIP"):
+        st.dataframe(pd.DataFrame({"archivo": indice_pdfs.nombres}))
+
+    st.caption(
+        "Los nombres se comparan sin distinguir mayúsculas, tildes compuestas o descompuestas, "
+        "espacios repetidos ni subcarpetas dentro del ZIP."
     )
 
-    fila = df.iloc[fila_idx - 1]
+    # El emparejamiento solo se recalcula si cambia el ZIP o los nombres esperados.
+    # Los nombres esperados salen de la misma regla ya evaluada en el paso ④.
+    def calcular_emparejamiento():
+        nombres_base = st.session_state.nombres_base
+        with obtener_medidor().etapa("⑤ emparejamiento de PDF", len(nombres_base)):
+            return indice_pdfs.emparejar(con_extension(nombres_base, ".pdf"))
+
+    pdf_mapping, sobrantes = memo_sesion(
+        "pdf_mapping",
+        (clave_zip, st.session_state.clave_nombres),
+        calcular_emparejamiento
+    )
 
-    st.caption(f"Mostrando previsualización usando la fila {fila_idx} de {total_filas}.")
+    mapping_df = pd.DataFrame(pdf_mapping)
 
-    # Generar previsualización de cada párrafo
-    st.markdown("### Resultado previsualizado:")
+    st.markdown("### Resultado del mapeo PDFs ↔ base")
+    st.dataframe(mapping_df)
 
-    for i, p in enumerate(parrafos, start=1):
-        texto = p
+    faltantes = mapping_df[mapping_df["estado"] == ESTADO_NO_ENCONTRADO]
+    ambiguos = mapping_df[mapping_df["estado"] == ESTADO_AMBIGUO]
+    if len(faltantes) > 0:
+        st.warning(
+            f"Hay {len(faltantes)} registros sin PDF encontrado. "
+            "Verifica que los nombres en el ZIP coincidan con la regla."
+        )
+    if len(ambiguos) > 0:
+        st.warning(
+            f"Hay {len(ambiguos)} registros con más de un PDF posible (o que comparten el mismo PDF "
+            "con otra fila). No se les adjuntará ningún archivo hasta que los nombres sean únicos."
+        )
+        with st.expander("Ver registros ambiguos"):
+            st.dataframe(ambiguos)
+    if len(faltantes) == 0 and len(ambiguos) == 0:
+        st.success("Todos los registros tienen un PDF asociado en el ZIP.")
 
-        # Reemplazar cada placeholder mapeado por el valor correspondiente de la fila
-        for ph, col in st.session_state.mapeo_placeholders.items():
-            if col in df.columns:
-                valor = fila[col]
-                if pd.isna(valor):
-                    valor = ""
-                # Reemplazamos cualquier variante {{ NOMBRE }} / {{NOMBRE}} / {{   NOMBRE   }}
-                patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-                texto = re.sub(patron, str(valor), texto)
+    if sobrantes:
+        st.info(f"{len(sobrantes)} archivos del ZIP no corresponden a ningún registro de la base.")
+        with st.expander("Ver archivos sin registro"):
+            st.dataframe(pd.DataFrame({"archivo": sobrantes}))
+
+    # Guardamos en sesión el mapping y lo asociamos al índice (fila -> PDF)
+    indice_pdfs.asociar(pdf_mapping)
+    if st.session_state.pdf_mapping is not pdf_mapping:
+        # El paso ⑥ necesita el mapping para adjuntar los PDF
+        st.session_state.pdf_mapping = pdf_mapping
+        st.rerun()
 
-        st.markdown(f"**Párrafo {i}:**")
-        st.write(texto)
 # ------------------------
-# PASO 4: Nombre de archivo y generación de documentos (.docx)
+# PASO 6: Configuración de correo y envío de prueba (con CC / BCC y SSL/TLS)
 # ------------------------
+@st.fragment
+def paso_6_correo():
+    from correo import (
+        CIFRADO_NINGUNO,
+        CIFRADO_SSL,
+        CIFRADO_STARTTLS,
+        SesionSmtp,
+        columnas_de_plantillas,
+        compilar_plantillas,
+        construir_mensaje,
+        VARIABLE_CANTIDAD,
+        VARIABLE_DETALLE,
+        VARIABLE_PARTE,
+        preparar_mensajes,
+        preparar_mensajes_agrupados,
+        procesar_lista_correos,
+        renderizar_correos,
+    )
+    from despacho import DespachadorSmtp, filas_de, filas_pendientes, limites_sugeridos, resultados_por_fila
+    from diario import ESTADO_ERROR, ESTADO_OK, ETAPA_ENVIO, huella_configuracion, id_trabajo, ids_internos
+    from validacion import limite_mensaje_sugerido, resumen_validacion, validar_envio
 
-st.markdown("---")
-st.header("④ Nombre de archivo y generación de documentos (.docx)")
+    df = st.session_state.df_base
+    indice_pdfs = st.session_state.indice_pdfs
 
-# Verificaciones previas
-if st.session_state.df_base is None or st.session_state.parrafos_plantilla is None:
-    st.warning("Carga primero la base de datos y la plantilla.")
-    st.stop()
+    # ------------------------
+    # Configuración SMTP
+    # ------------------------
+    st.subheader("Configuración SMTP (servidor de correo)")
 
-if st.session_state.plantilla_bytes is None:
-    st.warning("No se encontró la plantilla original en memoria. Vuelve a cargar el archivo Word.")
-    st.stop()
+    smtp_host = st.text_input("Servidor SMTP (host):", value="smtp.gmail.com")
+    smtp_port = st.number_input("Puerto SMTP:", value=587, step=1)
 
-if "mapeo_placeholders" not in st.session_state or not st.session_state.mapeo_placeholders:
-    st.warning("Primero debes vincular las variables {{...}} a columnas de la base en el paso ③.")
-    st.stop()
+    tipo_cifrado = st.selectbox(
+        "Método de cifrado:",
+        ["STARTTLS (puerto 587)", "SSL/TLS (puerto 465)", "Sin cifrado (relay interno / servidor local)"],
+        index=0
+    )
 
-df = st.session_state.df_base
-mapeo = st.session_state.mapeo_placeholders
+    smtp_user = st.text_input("Usuario / correo remitente:")
+    smtp_pass = st.text_input("Contraseña / app password:", type="password")
 
-st.write("Con la configuración actual se generará un documento por cada fila de la base de datos.")
+    from_name = st.text_input("Nombre visible del remitente:", value="Área Judicial")
+    from_email = st.text_input("Correo FROM (si es distinto al usuario):", value="")
 
-# ------------------------
-# Regla de nombres de archivo personalizada
-# ------------------------
-st.markdown("### 🏷️ Nombre de archivo personalizado")
+    if from_email.strip() == "":
+        from_email = smtp_user
 
-st.caption(
-    "Define cómo se debe llamar cada documento generado. "
-    "Puedes usar texto y variables de la base entre llaves, ejemplo:\n"
-    "**Memorial_{{RADICADO}}_{{DEMANDADO}}.docx**"
-)
 
-regla_nombre = st.text_input(
-    "Escribe la regla del nombre del archivo:",
-    value=st.session_state.regla_nombre_archivo
-)
-st.session_state.regla_nombre_archivo = regla_nombre
+    # ------------------------
+    # Campos de destinatarios
+    # ------------------------
+    st.subheader("Plantilla de destinatarios (Para, CC y BCC)")
 
-# Detectar placeholders dentro del nombre
-placeholders_nombre = re.findall(r"{{\s*([^}]+?)\s*}}", regla_nombre)
+    st.caption("Puedes usar variables {{EMAIL}}, {{CORREO_JUZGADO}}, {{ABOGADO_CORREO}}, etc.")
 
-if placeholders_nombre:
-    st.write("Variables detectadas en el nombre del archivo:")
-    st.write(placeholders_nombre)
+    para_template = st.text_input(
+        "Para:", value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_para"], key="plantilla_para"
+    )
+    cc_template = st.text_input(
+        "Con copia (CC):", value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_cc"], key="plantilla_cc"
+    )
+    bcc_template = st.text_input(
+        "Copia oculta (BCC):", value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_bcc"], key="plantilla_bcc"
+    )
 
-    # Ver cuáles se pueden resolver (mapeo o columna directa) y cuáles no
-    resolvibles = []
-    no_resolvibles = []
-    for ph in placeholders_nombre:
-        if ph in mapeo or ph in df.columns:
-            resolvibles.append(ph)
-        else:
-            no_resolvibles.append(ph)
+    st.caption("Puedes escribir varios correos separados por coma.")
 
-    if resolvibles:
-        st.success(f"Variables que se pueden resolver con la base: {', '.join(resolvibles)}")
-    if no_resolvibles:
-        st.warning(
-            "Estas variables del nombre no tienen mapeo ni columna con el mismo nombre, "
-            "y por ahora quedarán vacías en el nombre: "
-            + ", ".join(no_resolvibles)
-        )
-else:
-    st.info(
-        "No se detectaron variables {{...}} en el nombre. "
-        "Se usará el mismo nombre para todos los archivos con un consecutivo."
+
+    # ------------------------
+    # Plantilla de correo
+    # ------------------------
+    st.subheader("Plantilla de asunto y cuerpo")
+
+    asunto_template = st.text_input(
+        "Asunto:",
+        value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_asunto"],
+        key="plantilla_asunto"
     )
 
-# ------------------------
-# Botón para generar documentos
-# ------------------------
-if st.button("▶️ Generar documentos .docx"):
-    plantilla_bytes = st.session_state.plantilla_bytes
-
-    buffer_zip = BytesIO()
-    zf = zipfile.ZipFile(buffer_zip, "w", zipfile.ZIP_DEFLATED)
-
-    resultados = []
-    progreso = st.progress(0)
-    total = len(df)
-
-    for idx, (_, fila) in enumerate(df.iterrows(), start=1):
-        # Construimos el contexto para docxtpl: placeholder -> valor
-        contexto = {}
-        for ph, col in mapeo.items():
-            if col in df.columns:
-                valor = fila[col]
-                if pd.isna(valor):
-                    valor = ""
-                contexto[ph] = str(valor)
-            else:
-                contexto[ph] = ""
-
-        # Cargamos la plantilla desde memoria en cada iteración
-        doc = DocxTemplate(BytesIO(plantilla_bytes))
-        doc.render(contexto)
-
-        # --- Construcción del nombre de archivo basado en la regla definida ---
-        nombre_archivo = regla_nombre
-
-        # 1) Reemplazamos usando las variables del NOMBRE (placeholders_nombre)
-        for ph in placeholders_nombre:
-            # Decidimos de dónde sacar el valor de esta variable de nombre
-            if ph in mapeo and mapeo[ph] in df.columns:
-                col = mapeo[ph]
-            elif ph in df.columns:
-                col = ph
-            else:
-                col = None
-
-            if col is not None:
-                valor = fila[col]
-                if pd.isna(valor):
-                    valor = ""
-                patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-                nombre_archivo = re.sub(patron, str(valor), nombre_archivo)
-            else:
-                # Si no hay columna/mapeo para esta variable del nombre, la dejamos vacía
-                patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-                nombre_archivo = re.sub(patron, "", nombre_archivo)
+    cuerpo_template = st.text_area(
+        "Cuerpo del correo:",
+        value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_cuerpo"],
+        height=220,
+        key="plantilla_cuerpo"
+    )
 
-        # 2) Si el usuario no incluyó .docx, lo agregamos
-        if not nombre_archivo.lower().endswith(".docx"):
-            nombre_archivo = nombre_archivo + ".docx"
 
-        # 3) Si después de reemplazar quedó vacío o solo .docx, usamos un fallback
-        if nombre_archivo.strip() == ".docx" or nombre_archivo.strip() == "":
-            nombre_archivo = f"documento_{idx}.docx"
+    # Las plantillas se compilan una vez y las usan el envío de prueba y el masivo
+    plantillas_correo = compilar_plantillas({
+        "para": para_template,
+        "cc": cc_template,
+        "bcc": bcc_template,
+        "asunto": asunto_template,
+        "cuerpo": cuerpo_template,
+    })
 
-        # Guardamos en un buffer temporal
-        doc_buffer = BytesIO()
-        doc.save(doc_buffer)
-        doc_buffer.seek(0)
 
-        # Añadimos al ZIP
-        zf.writestr(nombre_archivo, doc_buffer.read())
+    # ------------------------
+    # Envío agrupado por destinatario
+    # ------------------------
+    st.subheader("📎 Un solo correo por destinatario")
 
-        resultados.append({
-            "fila": idx,
-            "nombre_archivo": nombre_archivo
-        })
+    agrupar_correos = st.checkbox(
+        "Agrupar en un solo correo las filas con los mismos destinatarios",
+        value=False,
+        help="Las filas con exactamente los mismos Para, CC y BCC se envían en un solo correo con "
+             "todos sus PDF. Si el grupo pasa del máximo de adjuntos o de tamaño, se parte en varios correos."
+    )
 
-        progreso.progress(idx / total)
+    plantillas_grupo = None
+    if agrupar_correos:
+        col_adjuntos, col_mb = st.columns(2)
+        with col_adjuntos:
+            max_adjuntos = st.number_input(
+                "Máximo de PDF por correo:",
+                min_value=1,
+                value=10,
+                step=1
+            )
+        with col_mb:
+            max_mb_correo = st.number_input(
+                "Máximo de MB de adjuntos por correo:",
+                min_value=1,
+                value=limite_mensaje_sugerido(smtp_host),
+                step=5,
+                help="Tamaño de los PDF ya codificados en base64 (4/3 de su tamaño)."
+            )
 
-    zf.close()
-    buffer_zip.seek(0)
+        st.caption(
+            f"Además de las columnas de la base (se toman de la primera fila del grupo): "
+            f"{{{{{VARIABLE_CANTIDAD}}}}} = cantidad de PDF del correo, "
+            f"{{{{{VARIABLE_DETALLE}}}}} = una línea por fila, "
+            f"{{{{{VARIABLE_PARTE}}}}} = número de correo si el grupo se parte."
+        )
+        asunto_grupo_template = st.text_input(
+            "Asunto del correo agrupado:",
+            value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_grupo_asunto"],
+            key="plantilla_grupo_asunto"
+        )
+        cuerpo_grupo_template = st.text_area(
+            "Cuerpo del correo agrupado:",
+            value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_grupo_cuerpo"],
+            height=220,
+            key="plantilla_grupo_cuerpo"
+        )
+        linea_grupo_template = st.text_input(
+            "Línea por fila (para {{" + VARIABLE_DETALLE + "}}):",
+            value=PLANTILLAS_CORREO_POR_DEFECTO["plantilla_grupo_linea"],
+            key="plantilla_grupo_linea"
+        )
+        plantillas_grupo = compilar_plantillas({
+            "asunto": asunto_grupo_template,
+            "cuerpo": cuerpo_grupo_template,
+            "linea": linea_grupo_template,
+        })
 
-    st.success(f"Se generaron {len(resultados)} documentos .docx.")
+    if "SSL/TLS" in tipo_cifrado:
+        cifrado = CIFRADO_SSL
+    elif "Sin cifrado" in tipo_cifrado:
+        cifrado = CIFRADO_NINGUNO
+    else:
+        cifrado = CIFRADO_STARTTLS
 
-    st.markdown("### Ejemplo de archivos generados:")
-    st.dataframe(pd.DataFrame(resultados).head(10))
 
-    st.download_button(
-        label="⬇️ Descargar todos los documentos (.zip)",
-        data=buffer_zip.getvalue(),
-        file_name="documentos_generados.docx.zip",
-        mime="application/zip"
+    # ------------------------
+    # Envío de prueba
+    # ------------------------
+    st.subheader("📨 Envío de prueba (una sola fila)")
+
+    total_filas = len(df)
+    fila_prueba = st.number_input(
+        "Fila a usar para la prueba:",
+        min_value=1,
+        max_value=total_filas,
+        value=1,
+        step=1
     )
 
-    # Guardamos el resumen en sesión por si lo necesitamos luego (para correos)
-    st.session_state.resultados_docx = resultados
-# ------------------------
-# PASO 5: Cargar PDFs generados externamente y mapearlos
-# ------------------------
-st.markdown("---")
-st.header("⑤ Cargar PDFs convertidos y asociarlos a cada registro")
+    correo_prueba = st.text_input("Correo destino para la prueba (si quieres ignorar las variables):")
 
-if "resultados_pdf" not in st.session_state:
-    st.session_state.resultados_pdf = None
 
-# Verificaciones básicas
-if st.session_state.df_base is None:
-    st.warning("Carga primero la base de datos (Excel).")
-    st.stop()
+    if st.button("➡️ Enviar correo de prueba"):
+        if not smtp_host or (cifrado != CIFRADO_NINGUNO and (not smtp_user or not smtp_pass)):
+            st.error("⚠️ Debes completar host, usuario y contraseña SMTP.")
+            return
 
-df = st.session_state.df_base
-mapeo = st.session_state.mapeo_placeholders
-plantilla_bytes = st.session_state.plantilla_bytes
-regla_nombre = st.session_state.regla_nombre_archivo
+        # Formateamos solo la fila de prueba y las columnas usadas en las plantillas
+        correo = renderizar_correos(
+            plantillas_correo,
+            preparar_textos(
+                df.iloc[[fila_prueba - 1]],
+                columnas_de_plantillas(plantillas_correo),
+                st.session_state.formatos_columnas
+            )
+        ).iloc[0]
+
+        para_final = correo["para"]
+        cc_final = correo["cc"]
+        bcc_final = correo["bcc"]
+
+        if correo_prueba.strip() != "":
+            para_final = correo_prueba.strip()
+
+        para_list = procesar_lista_correos(para_final)
+        cc_list = procesar_lista_correos(cc_final)
+        bcc_list = procesar_lista_correos(bcc_final)
+
+        if len(para_list) == 0:
+            st.error("No hay destinatarios válidos en PARA.")
+            return
+
+        asunto_final = correo["asunto"]
+        cuerpo_final = correo["cuerpo"]
+
+        nombre_pdf, pdf_bytes, ok_pdf = indice_pdfs.obtener(fila_prueba)
+
+        if not ok_pdf:
+            st.error(f"No se encontró PDF para la fila {fila_prueba}. Esperado: {nombre_pdf}")
+            return
+
+        try:
+            msg = construir_mensaje(
+                from_name,
+                from_email,
+                para_list,
+                cc_list,
+                bcc_list,
+                asunto_final,
+                cuerpo_final,
+                [(nombre_pdf, pdf_bytes)]
+            )
 
-st.write(
-    "Después de generar los .docx y convertirlos a PDF por fuera, "
-    "sube aquí un archivo .zip con todos los PDF. "
-    "Los nombres de los PDF deben seguir la misma regla que usaste para los .docx, "
-    "por ejemplo: **Memorial_{{RADICADO}}_{{DEMANDADO}}.pdf**"
-)
+            with SesionSmtp(smtp_host, smtp_port, smtp_user, smtp_pass, cifrado=cifrado) as sesion:
+                sesion.enviar(msg)
 
-zip_pdfs = st.file_uploader(
-    "Sube el archivo ZIP con todos los PDF:",
-    type=["zip"],
-    key="uploader_zip_pdfs"
-)
+            st.success(
+                f"Correo enviado correctamente.\n\n"
+                f"Para: {para_list}\n"
+                f"CC: {cc_list}\n"
+                f"BCC: {bcc_list}"
+            )
 
-pdf_mapping = []
+            st.code(
+                f"Asunto: {asunto_final}\n\n{cuerpo_final}",
+                language="text"
+            )
 
-if zip_pdfs is not None:
-    # Leemos el ZIP en memoria
-    zip_bytes = zip_pdfs.read()
-    zf_pdf = zipfile.ZipFile(BytesIO(zip_bytes), "r")
+        except Exception as e:
+            st.error(f"❌ Error al enviar: {e}")
 
-    nombres_archivos_zip = zf_pdf.namelist()
-    st.write("Archivos detectados dentro del ZIP:")
-    st.write(nombres_archivos_zip)
 
-    # Detectamos placeholders del nombre (los mismos que en el paso 4)
-    placeholders_nombre = re.findall(r"{{\s*([^}]+?)\s*}}", regla_nombre)
+    # ------------------------
+    # Envío masivo
+    # ------------------------
+    st.markdown("---")
+    st.subheader("📬 Envío masivo (toda la base)")
 
-    # Recorremos cada fila del DF y calculamos el nombre de PDF esperado
-    for idx, (_, fila) in enumerate(df.iterrows(), start=1):
-        nombre_esperado = regla_nombre
+    st.caption(
+        "Envía un correo por cada fila de la base (o por cada grupo de destinatarios, si se agrupan). Cada sesión SMTP reutiliza su conexión autenticada "
+        "y se reconecta automáticamente si el servidor la corta. Si el proveedor responde que vamos "
+        "demasiado rápido (421, 451, 4xx), se reduce la velocidad y se reintenta."
+    )
 
-        # Reemplazamos placeholders en el nombre usando mapeo o columna directa
-        for ph in placeholders_nombre:
-            if ph in mapeo and mapeo[ph] in df.columns:
-                col = mapeo[ph]
-            elif ph in df.columns:
-                col = ph
-            else:
-                col = None
-
-            if col is not None:
-                valor = fila[col]
-                if pd.isna(valor):
-                    valor = ""
-                patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-                nombre_esperado = re.sub(patron, str(valor), nombre_esperado)
-            else:
-                patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-                nombre_esperado = re.sub(patron, "", nombre_esperado)
+    por_minuto_sugerido, por_dia_sugerido = limites_sugeridos(smtp_host)
 
-        # Ajustamos extensión a .pdf
-        nombre_esperado = nombre_esperado.replace(".docx", "").replace(".DOCX", "")
-        if not nombre_esperado.lower().endswith(".pdf"):
-            nombre_esperado = nombre_esperado + ".pdf"
+    col_sesiones, col_minuto, col_dia = st.columns(3)
+    with col_sesiones:
+        sesiones_smtp = st.number_input(
+            "Sesiones SMTP simultáneas:",
+            min_value=1,
+            max_value=10,
+            value=2,
+            step=1
+        )
+    with col_minuto:
+        por_minuto = st.number_input(
+            "Máximo de correos por minuto:",
+            min_value=1,
+            value=por_minuto_sugerido,
+            step=10,
+            help="Límite del proveedor para este servidor."
+        )
+    with col_dia:
+        maximo_diario = st.number_input(
+            "Máximo de correos por día:",
+            min_value=0,
+            value=por_dia_sugerido,
+            step=100,
+            help="0 = sin límite. Al alcanzarlo, las filas restantes quedan sin enviar."
+        )
 
-        # Buscamos si ese archivo existe en el ZIP (match exacto, case-sensitive simple)
-        encontrado = nombre_esperado in nombres_archivos_zip
+    col_rset, col_reconectar = st.columns(2)
+    with col_rset:
+        rset_cada = st.number_input(
+            "Enviar RSET cada N correos:",
+            min_value=0,
+            value=50,
+            step=10,
+            help="0 = nunca."
+        )
+    with col_reconectar:
+        reconectar_cada = st.number_input(
+            "Abrir una conexión nueva cada N correos:",
+            min_value=0,
+            value=500,
+            step=50,
+            help="0 = mantener la misma conexión mientras el servidor la acepte."
+        )
 
-        pdf_mapping.append({
-            "fila": idx,
-            "nombre_esperado": nombre_esperado,
-            "encontrado": encontrado
-        })
+    # ---- Diario en disco: no repetir correos ya enviados ----
+    # El trabajo depende solo del archivo de la base: corregir el asunto o leer
+    # menos columnas después de un corte no puede volver a enviar lo ya enviado
+    diario = obtener_diario()
+    trabajo_envio = id_trabajo("envio", st.session_state.clave_base[0])
+    configuracion_envio = huella_configuracion(
+        {campo: plantilla.texto for campo, plantilla in plantillas_correo.items()},
+        from_email,
+        smtp_host,
+        None if plantillas_grupo is None else (
+            {campo: plantilla.texto for campo, plantilla in plantillas_grupo.items()},
+            int(max_adjuntos),
+            int(max_mb_correo)
+        )
+    )
+    ids_filas = ids_internos(df)
+    ya_enviados = diario.completadas(trabajo_envio, ETAPA_ENVIO)
+    filas_ya_enviadas = {
+        fila for fila, id_interno in enumerate(ids_filas, start=1) if id_interno in ya_enviados
+    }
+
+    if filas_ya_enviadas:
+        st.info(
+            f"{len(filas_ya_enviadas)} de {total_filas} correos ya se enviaron en una ejecución anterior "
+            "con esta misma base. No se volverán a enviar."
+        )
+        if diario.descripcion(trabajo_envio) not in (None, "", configuracion_envio):
+            st.warning(
+                "Las plantillas de correo, el remitente o el servidor cambiaron desde esa ejecución: "
+                "las filas pendientes saldrán con la configuración actual. Si quieres volver a "
+                "enviar toda la base, olvida los envíos registrados."
+            )
+        if st.button("🗑️ Olvidar los envíos registrados"):
+            diario.reiniciar(trabajo_envio)
+            st.rerun(scope="fragment")
+
+    # ---- Validación de toda la base antes de enviar ----
+    st.markdown("#### 🔎 Validación previa de toda la base")
+    st.caption(
+        "Revisa todas las filas de una vez: direcciones de Para, CC y BCC, filas sin destinatarios, "
+        "PDF faltantes, vacíos o demasiado grandes para el proveedor, y el mismo destinatario "
+        "recibiendo el mismo PDF en dos filas."
+    )
+    limite_mensaje_mb = st.number_input(
+        "Tamaño máximo de un correo en el proveedor (MB):",
+        min_value=1,
+        value=limite_mensaje_sugerido(smtp_host),
+        step=5,
+        help="El PDF viaja codificado en base64 y ocupa 4/3 de su tamaño."
+    )
+    clave_validacion = (
+        st.session_state.clave_base,
+        clave_dict({campo: plantilla.texto for campo, plantilla in plantillas_correo.items()}),
+        st.session_state.clave_zip_pdfs,
+        st.session_state.clave_nombres,
+        clave_dict(st.session_state.formatos_columnas),
+        limite_mensaje_mb
+    )
+    if st.button("🔎 Validar toda la base"):
+        with obtener_medidor().etapa("⑥ validación previa", total_filas):
+            reporte = validar_envio(
+                renderizar_correos(
+                    plantillas_correo,
+                    preparar_textos(
+                        df, columnas_de_plantillas(plantillas_correo), st.session_state.formatos_columnas
+                    )
+                ),
+                st.session_state.pdf_mapping,
+                indice_pdfs.tamanos(),
+                limite_mensaje_mb
+            )
+        st.session_state.validacion_envio = (clave_validacion, reporte)
+
+    # Solo se muestra si corresponde a la configuración actual
+    validacion = st.session_state.validacion_envio
+    if validacion is not None and validacion[0] == clave_validacion:
+        reporte = validacion[1]
+        con_problemas = reporte[~reporte["ok"]]
+        if con_problemas.empty:
+            st.success(f"Las {total_filas} filas pasaron la validación.")
+        else:
+            st.warning(
+                f"{len(con_problemas)} de {total_filas} filas tienen problemas. Las que no tienen "
+                "destinatarios en Para o PDF no se enviarán."
+            )
+            st.dataframe(
+                pd.DataFrame(
+                    [{"problema": problema, "filas": n} for problema, n in resumen_validacion(reporte).items() if n]
+                ),
+                hide_index=True
+            )
+            st.dataframe(con_problemas.head(1000), hide_index=True)
+        st.download_button(
+            label="⬇️ Descargar reporte de validación (.csv)",
+            data=reporte.to_csv(index=False).encode("utf-8"),
+            file_name="validacion_envio.csv",
+            mime="text/csv"
+        )
 
-    mapping_df = pd.DataFrame(pdf_mapping)
+    confirmar_masivo = st.checkbox(
+        f"Confirmo que quiero enviar {total_filas} correos reales a los destinatarios de la base."
+    )
 
-    st.markdown("### Resultado del mapeo PDFs ↔ base")
-    st.dataframe(mapping_df)
+    if st.button("🚀 Enviar todos los correos", disabled=not confirmar_masivo):
+        if not smtp_host or (cifrado != CIFRADO_NINGUNO and (not smtp_user or not smtp_pass)):
+            st.error("⚠️ Debes completar host, usuario y contraseña SMTP.")
+            return
 
-    faltantes = mapping_df[~mapping_df["encontrado"]]
-    if len(faltantes) > 0:
-        st.warning(
-            f"Hay {len(faltantes)} registros sin PDF encontrado. "
-            "Verifica que los nombres en el ZIP coincidan con la regla."
+        # Las mediciones del envío anterior se reemplazan
+        medidor = obtener_medidor()
+        medidor.reiniciar("⑥ envío")
+
+        # Todo el lote se renderiza de una sola vez
+        with medidor.etapa("⑥ envío: render de correos", total_filas):
+            correos = renderizar_correos(
+                plantillas_correo,
+                preparar_textos(df, columnas_de_plantillas(plantillas_correo), st.session_state.formatos_columnas)
+            )
+            if plantillas_grupo is None:
+                mensajes = preparar_mensajes(
+                    correos, indice_pdfs.obtener, from_name, from_email, omitir=filas_ya_enviadas
+                )
+            else:
+                mensajes = preparar_mensajes_agrupados(
+                    correos,
+                    preparar_textos(
+                        df, columnas_de_plantillas(plantillas_grupo), st.session_state.formatos_columnas
+                    ),
+                    plantillas_grupo,
+                    indice_pdfs.obtener,
+                    from_name,
+                    from_email,
+                    max_adjuntos=int(max_adjuntos),
+                    max_mb=int(max_mb_correo),
+                    omitir=filas_ya_enviadas
+                )
+
+        diario.iniciar(trabajo_envio, "envio", total_filas, configuracion_envio)
+
+        progreso = st.progress(0)
+        procesados = []
+        pendientes = total_filas - len(filas_ya_enviadas)
+
+        def al_resultado(resultado):
+            # Cada resultado queda en el diario apenas se conoce; un correo agrupado
+            # registra todas sus filas
+            filas = filas_de(resultado)
+            for fila in filas:
+                diario.registrar(
+                    trabajo_envio,
+                    ETAPA_ENVIO,
+                    ids_filas[fila - 1],
+                    ESTADO_OK if resultado["enviado"] else ESTADO_ERROR,
+                    resultado["error"]
+                )
+            if resultado["intentos"]:
+                medidor.fila(
+                    "⑥ envío: SMTP", filas[0], resultado["segundos"],
+                    intentos=resultado["intentos"], adjuntos=len(filas)
+                )
+            procesados.extend(filas)
+            progreso.progress(len(procesados) / pendientes)
+
+        despachador = DespachadorSmtp(
+            lambda: SesionSmtp(
+                smtp_host,
+                smtp_port,
+                smtp_user,
+                smtp_pass,
+                cifrado=cifrado,
+                rset_cada=int(rset_cada),
+                reconectar_cada=int(reconectar_cada)
+            ),
+            sesiones=int(sesiones_smtp),
+            por_minuto=int(por_minuto),
+            maximo_diario=int(maximo_diario)
         )
-    else:
-        st.success("Todos los registros tienen un PDF asociado en el ZIP.")
+        if pendientes:
+            with medidor.etapa("⑥ envío: total", pendientes):
+                resultados_envio = despachador.enviar_todos(mensajes, al_resultado=al_resultado)
+        else:
+            st.info("No hay filas pendientes: todas se enviaron en ejecuciones anteriores.")
+            progreso.progress(1.0)
+            resultados_envio = []
+        correos_enviados = sum(1 for r in resultados_envio if r["enviado"])
+
+        # Una fila del resultado por fila de la base, con el correo en que viajó
+        resultados_envio = resultados_por_fila(resultados_envio)
+        resultados_envio += [
+            {"fila": fila, "enviado": True, "error": "", "intentos": 0, "segundos": 0.0, "correo": None}
+            for fila in filas_ya_enviadas
+        ]
+        # Lo que no alcanzó a salir por el cupo diario se envía en la próxima ejecución
+        sin_enviar_por_cupo = filas_pendientes(resultados_envio, total_filas)
+        resultados_envio += sin_enviar_por_cupo
+        resultados_envio.sort(key=lambda r: r["fila"])
+
+        resultados_envio_df = pd.DataFrame(resultados_envio)
+        resultados_envio_df.insert(1, "para", correos["para"].to_numpy()[resultados_envio_df["fila"] - 1])
+        enviados = int(resultados_envio_df["enviado"].sum())
+
+        detalle_correos = (
+            f" en {correos_enviados} correos agrupados" if plantillas_grupo is not None else ""
+        )
+        if enviados == total_filas:
+            st.success(
+                f"Se enviaron las {enviados} filas{detalle_correos}. "
+                f"Conexiones SMTP usadas: {despachador.conexiones}."
+            )
+        else:
+            st.warning(
+                f"Se enviaron {enviados} de {total_filas} filas{detalle_correos}. "
+                f"Conexiones SMTP usadas: {despachador.conexiones}."
+            )
+        if sin_enviar_por_cupo:
+            st.info(
+                f"Se agotó el cupo diario: {len(sin_enviar_por_cupo)} filas quedaron pendientes y se "
+                "enviarán al volver a enviar con esta misma base."
+            )
+        st.dataframe(resultados_envio_df[~resultados_envio_df["enviado"]])
+
+        st.download_button(
+            label="⬇️ Descargar resultado del envío (.csv)",
+            data=resultados_envio_df.to_csv(index=False).encode("utf-8"),
+            file_name="resultado_envio.csv",
+            mime="text/csv"
+        )
+
+        with st.expander("⏱️ Tiempos del envío"):
+            mostrar_mediciones("⑥ envío")
 
-    # Guardamos en sesión: el zip original y el mapping
-    st.session_state.pdf_zip_bytes = zip_bytes
-    st.session_state.pdf_mapping = pdf_mapping
 # ------------------------
-# PASO 6: Configuración de correo y envío de prueba (con CC / BCC y SSL/TLS)
+# Panel de rendimiento (barra lateral)
 # ------------------------
-import smtplib
-from email.message import EmailMessage
+@st.fragment
+def panel_rendimiento():
+    from diario import DIR_TRABAJOS
 
-st.markdown("---")
-st.header("⑥ Configuración de correo y envío de prueba")
+    st.subheader("⏱️ Rendimiento")
+    st.caption("Tiempo, filas por segundo, percentiles por fila y memoria pico de cada etapa en esta sesión.")
 
-if "pdf_zip_bytes" not in st.session_state or "pdf_mapping" not in st.session_state:
-    st.info("Primero carga el ZIP con los PDFs en el paso ⑤ para poder adjuntarlos en correos.")
-    st.stop()
+    medidor = obtener_medidor()
+
+    guardar_jsonl = st.checkbox(
+        "Guardar las mediciones en un archivo (JSON lines)",
+        value=medidor.ruta_jsonl is not None
+    )
+    ruta_jsonl = st.text_input(
+        "Archivo de mediciones:",
+        value=medidor.ruta_jsonl or os.path.join(DIR_TRABAJOS, "mediciones.jsonl"),
+        disabled=not guardar_jsonl
+    )
+    ruta_deseada = ruta_jsonl if guardar_jsonl else None
+    if ruta_deseada != medidor.ruta_jsonl:
+        if ruta_deseada:
+            os.makedirs(os.path.dirname(ruta_deseada) or ".", exist_ok=True)
+        medidor.escribir_en(ruta_deseada)
+
+    col_actualizar, col_reiniciar = st.columns(2)
+    with col_actualizar:
+        st.button("🔄 Actualizar")
+    with col_reiniciar:
+        if st.button("🗑️ Reiniciar"):
+            medidor.reiniciar()
 
-df = st.session_state.df_base
-pdf_zip_bytes = st.session_state.pdf_zip_bytes
-pdf_mapping = st.session_state.pdf_mapping
+    mostrar_mediciones()
 
 # ------------------------
-# Configuración SMTP
+# Configuración básica de la app
 # ------------------------
-st.subheader("Configuración SMTP (servidor de correo)")
 
-smtp_host = st.text_input("Servidor SMTP (host):", value="smtp.gmail.com")
-smtp_port = st.number_input("Puerto SMTP:", value=587, step=1)
-
-tipo_cifrado = st.selectbox(
-    "Método de cifrado:",
-    ["STARTTLS (puerto 587)", "SSL/TLS (puerto 465)"],
-    index=0
+st.set_page_config(
+    page_title="Generador de documentos judiciales",
+    layout="wide"
 )
 
-smtp_user = st.text_input("Usuario / correo remitente:")
-smtp_pass = st.text_input("Contraseña / app password:", type="password")
+st.title("📄 Generador de documentos judiciales")
+st.caption("Fase inicial: combinar base en Excel + plantilla Word usando placeholders {{...}}.")
 
-from_name = st.text_input("Nombre visible del remitente:", value="Área Judicial")
-from_email = st.text_input("Correo FROM (si es distinto al usuario):", value="")
+# Estado de sesión
+if "df_base" not in st.session_state:
+    st.session_state.df_base = None
+    st.session_state.clave_base = None
 
-if from_email.strip() == "":
-    from_email = smtp_user
+if "indice_plantilla" not in st.session_state:
+    st.session_state.indice_plantilla = None
 
+if "clave_plantilla" not in st.session_state:
+    st.session_state.clave_plantilla = None
 
-# ------------------------
-# Campos de destinatarios
-# ------------------------
-st.subheader("Plantilla de destinatarios (Para, CC y BCC)")
+if "mapeo_placeholders" not in st.session_state:
+    st.session_state.mapeo_placeholders = {}
 
-st.caption("Puedes usar variables {{EMAIL}}, {{CORREO_JUZGADO}}, {{ABOGADO_CORREO}}, etc.")
+if "resultados_docx" not in st.session_state:
+    st.session_state.resultados_docx = None
 
-para_template = st.text_input("Para:", value="{{EMAIL}}")
-cc_template = st.text_input("Con copia (CC):", value="")
-bcc_template = st.text_input("Copia oculta (BCC):", value="")
+if "formatos_columnas" not in st.session_state:
+    st.session_state.formatos_columnas = {}
 
-st.caption("Puedes escribir varios correos separados por coma.")
+if "salida_docx" not in st.session_state:
+    st.session_state.salida_docx = None
 
+if "regla_nombre_archivo" not in st.session_state:
+    st.session_state.regla_nombre_archivo = "Memorial_{{RADICADO}}_{{DEMANDADO}}.docx"
 
-# ------------------------
-# Plantilla de correo
-# ------------------------
-st.subheader("Plantilla de asunto y cuerpo")
+if "nombres_base" not in st.session_state:
+    st.session_state.nombres_base = None
+    st.session_state.clave_nombres = None
 
-asunto_template = st.text_input(
-    "Asunto:",
-    value="Memorial proceso {{RADICADO}} contra {{DEMANDADO}}"
-)
+if "resultados_pdf" not in st.session_state:
+    st.session_state.resultados_pdf = None
 
-cuerpo_template = st.text_area(
-    "Cuerpo del correo:",
-    value=(
-        "Señor(a) {{JUZGADO}},\n\n"
-        "Adjunto remito el memorial correspondiente al proceso {{RADICADO}} "
-        "seguido por {{DEMANDANTE}} contra {{DEMANDADO}}.\n\n"
-        "Cordialmente,\n"
-        "{{ABOGADO}}\n"
-        "{{TARJETA_PROFESIONAL}}"
-    ),
-    height=220
-)
+if "indice_pdfs" not in st.session_state:
+    st.session_state.indice_pdfs = None
+    st.session_state.clave_zip_pdfs = None
 
+if "version_uploader_pdfs" not in st.session_state:
+    st.session_state.version_uploader_pdfs = 0
 
-# ------------------------
-# Funciones internas
-# ------------------------
-def reemplazar_variables(template_text, fila):
-    texto = template_text
-    for col in df.columns:
-        ph = col
-        valor = fila[col]
-        if pd.isna(valor):
-            valor = ""
-        patron = r"{{\s*" + re.escape(ph) + r"\s*}}"
-        texto = re.sub(patron, str(valor), texto)
-    return texto
-
-def procesar_lista_correos(cadena):
-    if not cadena:
-        return []
-    lista = [c.strip() for c in cadena.split(",") if c.strip() != ""]
-    return lista
-
-def obtener_pdf_para_fila(idx_fila):
-    esperado = None
-    encontrado = False
-
-    for item in pdf_mapping:
-        if item["fila"] == idx_fila:
-            esperado = item["nombre_esperado"]
-            encontrado = item["encontrado"]
-            break
-
-    if not encontrado or esperado is None:
-        return None, None, False
-
-    zf_pdf = zipfile.ZipFile(BytesIO(pdf_zip_bytes), "r")
-    try:
-        data = zf_pdf.read(esperado)
-        return esperado, data, True
-    except KeyError:
-        return esperado, None, False
+if "validacion_envio" not in st.session_state:
+    st.session_state.validacion_envio = None
 
+if "pdf_mapping" not in st.session_state:
+    st.session_state.pdf_mapping = None
 
-# ------------------------
-# Envío de prueba
-# ------------------------
-st.subheader("📨 Envío de prueba (una sola fila)")
-
-total_filas = len(df)
-fila_prueba = st.number_input(
-    "Fila a usar para la prueba:",
-    min_value=1,
-    max_value=total_filas,
-    value=1,
-    step=1
-)
+if "salida_pdfs_generados" not in st.session_state:
+    st.session_state.salida_pdfs_generados = None
 
-correo_prueba = st.text_input("Correo destino para la prueba (si quieres ignorar las variables):")
+with st.sidebar:
+    panel_rendimiento()
 
+col1, col2 = st.columns(2)
 
-if st.button("➡️ Enviar correo de prueba"):
-    if not smtp_host or not smtp_user or not smtp_pass:
-        st.error("⚠️ Debes completar host, usuario y contraseña SMTP.")
-        st.stop()
+with col1:
+    paso_1_base()
 
-    fila = df.iloc[fila_prueba - 1]
+with col2:
+    paso_2_plantilla()
 
-    # Reemplazamos variables en PARA / CC / BCC
-    para_final = reemplazar_variables(para_template, fila)
-    cc_final = reemplazar_variables(cc_template, fila)
-    bcc_final = reemplazar_variables(bcc_template, fila)
+# ------------------------
+# Estado general
+# ------------------------
+st.markdown("---")
+st.subheader("Estado general")
 
-    if correo_prueba.strip() != "":
-        para_final = correo_prueba.strip()
+if st.session_state.df_base is not None:
+    st.success("✅ Base de datos (Excel) cargada.")
+else:
+    st.warning("⚠️ Aún no has cargado la base de datos (Excel).")
 
-    para_list = procesar_lista_correos(para_final)
-    cc_list = procesar_lista_correos(cc_final)
-    bcc_list = procesar_lista_correos(bcc_final)
+if st.session_state.indice_plantilla is not None:
+    st.success("✅ Plantilla Word cargada.")
+else:
+    st.warning("⚠️ Aún no has cargado la plantilla (Word).")
 
-    if len(para_list) == 0:
-        st.error("No hay destinatarios válidos en PARA.")
-        st.stop()
+# ---- Paso ③ ----
+st.markdown("---")
+st.header("③ Marcado de campos en la plantilla y previsualización")
 
-    asunto_final = reemplazar_variables(asunto_template, fila)
-    cuerpo_final = reemplazar_variables(cuerpo_template, fila)
+# Verificamos que ambos estén cargados
+if st.session_state.df_base is None or st.session_state.indice_plantilla is None:
+    st.warning("Carga primero la base de datos (Excel) y la plantilla (Word).")
+    st.stop()
 
-    nombre_pdf, pdf_bytes, ok_pdf = obtener_pdf_para_fila(fila_prueba)
+paso_3_marcado()
 
-    if not ok_pdf:
-        st.error(f"No se encontró PDF para la fila {fila_prueba}. Esperado: {nombre_pdf}")
-        st.stop()
+# ---- Paso ④ ----
+st.markdown("---")
+st.header("④ Nombre de archivo y generación de documentos (.docx o .pdf)")
 
-    try:
-        msg = EmailMessage()
-        msg["Subject"] = asunto_final
-        msg["From"] = f"{from_name} <{from_email}>"
-        msg["To"] = ", ".join(para_list)
+# Verificaciones previas
+if obtener_almacen().ruta(st.session_state.clave_plantilla) is None:
+    st.warning("No se encontró la plantilla original en el almacén. Vuelve a cargar el archivo Word.")
+    st.stop()
 
-        if cc_list:
-            msg["Cc"] = ", ".join(cc_list)
-        if bcc_list:
-            msg["Bcc"] = ", ".join(bcc_list)
+if not st.session_state.mapeo_placeholders:
+    st.warning("Primero debes vincular las variables {{...}} a columnas de la base en el paso ③.")
+    st.stop()
 
-        msg.set_content(cuerpo_final)
+paso_4_generacion()
 
-        msg.add_attachment(
-            pdf_bytes,
-            maintype="application",
-            subtype="pdf",
-            filename=nombre_pdf
-        )
+# ---- Paso ⑤ ----
+st.markdown("---")
+st.header("⑤ Cargar PDFs convertidos y asociarlos a cada registro")
 
-        # ---- SSL/TLS O STARTTLS ----
-        if "SSL/TLS" in tipo_cifrado:
-            # Modo Outlook / corporativos (puerto 465)
-            with smtplib.SMTP_SSL(smtp_host, smtp_port) as server:
-                server.login(smtp_user, smtp_pass)
-                server.send_message(msg)
-        else:
-            # Modo Gmail y otros (puerto 587)
-            with smtplib.SMTP(smtp_host, smtp_port) as server:
-                server.starttls()
-                server.login(smtp_user, smtp_pass)
-                server.send_message(msg)
+paso_5_pdfs()
 
-        st.success(
-            f"Correo enviado correctamente.\n\n"
-            f"Para: {para_list}\n"
-            f"CC: {cc_list}\n"
-            f"BCC: {bcc_list}"
-        )
+# ---- Paso ⑥ ----
+st.markdown("---")
+st.header("⑥ Configuración de correo y envío de prueba")
 
-        st.code(
-            f"Asunto: {asunto_final}\n\n{cuerpo_final}",
-            language="text"
-        )
+if st.session_state.indice_pdfs is None or st.session_state.pdf_mapping is None:
+    st.info("Primero carga el ZIP con los PDFs en el paso ⑤ para poder adjuntarlos en correos.")
+    st.stop()
 
-    except Exception as e:
-        st.error(f"❌ Error al enviar: {e}")
+paso_6_correo()
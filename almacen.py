@@ -0,0 +1,177 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# ------------------------
+# Almacén de archivos en disco (plantillas, ZIP subidos, salidas generadas)
+# ------------------------
+# Cada sesión de Streamlit guardaba sus propias copias en memoria (la plantilla,
+# el ZIP de PDF subido): con varios operadores y ZIP de varios GB el servidor se
+# queda sin RAM. Los archivos subidos se copian a disco por pedazos bajo su
+# sha256 (dos sesiones que suben el mismo archivo comparten una sola copia) y en
+# la sesión solo queda la clave. Los ZIP se abren desde su ruta y se leen entrada
+# por entrada; los archivos que se necesitan completos (la plantilla, que se
+# hashea y se pasa a los procesos del pool) se leen del archivo con una sola
+# copia a memoria.
+#
+# Las salidas generadas (los ZIP del paso ④) se escriben en carpetas del mismo
+# almacén. Todo se borra cuando pasa `ttl_horas` sin usarse o, si el almacén
+# supera `max_mb`, empezando por lo usado hace más tiempo. En Linux borrar un
+# archivo que otra sesión tiene abierto es seguro: se libera al cerrarlo.
+
+TTL_HORAS_POR_DEFECTO = float(os.environ.get("GENERADOR_ALMACEN_TTL_HORAS", "24"))
+MAX_MB_POR_DEFECTO = int(os.environ.get("GENERADOR_ALMACEN_MB", "20480"))
+
+_TAM_PEDAZO = 1024 * 1024
+
+
+def _tamano(ruta):
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta)
+    total = 0
+    for carpeta, _, archivos in os.walk(ruta):
+        for nombre in archivos:
+            try:
+                total += os.path.getsize(os.path.join(carpeta, nombre))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _borrar(ruta):
+    try:
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta)
+        else:
+            os.remove(ruta)
+        return True
+    except OSError:
+        # Windows no deja borrar un archivo abierto; queda para la próxima expulsión
+        return False
+
+
+class AlmacenArtefactos:
+    def __init__(self, directorio, ttl_horas=TTL_HORAS_POR_DEFECTO, max_mb=MAX_MB_POR_DEFECTO):
+        self.directorio = directorio
+        self.ttl_segundos = float(ttl_horas) * 3600
+        self.max_bytes = int(max_mb) * 1024 * 1024
+        self._archivos = os.path.join(directorio, "archivos")
+        self._salidas = os.path.join(directorio, "salidas")
+        os.makedirs(self._archivos, exist_ok=True)
+        os.makedirs(self._salidas, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self._archivos, clave)
+
+    def guardar(self, origen):
+        # origen: bytes o archivo abierto (ej. el UploadedFile de Streamlit), que se
+        # copia por pedazos. Devuelve la clave (sha256 del contenido).
+        if isinstance(origen, bytes):
+            clave = hashlib.sha256(origen).hexdigest()
+            if not self.contiene(clave):
+                self._escribir(clave, [origen])
+            return clave
+
+        origen.seek(0)
+        h = hashlib.sha256()
+        fd, temporal = tempfile.mkstemp(suffix=".tmp", dir=self._archivos)
+        try:
+            with os.fdopen(fd, "wb") as destino:
+                for pedazo in iter(lambda: origen.read(_TAM_PEDAZO), b""):
+                    h.update(pedazo)
+                    destino.write(pedazo)
+            clave = h.hexdigest()
+            if self.contiene(clave):
+                os.remove(temporal)
+            else:
+                os.replace(temporal, self._ruta(clave))
+        except BaseException:
+            _borrar(temporal)
+            raise
+        self.expulsar()
+        return clave
+
+    def _escribir(self, clave, pedazos):
+        fd, temporal = tempfile.mkstemp(suffix=".tmp", dir=self._archivos)
+        with os.fdopen(fd, "wb") as destino:
+            for pedazo in pedazos:
+                destino.write(pedazo)
+        os.replace(temporal, self._ruta(clave))
+        self.expulsar()
+
+    def contiene(self, clave):
+        # También marca el archivo como usado para que la expulsión no lo borre
+        try:
+            os.utime(self._ruta(clave))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def ruta(self, clave):
+        # None si el archivo ya fue expulsado
+        return self._ruta(clave) if clave and self.contiene(clave) else None
+
+    def leer(self, clave):
+        # Contenido completo; None si ya fue expulsado
+        ruta = self.ruta(clave)
+        if ruta is None:
+            return None
+        try:
+            with open(ruta, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Expulsado entre ruta() y open()
+            return None
+
+    def nueva_salida(self):
+        # Carpeta para los ZIP de una generación; se expulsa igual que los archivos
+        self.expulsar()
+        return tempfile.mkdtemp(prefix="salida_", dir=self._salidas)
+
+    def usar_salida(self, directorio):
+        # Marca la carpeta como usada; False si ya fue expulsada
+        try:
+            os.utime(directorio)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def expulsar(self):
+        # Borra lo vencido por TTL y, si hace falta, lo usado hace más tiempo.
+        # Devuelve la cantidad de entradas borradas.
+        with self._lock:
+            ahora = time.time()
+            entradas = []
+            for carpeta in (self._archivos, self._salidas):
+                for entrada in os.scandir(carpeta):
+                    try:
+                        uso = entrada.stat().st_mtime
+                    except FileNotFoundError:
+                        continue
+                    if entrada.name.endswith(".tmp") and ahora - uso < self.ttl_segundos:
+                        # Copia en curso de otra sesión
+                        continue
+                    entradas.append((uso, entrada.path))
+            entradas.sort()
+
+            borradas = 0
+            vigentes = []
+            for uso, ruta in entradas:
+                if ahora - uso > self.ttl_segundos:
+                    borradas += _borrar(ruta)
+                else:
+                    vigentes.append((uso, ruta))
+
+            tamanos = [_tamano(ruta) for _, ruta in vigentes]
+            total = sum(tamanos)
+            for (_, ruta), tam in zip(vigentes, tamanos):
+                if total <= self.max_bytes:
+                    break
+                if _borrar(ruta):
+                    borradas += 1
+                    total -= tam
+            return borradas
@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+
+from medicion import memoria_pico_mb
+
+# ------------------------
+# Benchmark reproducible del flujo completo
+# ------------------------
+# Genera bases y plantillas sintéticas (misma semilla = mismos datos) y mide
+# cada etapa con el mismo código que usan la app y lote.py: lectura de la base,
+# detección de variables, nombres de archivo, render, escritura del ZIP,
+# emparejamiento de PDF y envío contra un servidor SMTP local que descarta los
+# correos. El reporte JSON se puede comparar entre versiones:
+#
+#   python benchmark.py --filas 1000,10000 --reporte antes.json
+#   python benchmark.py --filas 1000,10000 --reporte despues.json --comparar antes.json
+
+SEMILLA = 20240601
+
+JUZGADOS = [f"Juzgado {i} Civil Municipal de Bogotá" for i in range(1, 41)]
+
+
+def _medir(etapas, nombre, funcion, unidades=None):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    rss_proceso, rss_workers = memoria_pico_mb()
+    etapas[nombre] = {
+        "segundos": round(segundos, 4),
+        "por_segundo": round(unidades / segundos, 1) if unidades and segundos > 0 else None,
+        "rss_pico_mb": rss_proceso,
+        "rss_pico_workers_mb": rss_workers,
+    }
+    print(f"  {nombre:<24} {segundos:9.3f} s", flush=True)
+    return resultado
+
+
+# ------------------------
+# Datos sintéticos
+# ------------------------
+def columnas_sinteticas(ancho):
+    fijas = ["RADICADO", "DEMANDADO", "DEMANDANTE", "JUZGADO", "EMAIL", "VALOR", "FECHA"]
+    extra = [f"CAMPO_{i:02d}" for i in range(1, max(0, ancho - len(fijas)) + 1)]
+    return (fijas + extra)[:max(ancho, len(fijas))]
+
+
+def base_sintetica(filas, ancho):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(SEMILLA)
+    datos = {}
+    for col in columnas_sinteticas(ancho):
+        if col == "RADICADO":
+            datos[col] = [f"11001400300{i:010d}" for i in range(filas)]
+        elif col in ("DEMANDADO", "DEMANDANTE"):
+            datos[col] = [f"{col.title()} Pérez Núñez {i}" for i in rng.integers(0, filas, filas)]
+        elif col == "JUZGADO":
+            datos[col] = rng.choice(JUZGADOS, filas)
+        elif col == "EMAIL":
+            datos[col] = [f"juzgado{i}@prueba.local" for i in rng.integers(0, 500, filas)]
+        elif col == "VALOR":
+            datos[col] = rng.integers(100_000, 500_000_000, filas).astype(float)
+        elif col == "FECHA":
+            datos[col] = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, filas), unit="D")
+        else:
+            datos[col] = rng.choice(["Sí", "No", "Pendiente", "Texto de longitud media para la celda"], filas)
+    return pd.DataFrame(datos)
+
+
+def base_a_bytes(df, formato):
+    buffer = BytesIO()
+    if formato == "csv":
+        df.to_csv(buffer, index=False)
+    else:
+        df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def plantilla_sintetica(placeholders):
+    # Encabezado y pie con variables, párrafos con texto fijo y una tabla
+    from docx import Document
+
+    doc = Document()
+    seccion = doc.sections[0]
+    seccion.header.paragraphs[0].text = "Proceso {{RADICADO}}"
+    seccion.footer.paragraphs[0].text = "{{JUZGADO}}"
+
+    doc.add_heading("Memorial", level=1)
+    en_parrafos = placeholders[: max(1, len(placeholders) // 2)]
+    for i in range(0, len(en_parrafos), 3):
+        variables = " y ".join(f"{{{{{ph}}}}}" for ph in en_parrafos[i:i + 3])
+        doc.add_paragraph(
+            "Por medio del presente escrito me permito informar al despacho lo relacionado con "
+            f"{variables}, conforme a lo dispuesto en el Código General del Proceso."
+        )
+
+    en_tabla = placeholders[len(en_parrafos):]
+    if en_tabla:
+        tabla = doc.add_table(rows=len(en_tabla), cols=2)
+        for fila, ph in zip(tabla.rows, en_tabla):
+            fila.cells[0].text = ph
+            fila.cells[1].text = f"{{{{{ph}}}}}"
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def zip_pdfs_sintetico(nombres_pdf):
+    # Simula lo que entregan los convertidores: subcarpeta y extensión en mayúsculas
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for nombre in nombres_pdf:
+            zf.writestr("convertidos/" + nombre[:-4] + ".PDF", b"%PDF-1.4\n%%EOF\n")
+    return buffer.getvalue()
+
+
+# ------------------------
+# Un caso: N filas × ancho columnas × K variables
+# ------------------------
+def correr_caso(filas, ancho, placeholders, args):
+    import pandas as pd
+
+    from contexto import preparar_textos
+    from correo import (
+        CIFRADO_NINGUNO,
+        SesionSmtp,
+        columnas_de_plantillas,
+        compilar_plantillas,
+        preparar_mensajes,
+        renderizar_correos,
+    )
+    from despacho import DespachadorSmtp
+    from generacion import abrir_zip_salida, borrar_archivo_temporal, generar_documentos
+    from indice_plantilla import indexar_plantilla
+    from ingesta import leer_base
+    from nombres import ReglaNombre, con_extension
+    from pdfs import IndicePdfs
+    from plantilla import PlantillaCompilada
+    from tests.sumidero import SumideroSmtp
+    from validacion import validar_envio
+
+    print(f"Caso: {filas} filas × {ancho} columnas, {placeholders} variables", flush=True)
+    etapas = {}
+
+    columnas = columnas_sinteticas(ancho)
+    variables = columnas[:placeholders]
+    mapeo = {ph: ph for ph in variables}
+    formatos = {"VALOR": "moneda", "FECHA": "fecha"}
+
+    contenido_base = base_a_bytes(base_sintetica(filas, ancho), args.formato_base)
+    plantilla_bytes = plantilla_sintetica(variables)
+
+    # ---- ① Lectura de la base ----
+    df, _, error = _medir(
+        etapas, "ingesta",
+        lambda: leer_base(contenido_base, f"base.{args.formato_base}"),
+        filas
+    )
+    if error:
+        raise RuntimeError(error)
+
+    # ---- ② / ③ Variables de la plantilla ----
+    def detectar():
+        indice, error = indexar_plantilla(plantilla_bytes)
+        if error:
+            raise RuntimeError(error)
+        return indice
+
+    _medir(etapas, "deteccion_variables", detectar)
+    plantilla = _medir(etapas, "compilacion_plantilla", lambda: PlantillaCompilada(plantilla_bytes))
+
+    # ---- ④ Nombres de archivo ----
+    regla = ReglaNombre("Memorial_{{RADICADO}}_{{DEMANDADO}}.docx", mapeo, df.columns)
+    nombres_base, _ = _medir(
+        etapas, "nombres_archivo",
+        lambda: regla.evaluar(preparar_textos(df, regla.columnas_necesarias, formatos)),
+        filas
+    )
+
+    # ---- ④ Render puro (un proceso, sin ZIP) sobre una muestra ----
+    muestra = min(filas, args.muestra_render)
+    contextos = preparar_textos(df.head(muestra), mapeo.values(), formatos).to_dict("records")
+    documentos = _medir(
+        etapas, "render",
+        lambda: [plantilla.renderizar(contexto) for contexto in contextos],
+        muestra
+    )
+
+    # ---- ④ Escritura del ZIP con documentos ya renderizados ----
+    def escribir_zip():
+        ruta, zf = abrir_zip_salida(directorio=args.temporal)
+        with zf:
+            for i, nombre in enumerate(con_extension(nombres_base[:muestra], ".docx")):
+                zf.writestr(nombre, documentos[i])
+        borrar_archivo_temporal(ruta)
+
+    _medir(etapas, "escritura_zip", escribir_zip, muestra)
+
+    # ---- ④ Generación completa (pool de procesos + ZIP en disco) ----
+    ruta_zip, zf = abrir_zip_salida(directorio=args.temporal)
+    with zf:
+        _medir(
+            etapas, "generacion_completa",
+            lambda: generar_documentos(
+                df, plantilla_bytes, mapeo, con_extension(nombres_base, ".docx"), zf,
+                workers=args.workers, tam_lote=args.tam_lote, formatos=formatos
+            ),
+            filas
+        )
+    etapas["generacion_completa"]["tamano_salida_mb"] = round(os.path.getsize(ruta_zip) / (1024 * 1024), 2)
+    borrar_archivo_temporal(ruta_zip)
+
+    # ---- ⑤ Emparejamiento de PDF ----
+    nombres_pdf = con_extension(nombres_base, ".pdf")
+    zip_pdfs = zip_pdfs_sintetico(nombres_pdf)
+
+    def emparejar():
+        indice = IndicePdfs(zip_pdfs)
+        pdf_mapping, _ = indice.emparejar(nombres_pdf)
+        indice.asociar(pdf_mapping)
+        return indice, pdf_mapping
+
+    indice_pdfs, pdf_mapping = _medir(etapas, "emparejamiento_pdfs", emparejar, filas)
+
+    # ---- ⑥ Validación previa de toda la base ----
+    plantillas_correo = compilar_plantillas({
+        "para": "{{EMAIL}}",
+        "cc": "",
+        "bcc": "",
+        "asunto": "Memorial proceso {{RADICADO}} contra {{DEMANDADO}}",
+        "cuerpo": "Señor(a) {{JUZGADO}},\n\nAdjunto memorial del proceso {{RADICADO}}.",
+    })
+    _medir(
+        etapas, "validacion_envio",
+        lambda: validar_envio(
+            renderizar_correos(
+                plantillas_correo,
+                preparar_textos(df, columnas_de_plantillas(plantillas_correo), formatos)
+            ),
+            pdf_mapping,
+            indice_pdfs.tamanos()
+        ),
+        filas
+    )
+
+    # ---- ⑥ Envío contra el servidor SMTP local ----
+    correos_a_enviar = min(filas, args.max_correos)
+    if correos_a_enviar:
+        df_envio = df.head(correos_a_enviar)
+        correos = renderizar_correos(
+            plantillas_correo,
+            preparar_textos(df_envio, columnas_de_plantillas(plantillas_correo), formatos)
+        )
+
+        with SumideroSmtp() as sumidero:
+            despachador = DespachadorSmtp(
+                lambda: SesionSmtp("127.0.0.1", sumidero.puerto, "", "", cifrado=CIFRADO_NINGUNO),
+                sesiones=args.sesiones_smtp,
+                por_minuto=10 ** 9
+            )
+            resultados = _medir(
+                etapas, "envio_smtp",
+                lambda: despachador.enviar_todos(
+                    preparar_mensajes(correos, indice_pdfs.obtener, "Benchmark", "benchmark@prueba.local")
+                ),
+                correos_a_enviar
+            )
+        etapas["envio_smtp"]["enviados"] = int(pd.Series([r["enviado"] for r in resultados]).sum())
+    indice_pdfs.cerrar()
+
+    return {
+        "filas": filas,
+        "columnas": ancho,
+        "variables": placeholders,
+        "etapas": etapas,
+    }
+
+
+def _version_codigo():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def comparar(reporte, ruta_anterior):
+    with open(ruta_anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    casos_anteriores = {
+        (c["filas"], c["columnas"], c["variables"]): c for c in anterior["casos"]
+    }
+
+    print(f"\nComparación contra {ruta_anterior} ({anterior.get('version', '?')}):")
+    for caso in reporte["casos"]:
+        clave = (caso["filas"], caso["columnas"], caso["variables"])
+        previo = casos_anteriores.get(clave)
+        if previo is None:
+            continue
+        print(f"  {clave[0]} filas × {clave[1]} columnas, {clave[2]} variables")
+        for nombre, etapa in caso["etapas"].items():
+            antes = previo["etapas"].get(nombre)
+            if not antes or not antes["segundos"]:
+                continue
+            cambio = (etapa["segundos"] / antes["segundos"] - 1) * 100
+            print(f"    {nombre:<24} {antes['segundos']:9.3f} s -> {etapa['segundos']:9.3f} s ({cambio:+.0f} %)")
+
+
+def _enteros(texto):
+    return [int(x) for x in texto.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de generación y envío con datos sintéticos.")
+    parser.add_argument("--filas", default="1000,10000", help="Tamaños de base separados por coma (ej. 1000,10000,100000).")
+    parser.add_argument("--columnas", default="10,40", help="Anchos de base separados por coma.")
+    parser.add_argument("--variables", type=int, default=8, help="Variables {{...}} en la plantilla.")
+    parser.add_argument("--formato-base", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tam-lote", type=int, default=50)
+    parser.add_argument("--muestra-render", type=int, default=500, help="Filas para medir render y ZIP por separado.")
+    parser.add_argument("--max-correos", type=int, default=1000, help="Correos a enviar al servidor local (0 = no medir).")
+    parser.add_argument("--sesiones-smtp", type=int, default=4)
+    parser.add_argument("--reporte", default="benchmark.json")
+    parser.add_argument("--comparar", help="Reporte anterior para mostrar la diferencia por etapa.")
+    args = parser.parse_args(argv)
+
+    reporte = {
+        "version": _version_codigo(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": dict(vars(args)),
+        "casos": [],
+    }
+
+    with tempfile.TemporaryDirectory() as temporal:
+        args.temporal = temporal
+        for ancho in _enteros(args.columnas):
+            for filas in _enteros(args.filas):
+                reporte["casos"].append(correr_caso(filas, ancho, min(args.variables, ancho), args))
+
+    with open(args.reporte, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    print(f"\nReporte: {args.reporte}")
+
+    if args.comparar:
+        comparar(reporte, args.comparar)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
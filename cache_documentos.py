@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# ------------------------
+# Caché local de documentos generados
+# ------------------------
+# Cada documento queda guardado en disco bajo una huella de lo único que define
+# su contenido: el hash de la plantilla, el formato de salida y los valores ya
+# formateados que recibe (placeholder -> valor, o sea la vinculación y los datos
+# de la fila). Si se corrigen diez filas de la base o se cambia una columna, en
+# la siguiente generación solo se renderizan las filas cuya huella cambió; el
+# resto se copia de la caché al ZIP.
+#
+# El nombre del archivo no entra en la huella: cambiar la regla del nombre no
+# cambia el documento, solo su nombre dentro del ZIP.
+#
+# El tamaño se limita expulsando los documentos usados hace más tiempo. La
+# expulsión se hace al terminar cada generación para no borrar documentos que
+# la misma generación todavía va a leer.
+
+MAX_MB_POR_DEFECTO = int(os.environ.get("GENERADOR_CACHE_DOCUMENTOS_MB", "2048"))
+
+
+def prefijo_huella(hash_plantilla, salida):
+    return f"{salida}:{hash_plantilla}"
+
+
+class CacheDocumentos:
+    def __init__(self, directorio, max_mb=MAX_MB_POR_DEFECTO):
+        self.directorio = directorio
+        self.max_bytes = int(max_mb) * 1024 * 1024
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+
+        # clave -> (bytes, último uso); se arma una vez leyendo el directorio
+        self._indice = {}
+        for entrada in os.scandir(directorio):
+            if entrada.is_file() and not entrada.name.endswith(".tmp"):
+                info = entrada.stat()
+                self._indice[entrada.name] = (info.st_size, info.st_mtime)
+        self.tamano = sum(tam for tam, _ in self._indice.values())
+
+    @staticmethod
+    def huella(prefijo, contexto):
+        h = hashlib.sha256(prefijo.encode("utf-8"))
+        h.update(json.dumps(contexto, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def contiene(self, clave):
+        # Marca el documento como usado para que una expulsión (de otra sesión)
+        # no lo borre antes de que esta generación lo lea
+        with self._lock:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                return False
+            self._indice[clave] = (entrada[0], time.time())
+            return True
+
+    def leer(self, clave):
+        # None si el archivo ya no está: lo borró `vaciar` en otra sesión o la
+        # expulsión de otro proceso (lote.py) sobre el mismo directorio
+        try:
+            with open(self._ruta(clave), "rb") as f:
+                datos = f.read()
+            ahora = time.time()
+            os.utime(self._ruta(clave), (ahora, ahora))
+        except FileNotFoundError:
+            with self._lock:
+                entrada = self._indice.pop(clave, None)
+                if entrada is not None:
+                    self.tamano -= entrada[0]
+            return None
+        with self._lock:
+            self._indice[clave] = (len(datos), ahora)
+        return datos
+
+    def guardar(self, clave, datos):
+        ruta = self._ruta(clave)
+        # Escritura atómica; el nombre temporal es único por hilo
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+        with self._lock:
+            previo = self._indice.get(clave)
+            self.tamano += len(datos) - (previo[0] if previo else 0)
+            self._indice[clave] = (len(datos), time.time())
+
+    def expulsar(self):
+        # Borra los documentos usados hace más tiempo hasta quedar bajo el límite
+        with self._lock:
+            if self.tamano <= self.max_bytes:
+                return 0
+            expulsados = 0
+            for clave, (tam, _) in sorted(self._indice.items(), key=lambda x: x[1][1]):
+                if self.tamano <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._ruta(clave))
+                except FileNotFoundError:
+                    pass
+                del self._indice[clave]
+                self.tamano -= tam
+                expulsados += 1
+            return expulsados
+
+    def vaciar(self):
+        with self._lock:
+            for clave in list(self._indice):
+                try:
+                    os.remove(self._ruta(clave))
+                except FileNotFoundError:
+                    pass
+            self._indice = {}
+            self.tamano = 0
+
+    @property
+    def cantidad(self):
+        return len(self._indice)
@@ -0,0 +1,97 @@
+import json
+import os
+
+# ------------------------
+# Configuración guardada (vinculación, formatos, nombre de archivo, correos)
+# ------------------------
+# La app la descarga como JSON y el modo por lotes (lote.py) la usa para
+# repetir la misma generación y envío sin navegador. El perfil SMTP va en un
+# archivo aparte; la contraseña se toma de una variable de entorno para no
+# dejarla escrita junto a la configuración.
+
+VERSION_CONFIGURACION = 1
+
+CAMPOS_CORREO = ["para", "cc", "bcc", "asunto", "cuerpo"]
+
+# Plantillas del envío agrupado (un correo con varios PDF por destinatario)
+CAMPOS_CORREO_GRUPO = ["asunto", "cuerpo", "linea"]
+
+# Variables que solo existen en las plantillas de grupo (ver correo.py); aquí y
+# no en correo.py para que la app las use sin importar smtplib al arrancar
+VARIABLE_CANTIDAD = "CANTIDAD"  # cantidad de PDF del correo
+VARIABLE_DETALLE = "DETALLE"  # una línea por fila (plantilla de línea), separadas por salto de línea
+VARIABLE_PARTE = "PARTE"  # número de correo dentro del grupo (1, 2...)
+VARIABLES_GRUPO = [VARIABLE_CANTIDAD, VARIABLE_DETALLE, VARIABLE_PARTE]
+
+VARIABLE_CLAVE_SMTP = "GENERADOR_SMTP_CLAVE"
+
+PERFIL_SMTP_POR_DEFECTO = {
+    "host": "smtp.gmail.com",
+    "puerto": 587,
+    "cifrado": "starttls",
+    "usuario": "",
+    "remitente_nombre": "Área Judicial",
+    "remitente_correo": "",
+    "sesiones": 2,
+    "por_minuto": None,
+    "maximo_diario": None,
+    "rset_cada": 50,
+    "reconectar_cada": 500,
+}
+
+
+def configuracion_a_json(mapeo, formatos, regla_nombre, plantillas_correo=None, plantillas_grupo=None):
+    return json.dumps(
+        {
+            "version": VERSION_CONFIGURACION,
+            "mapeo": mapeo,
+            "formatos": formatos,
+            "regla_nombre": regla_nombre,
+            "correo": plantillas_correo or {},
+            "correo_grupo": plantillas_grupo or {},
+        },
+        ensure_ascii=False,
+        indent=2
+    )
+
+
+def _leer_json(ruta, que):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, f"Error al leer {que}: {e}"
+    if not isinstance(datos, dict):
+        return None, f"Error al leer {que}: se esperaba un objeto JSON."
+    return datos, None
+
+
+def leer_configuracion(ruta):
+    # Devuelve (config, error)
+    config, error = _leer_json(ruta, "la configuración")
+    if error:
+        return None, error
+    if not isinstance(config.get("mapeo"), dict) or not config["mapeo"]:
+        return None, "La configuración no tiene variables vinculadas (mapeo)."
+
+    config.setdefault("formatos", {})
+    config.setdefault("regla_nombre", "")
+    correo = config.get("correo") or {}
+    config["correo"] = {campo: correo.get(campo, "") for campo in CAMPOS_CORREO}
+    correo_grupo = config.get("correo_grupo") or {}
+    config["correo_grupo"] = {campo: correo_grupo.get(campo, "") for campo in CAMPOS_CORREO_GRUPO}
+    return config, None
+
+
+def leer_perfil_smtp(ruta):
+    # Devuelve (perfil, error); la contraseña sale de GENERADOR_SMTP_CLAVE si no está en el archivo
+    datos, error = _leer_json(ruta, "el perfil SMTP")
+    if error:
+        return None, error
+
+    perfil = dict(PERFIL_SMTP_POR_DEFECTO)
+    perfil.update(datos)
+    perfil.setdefault("clave", os.environ.get(VARIABLE_CLAVE_SMTP, ""))
+    if not perfil["remitente_correo"]:
+        perfil["remitente_correo"] = perfil["usuario"]
+    return perfil, None
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+# ------------------------
+# Preparación de valores por columna
+# ------------------------
+# Cada columna usada se convierte una sola vez a una columna de textos ya
+# formateados (vacíos en lugar de NaN, sin "1234.0", fechas legibles).
+# Luego los pasos ③ a ⑥ solo toman filas ya listas de esa tabla.
+
+FORMATOS_COLUMNA = {
+    "auto": "Automático",
+    "texto": "Texto tal cual",
+    "entero": "Número entero (1234)",
+    "numero": "Número con miles (1.234,56)",
+    "moneda": "Moneda ($ 1.234.567)",
+    "fecha": "Fecha (dd/mm/aaaa)",
+}
+
+FORMATO_FECHA = "%d/%m/%Y"
+FORMATO_FECHA_HORA = "%d/%m/%Y %H:%M"
+
+# Separadores en formato colombiano: "1,234.5" -> "1.234,5"
+_SEPARADORES_CO = str.maketrans({",": ".", ".": ","})
+
+# Int64 solo admite valores finitos dentro del rango de int64
+_LIMITE_INT64 = 2 ** 63
+
+
+def _texto_auto(valor):
+    # Conversión de un valor suelto (columnas con tipos mezclados)
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    if isinstance(valor, pd.Timestamp):
+        if valor == valor.normalize():
+            return valor.strftime(FORMATO_FECHA)
+        return valor.strftime(FORMATO_FECHA_HORA)
+    return str(valor)
+
+
+def _enteros_como_texto(numeros):
+    # numeros: floats sin decimales (o NaN). Radicados largos leídos como número
+    # pasan de int64 y no caben en Int64: entonces se convierte valor por valor
+    validas = numeros.dropna()
+    if not len(validas) or (np.isfinite(validas).all() and validas.abs().max() < _LIMITE_INT64):
+        return numeros.astype("Int64").astype(str)
+    return numeros.map(_texto_auto, na_action="ignore")
+
+
+def _formatear_auto(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        validas = serie.dropna()
+        solo_fecha = (validas == validas.dt.normalize()).all()
+        return serie.dt.strftime(FORMATO_FECHA if solo_fecha else FORMATO_FECHA_HORA)
+
+    if pd.api.types.is_float_dtype(serie):
+        validas = serie.dropna()
+        if len(validas) and (validas == validas.round()).all():
+            # Enteros que Excel/pandas leyó como float (1234.0)
+            return _enteros_como_texto(serie)
+        return serie.astype(str)
+
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return serie.astype(str)
+
+    return serie.map(_texto_auto, na_action="ignore")
+
+
+def _formatear_numero(serie, decimales, prefijo=""):
+    numeros = pd.to_numeric(serie, errors="coerce")
+    formateados = numeros.map(
+        lambda v: prefijo + f"{v:,.{decimales}f}".translate(_SEPARADORES_CO),
+        na_action="ignore"
+    )
+    # Lo que no es numérico se deja como texto original
+    return formateados.where(numeros.notna(), serie.map(_texto_auto, na_action="ignore"))
+
+
+def _formatear_entero(serie):
+    numeros = pd.to_numeric(serie, errors="coerce")
+    enteros = _enteros_como_texto(numeros.round())
+    return enteros.where(numeros.notna(), serie.map(_texto_auto, na_action="ignore"))
+
+
+def _formatear_fecha(serie):
+    # Primero ISO (2024-03-05, fechas de Excel): con dayfirst pandas lo leería como
+    # 3 de mayo. Lo demás se lee como día/mes/año
+    fechas = pd.to_datetime(serie, errors="coerce", format="ISO8601")
+    sin_leer = fechas.isna() & serie.notna()
+    if sin_leer.any():
+        fechas = fechas.where(~sin_leer, pd.to_datetime(serie.where(sin_leer), errors="coerce", dayfirst=True))
+    formateadas = fechas.dt.strftime(FORMATO_FECHA)
+    return formateadas.where(fechas.notna(), serie.map(_texto_auto, na_action="ignore"))
+
+
+def formatear_columna(serie, formato="auto"):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Solo se formatea cada categoría una vez y luego se expande por los códigos
+        categorias = formatear_columna(pd.Series(serie.cat.categories), formato).to_numpy()
+        if len(categorias) == 0:
+            return pd.Series("", index=serie.index, dtype=object)
+        codigos = serie.cat.codes.to_numpy()
+        textos = np.where(codigos >= 0, categorias[codigos], "")
+        return pd.Series(textos, index=serie.index, dtype=object)
+
+    vacios = serie.isna()
+
+    if formato == "texto":
+        textos = serie.astype(str)
+    elif formato == "entero":
+        textos = _formatear_entero(serie)
+    elif formato == "numero":
+        textos = _formatear_numero(serie, 2)
+    elif formato == "moneda":
+        textos = _formatear_numero(serie, 0, prefijo="$ ")
+    elif formato == "fecha":
+        textos = _formatear_fecha(serie)
+    else:
+        textos = _formatear_auto(serie)
+
+    return textos.where(~vacios, "").astype(object)
+
+
+def preparar_textos(df, columnas, formatos=None):
+    # Devuelve un DataFrame con las columnas pedidas (las que existan en df)
+    # convertidas a texto según el formato elegido para cada una.
+    formatos = formatos or {}
+    columnas = [c for c in dict.fromkeys(columnas) if c in df.columns]
+    return pd.DataFrame(
+        {col: formatear_columna(df[col], formatos.get(col, "auto")) for col in columnas},
+        index=df.index,
+        columns=columnas
+    )
+
+
+def contextos_por_fila(textos, mapeo):
+    # placeholder -> valor ya formateado, una lista de dicts en el orden de la base
+    tabla = pd.DataFrame(
+        {ph: (textos[col] if col in textos.columns else "") for ph, col in mapeo.items()},
+        index=textos.index,
+        columns=list(mapeo.keys())
+    )
+    return tabla.to_dict("records")
+
+
+def filas_como_dicts(textos):
+    # columna -> valor ya formateado, una lista de dicts en el orden de la base
+    return textos.to_dict("records")
@@ -0,0 +1,324 @@
+import re
+import smtplib
+from email.message import EmailMessage
+
+import pandas as pd
+
+from configuracion import VARIABLE_CANTIDAD, VARIABLE_DETALLE, VARIABLE_PARTE
+
+# ------------------------
+# Plantillas de correo (Para, CC, BCC, asunto y cuerpo)
+# ------------------------
+# Cada plantilla se divide una sola vez en textos fijos y variables {{COLUMNA}}.
+# Renderizar una fila es un solo join, y renderizar un lote completo es
+# concatenar columnas enteras.
+
+# Captura la variable completa ({{ X }}) y su nombre (X)
+_PATRON_VARIABLE = r"({{\s*([^}]+?)\s*}})"
+
+
+class PlantillaTexto:
+    def __init__(self, texto):
+        self.texto = texto or ""
+        partes = re.split(_PATRON_VARIABLE, self.texto)
+        self.literales = partes[0::3]
+        # (nombre_columna, texto_original); el original se conserva si la columna no existe
+        self.variables = list(zip(partes[2::3], partes[1::3]))
+
+    @property
+    def columnas(self):
+        return [nombre for nombre, _ in self.variables]
+
+    def renderizar(self, fila):
+        # fila: columna -> valor ya formateado
+        partes = [self.literales[0]]
+        for (nombre, original), literal in zip(self.variables, self.literales[1:]):
+            partes.append(fila.get(nombre, original))
+            partes.append(literal)
+        return "".join(partes)
+
+    def renderizar_todas(self, textos):
+        # textos: DataFrame de valores ya formateados; devuelve una Series alineada
+        resultado = pd.Series(self.literales[0], index=textos.index, dtype=object)
+        for (nombre, original), literal in zip(self.variables, self.literales[1:]):
+            if nombre in textos.columns:
+                resultado = resultado + textos[nombre].astype(str)
+            else:
+                resultado = resultado + original
+            resultado = resultado + literal
+        return resultado
+
+
+def compilar_plantillas(plantillas):
+    # plantillas: campo -> texto (ej. {"para": "{{EMAIL}}", "asunto": ...})
+    return {campo: PlantillaTexto(texto) for campo, texto in plantillas.items()}
+
+
+def columnas_de_plantillas(compiladas):
+    columnas = []
+    for plantilla in compiladas.values():
+        columnas.extend(plantilla.columnas)
+    return list(dict.fromkeys(columnas))
+
+
+def renderizar_correos(compiladas, textos):
+    # Un DataFrame con una columna por campo (para, cc, ...) para todas las filas del lote
+    return pd.DataFrame(
+        {campo: plantilla.renderizar_todas(textos) for campo, plantilla in compiladas.items()},
+        index=textos.index
+    )
+
+
+def procesar_lista_correos(cadena):
+    if not cadena:
+        return []
+    lista = [c.strip() for c in cadena.split(",") if c.strip() != ""]
+    return lista
+
+
+def construir_mensaje(from_name, from_email, para_list, cc_list, bcc_list,
+                      asunto, cuerpo, adjuntos):
+    # adjuntos: lista de (nombre_pdf, bytes)
+    msg = EmailMessage()
+    msg["Subject"] = asunto
+    msg["From"] = f"{from_name} <{from_email}>"
+    msg["To"] = ", ".join(para_list)
+
+    if cc_list:
+        msg["Cc"] = ", ".join(cc_list)
+    if bcc_list:
+        msg["Bcc"] = ", ".join(bcc_list)
+
+    msg.set_content(cuerpo)
+
+    for nombre_pdf, pdf_bytes in adjuntos:
+        msg.add_attachment(
+            pdf_bytes,
+            maintype="application",
+            subtype="pdf",
+            filename=nombre_pdf
+        )
+    return msg
+
+
+def preparar_mensajes(correos, obtener_pdf, from_name, from_email, omitir=None):
+    # correos: DataFrame de renderizar_correos (una fila por registro, en orden).
+    # obtener_pdf: fila -> (nombre_pdf, bytes, ok), ej. IndicePdfs.obtener.
+    # omitir: filas que no se deben enviar (ej. ya enviadas según el diario).
+    # Genera (fila, mensaje, error); mensaje es None si la fila no se puede enviar.
+    omitir = omitir or set()
+    for fila, correo in enumerate(correos.to_dict("records"), start=1):
+        if fila in omitir:
+            continue
+        para_list = procesar_lista_correos(correo["para"])
+        if not para_list:
+            yield fila, None, "No hay destinatarios válidos en PARA."
+            continue
+
+        nombre_pdf, pdf_bytes, ok_pdf = obtener_pdf(fila)
+        if not ok_pdf:
+            yield fila, None, f"No se encontró PDF. Esperado: {nombre_pdf}"
+            continue
+
+        msg = construir_mensaje(
+            from_name,
+            from_email,
+            para_list,
+            procesar_lista_correos(correo["cc"]),
+            procesar_lista_correos(correo["bcc"]),
+            correo["asunto"],
+            correo["cuerpo"],
+            [(nombre_pdf, pdf_bytes)]
+        )
+        yield fila, msg, None
+
+
+# ------------------------
+# Envío agrupado: un correo con varios PDF por destinatario
+# ------------------------
+# Muchas filas van al mismo juzgado, cada una con su memorial. En modo agrupado
+# las filas con los mismos destinatarios ya renderizados (Para, CC y BCC, sin
+# importar mayúsculas, espacios ni orden) van en un solo correo con todos sus
+# PDF. Se agrupa por los tres campos y no solo por Para para que un PDF nunca
+# llegue a una copia que no le corresponde. Un grupo se parte en varios correos
+# al llegar al máximo de adjuntos o de tamaño.
+#
+# El asunto y el cuerpo salen de plantillas de grupo, con los valores de la
+# primera fila del grupo más las variables de grupo (configuracion.VARIABLES_GRUPO):
+# {{CANTIDAD}}, {{DETALLE}} y {{PARTE}}.
+
+# El adjunto viaja en base64: ocupa 4/3 del tamaño del PDF
+_CRECIMIENTO_BASE64 = 4 / 3
+
+
+def _normalizar_destinatarios(serie):
+    direcciones = serie.astype(str).str.lower().str.split(",").explode().str.strip()
+    direcciones = direcciones[direcciones != ""]
+    return direcciones.sort_values().groupby(level=0).agg(",".join).reindex(serie.index, fill_value="")
+
+
+def claves_de_destinatarios(correos):
+    # Una clave por fila; misma clave = mismos Para, CC y BCC
+    return (
+        _normalizar_destinatarios(correos["para"]) + "|"
+        + _normalizar_destinatarios(correos["cc"]) + "|"
+        + _normalizar_destinatarios(correos["bcc"])
+    )
+
+
+def preparar_mensajes_agrupados(correos, textos, plantillas_grupo, obtener_pdf, from_name, from_email,
+                                max_adjuntos=10, max_mb=20, omitir=None):
+    # correos: DataFrame de renderizar_correos; textos: valores ya formateados de las
+    # mismas filas (columnas de las plantillas de grupo). plantillas_grupo: PlantillaTexto
+    # de "asunto", "cuerpo" y "linea". omitir: filas que no se deben enviar.
+    # Genera (filas, mensaje, error) con `filas` una tupla: las filas que viajan en el
+    # mensaje, o una sola fila si no se puede enviar.
+    omitir = omitir or set()
+    correos = correos.reset_index(drop=True)
+    textos = textos.reset_index(drop=True)
+
+    # Todo lo que es por fila se calcula de una vez para toda la base
+    claves = claves_de_destinatarios(correos)
+    lineas = plantillas_grupo["linea"].renderizar_todas(textos).tolist()
+    registros = correos.to_dict("records")
+    valores = textos.to_dict("records")
+    max_bytes = max_mb * 1024 * 1024
+
+    for _, posiciones in pd.Series(range(len(correos))).groupby(claves.to_numpy(), sort=False):
+        filas_grupo = [p + 1 for p in posiciones if p + 1 not in omitir]
+        if not filas_grupo:
+            continue
+
+        correo = registros[filas_grupo[0] - 1]
+        para_list = procesar_lista_correos(correo["para"])
+        if not para_list:
+            for fila in filas_grupo:
+                yield (fila,), None, "No hay destinatarios válidos en PARA."
+            continue
+        destinatarios = (para_list, procesar_lista_correos(correo["cc"]), procesar_lista_correos(correo["bcc"]))
+
+        parte = 0
+        filas, adjuntos, tamano = [], [], 0
+        for fila in filas_grupo:
+            nombre_pdf, pdf_bytes, ok_pdf = obtener_pdf(fila)
+            if not ok_pdf:
+                yield (fila,), None, f"No se encontró PDF. Esperado: {nombre_pdf}"
+                continue
+            peso = len(pdf_bytes) * _CRECIMIENTO_BASE64
+            if filas and (len(filas) >= max_adjuntos or tamano + peso > max_bytes):
+                parte += 1
+                yield tuple(filas), _mensaje_de_grupo(
+                    plantillas_grupo, valores, lineas, filas, destinatarios, adjuntos, parte, from_name, from_email
+                ), None
+                filas, adjuntos, tamano = [], [], 0
+            filas.append(fila)
+            adjuntos.append((nombre_pdf, pdf_bytes))
+            tamano += peso
+        if filas:
+            parte += 1
+            yield tuple(filas), _mensaje_de_grupo(
+                plantillas_grupo, valores, lineas, filas, destinatarios, adjuntos, parte, from_name, from_email
+            ), None
+
+
+def _mensaje_de_grupo(plantillas_grupo, valores, lineas, filas, destinatarios, adjuntos, parte,
+                      from_name, from_email):
+    contexto = dict(valores[filas[0] - 1])
+    contexto[VARIABLE_CANTIDAD] = str(len(filas))
+    contexto[VARIABLE_DETALLE] = "\n".join(lineas[fila - 1] for fila in filas)
+    contexto[VARIABLE_PARTE] = str(parte)
+    para_list, cc_list, bcc_list = destinatarios
+    return construir_mensaje(
+        from_name,
+        from_email,
+        para_list,
+        cc_list,
+        bcc_list,
+        plantillas_grupo["asunto"].renderizar(contexto),
+        plantillas_grupo["cuerpo"].renderizar(contexto),
+        adjuntos
+    )
+
+
+# ------------------------
+# Sesión SMTP reutilizable
+# ------------------------
+# Una sola conexión autenticada para muchos mensajes: el saludo TLS y el AUTH se
+# pagan una vez. Cada `rset_cada` mensajes se envía RSET para limpiar el estado
+# de la transacción y cada `reconectar_cada` mensajes se abre una conexión nueva
+# (muchos servidores cortan las sesiones largas). Si el servidor cierra la
+# conexión, se reconecta y se reintenta el mensaje una vez.
+
+CIFRADO_STARTTLS = "starttls"
+CIFRADO_SSL = "ssl"
+# Relay interno o servidor SMTP local de pruebas
+CIFRADO_NINGUNO = "ninguno"
+
+
+class SesionSmtp:
+    def __init__(self, host, puerto, usuario, clave, cifrado=CIFRADO_STARTTLS,
+                 rset_cada=50, reconectar_cada=500, timeout=60):
+        self.host = host
+        self.puerto = int(puerto)
+        self.usuario = usuario
+        self.clave = clave
+        self.cifrado = cifrado
+        self.rset_cada = rset_cada
+        self.reconectar_cada = reconectar_cada
+        self.timeout = timeout
+
+        self._server = None
+        self._enviados_conexion = 0
+        self.conexiones = 0
+
+    def conectar(self):
+        self.cerrar()
+        if self.cifrado == CIFRADO_SSL:
+            # Modo Outlook / corporativos (puerto 465)
+            server = smtplib.SMTP_SSL(self.host, self.puerto, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.puerto, timeout=self.timeout)
+            if self.cifrado == CIFRADO_STARTTLS:
+                # Modo Gmail y otros (puerto 587)
+                server.starttls()
+        if self.usuario:
+            server.login(self.usuario, self.clave)
+        self._server = server
+        self._enviados_conexion = 0
+        self.conexiones += 1
+
+    def _preparar(self):
+        if self._server is None:
+            self.conectar()
+        elif self.reconectar_cada and self._enviados_conexion >= self.reconectar_cada:
+            self.conectar()
+        elif self.rset_cada and self._enviados_conexion and self._enviados_conexion % self.rset_cada == 0:
+            try:
+                self._server.rset()
+            except smtplib.SMTPServerDisconnected:
+                self.conectar()
+
+    def enviar(self, msg):
+        self._preparar()
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # El servidor cerró la conexión: reconectamos y reintentamos una vez
+            self.conectar()
+            self._server.send_message(msg)
+        self._enviados_conexion += 1
+
+    def cerrar(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
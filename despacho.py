@@ -0,0 +1,215 @@
+import queue
+import random
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# ------------------------
+# Despachador SMTP concurrente con límite de tasa adaptativo
+# ------------------------
+# Varias sesiones SMTP trabajan en paralelo (hilos) detrás de un "token bucket"
+# común para el servidor. Cuando el proveedor responde con un error temporal
+# (421, 451, 4xx, desconexión) se reduce la tasa a la mitad y el mensaje se
+# reintenta con espera exponencial y jitter; con cada envío exitoso la tasa vuelve
+# a subir poco a poco hasta la configurada (AIMD).
+
+# Límites sugeridos por proveedor: (correos por minuto, correos por día)
+LIMITES_PROVEEDOR = {
+    "smtp.gmail.com": (60, 2000),
+    "smtp.office365.com": (30, 10000),
+    "smtp-mail.outlook.com": (30, 300),
+}
+
+LIMITES_POR_DEFECTO = (60, 0)
+
+ERROR_CUPO_DIARIO = "Cupo diario agotado: queda pendiente para la próxima ejecución."
+
+
+def limites_sugeridos(host):
+    return LIMITES_PROVEEDOR.get((host or "").strip().lower(), LIMITES_POR_DEFECTO)
+
+
+def es_error_temporal(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        # Temporal solo si todos los rechazos son 4xx
+        codigos = [codigo for codigo, _ in exc.recipients.values()]
+        return bool(codigos) and all(400 <= codigo < 500 for codigo in codigos)
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    return isinstance(exc, (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout))
+
+
+class LimitadorTasa:
+    def __init__(self, por_minuto, maximo_diario=0, rafaga=1):
+        self.tasa_objetivo = max(por_minuto, 1) / 60.0
+        self.tasa_minima = self.tasa_objetivo / 16
+        self.tasa = self.tasa_objetivo
+        self.capacidad = max(1, rafaga)
+        self.maximo_diario = maximo_diario
+        self.usados = 0
+
+        self._fichas = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def agotado(self):
+        return bool(self.maximo_diario) and self.usados >= self.maximo_diario
+
+    def reservar(self):
+        # Descuenta un mensaje del cupo diario (una vez por mensaje, aunque se
+        # reintente). Devuelve False si ya se agotó.
+        with self._lock:
+            if self.agotado:
+                return False
+            self.usados += 1
+            return True
+
+    def tomar(self):
+        # Turno para un intento de envío: espera lo necesario para respetar la tasa
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._fichas -= 1
+            espera = -self._fichas / self.tasa if self._fichas < 0 else 0
+
+        if espera:
+            time.sleep(espera)
+
+    def frenar(self):
+        with self._lock:
+            self.tasa = max(self.tasa_minima, self.tasa / 2)
+
+    def acelerar(self):
+        with self._lock:
+            self.tasa = min(self.tasa_objetivo, self.tasa + self.tasa_objetivo / 20)
+
+
+def filas_de(resultado):
+    # En el envío agrupado "fila" es la tupla de filas que viajaron en el mismo correo
+    fila = resultado["fila"]
+    return fila if isinstance(fila, tuple) else (fila,)
+
+
+def resultados_por_fila(resultados):
+    # Un resultado por fila, con el número de correo en que viajó
+    return [
+        {**resultado, "fila": fila, "correo": numero}
+        for numero, resultado in enumerate(resultados, start=1)
+        for fila in filas_de(resultado)
+    ]
+
+
+def filas_pendientes(resultados, total):
+    # Filas de la base (1..total) sin resultado: no alcanzaron a salir porque se
+    # agotó el cupo diario. No se registran en el diario, así que la próxima
+    # ejecución las envía. `resultados`: uno por fila (resultados_por_fila).
+    con_resultado = {resultado["fila"] for resultado in resultados}
+    return [
+        {"fila": fila, "enviado": False, "error": ERROR_CUPO_DIARIO, "intentos": 0, "segundos": 0.0, "correo": None}
+        for fila in range(1, total + 1)
+        if fila not in con_resultado
+    ]
+
+
+class DespachadorSmtp:
+    def __init__(self, crear_sesion, sesiones=3, por_minuto=60, maximo_diario=0,
+                 reintentos=4, espera_base=2.0, espera_maxima=120.0):
+        # crear_sesion: función sin argumentos que devuelve una SesionSmtp nueva
+        self.sesiones = max(1, int(sesiones))
+        self.limitador = LimitadorTasa(por_minuto, maximo_diario, rafaga=self.sesiones)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+
+        self._libres = queue.Queue()
+        for _ in range(self.sesiones):
+            self._libres.put(crear_sesion())
+
+    def _esperar_reintento(self, intento):
+        espera = min(self.espera_maxima, self.espera_base * (2 ** intento))
+        time.sleep(espera * random.uniform(0.5, 1.5))
+
+    def _enviar_con_reintentos(self, fila, msg):
+        # `segundos` es solo el tiempo hablando con el servidor (sin las esperas del limitador)
+        sesion = self._libres.get()
+        segundos = 0.0
+        try:
+            for intento in range(self.reintentos + 1):
+                self.limitador.tomar()
+                inicio = time.perf_counter()
+                try:
+                    sesion.enviar(msg)
+                    segundos += time.perf_counter() - inicio
+                    self.limitador.acelerar()
+                    return fila, True, None, intento + 1, segundos
+                except Exception as e:
+                    segundos += time.perf_counter() - inicio
+                    if not es_error_temporal(e) or intento == self.reintentos:
+                        return fila, False, str(e), intento + 1, segundos
+                    # El proveedor nos está frenando: bajamos la tasa y esperamos
+                    self.limitador.frenar()
+                    sesion.cerrar()
+                    self._esperar_reintento(intento)
+        finally:
+            self._libres.put(sesion)
+
+    def enviar_todos(self, mensajes, al_resultado=None):
+        # mensajes: iterable de (fila, mensaje, error) como correo.preparar_mensajes
+        # (o de (filas, mensaje, error) como correo.preparar_mensajes_agrupados).
+        # al_resultado se llama en este hilo (seguro para Streamlit) con cada
+        # resultado {"fila", "enviado", "error", "intentos", "segundos"}.
+        # Al agotarse el cupo diario se dejan de pedir mensajes: las filas que
+        # faltan no tienen resultado (ver filas_pendientes).
+        resultados = []
+
+        def registrar(fila, enviado, error, intentos, segundos=0.0):
+            resultado = {
+                "fila": fila,
+                "enviado": enviado,
+                "error": error or "",
+                "intentos": intentos,
+                "segundos": round(segundos, 4)
+            }
+            resultados.append(resultado)
+            if al_resultado is not None:
+                al_resultado(resultado)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.sesiones) as pool:
+                en_vuelo = set()
+                for fila, msg, error in mensajes:
+                    if msg is None:
+                        registrar(fila, False, error, 0)
+                        continue
+                    # El cupo se reserva solo en este hilo, así que siempre alcanza
+                    self.limitador.reservar()
+                    en_vuelo.add(pool.submit(self._enviar_con_reintentos, fila, msg))
+                    # Pocos mensajes en vuelo para no armar toda la base en memoria
+                    if len(en_vuelo) >= self.sesiones * 2:
+                        listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                        for futuro in listos:
+                            registrar(*futuro.result())
+                    if self.limitador.agotado:
+                        # No se arma ningún mensaje más
+                        break
+                while en_vuelo:
+                    listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for futuro in listos:
+                        registrar(*futuro.result())
+        finally:
+            self.cerrar()
+
+        resultados.sort(key=lambda r: r["fila"])
+        return resultados
+
+    @property
+    def conexiones(self):
+        return sum(sesion.conexiones for sesion in list(self._libres.queue))
+
+    def cerrar(self):
+        for sesion in list(self._libres.queue):
+            sesion.cerrar()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+# ------------------------
+# Diario de trabajos (SQLite en disco)
+# ------------------------
+# Guarda el estado de cada fila de un trabajo (render del .docx, envío del correo)
+# por id de trabajo + ID_INTERNO. Si la pestaña se recarga o el proceso se
+# reinicia, el trabajo se reanuda donde quedó: las filas completadas se cargan
+# una vez en un set y se omiten en O(1). Para el envío esto evita correos
+# duplicados a los juzgados.
+
+# Junto al código y no relativo a la carpeta actual: la app y lote.py (ej. desde
+# cron, que arranca en otra carpeta) comparten así el mismo diario y la misma caché
+DIR_TRABAJOS = os.path.abspath(
+    os.environ.get("GENERADOR_DIR_TRABAJOS")
+    or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".trabajos")
+)
+
+ETAPA_RENDER = "render"
+ETAPA_ENVIO = "envio"
+
+ESTADO_OK = "ok"
+ESTADO_ERROR = "error"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    descripcion TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS filas (
+    trabajo TEXT NOT NULL,
+    etapa TEXT NOT NULL,
+    id_interno TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    detalle TEXT,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (trabajo, etapa, id_interno)
+);
+"""
+
+
+def huella_base(df):
+    # Hash del contenido de la base (vectorizado, sin recorrer filas en Python)
+    valores = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    h = hashlib.sha256(valores.tobytes())
+    h.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    return h.hexdigest()
+
+
+def id_trabajo(tipo, *partes):
+    # Mismas entradas -> mismo id: así una ejecución nueva encuentra el trabajo interrumpido
+    h = hashlib.sha256(tipo.encode("utf-8"))
+    for parte in partes:
+        h.update(json.dumps(parte, sort_keys=True, default=str).encode("utf-8"))
+    return f"{tipo}-{h.hexdigest()[:16]}"
+
+
+def huella_configuracion(*partes):
+    # Resumen de lo que no forma parte del id del trabajo pero conviene saber si
+    # cambió entre ejecuciones (ej. las plantillas de un envío)
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(json.dumps(parte, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def ids_internos(df):
+    if "ID_INTERNO" in df.columns:
+        return df["ID_INTERNO"].astype(str).tolist()
+    return [str(i) for i in range(1, len(df) + 1)]
+
+
+class DiarioTrabajos:
+    def __init__(self, directorio=DIR_TRABAJOS):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._con = sqlite3.connect(
+            os.path.join(directorio, "diario.sqlite3"),
+            check_same_thread=False
+        )
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.executescript(_ESQUEMA)
+        self._lock = threading.Lock()
+
+    def directorio_trabajo(self, trabajo):
+        ruta = os.path.join(self.directorio, trabajo)
+        os.makedirs(ruta, exist_ok=True)
+        return ruta
+
+    def iniciar(self, trabajo, tipo, total, descripcion=""):
+        ahora = time.time()
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT INTO trabajos (id, tipo, total, descripcion, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET total = excluded.total, descripcion = excluded.descripcion, "
+                "actualizado = excluded.actualizado",
+                (trabajo, tipo, int(total), descripcion, ahora, ahora)
+            )
+
+    def descripcion(self, trabajo):
+        # None si el trabajo no está registrado
+        with self._lock:
+            fila = self._con.execute("SELECT descripcion FROM trabajos WHERE id = ?", (trabajo,)).fetchone()
+        return None if fila is None else fila[0]
+
+    def completadas(self, trabajo, etapa):
+        with self._lock:
+            filas = self._con.execute(
+                "SELECT id_interno FROM filas WHERE trabajo = ? AND etapa = ? AND estado = ?",
+                (trabajo, etapa, ESTADO_OK)
+            ).fetchall()
+        return {id_interno for (id_interno,) in filas}
+
+    def registrar(self, trabajo, etapa, id_interno, estado, detalle=""):
+        # Se confirma de inmediato: tras un corte no se puede perder un envío ya hecho
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO filas (trabajo, etapa, id_interno, estado, detalle, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (trabajo, etapa, str(id_interno), estado, detalle or "", time.time())
+            )
+
+    def resumen(self, trabajo, etapa):
+        with self._lock:
+            filas = self._con.execute(
+                "SELECT estado, COUNT(*) FROM filas WHERE trabajo = ? AND etapa = ? GROUP BY estado",
+                (trabajo, etapa)
+            ).fetchall()
+        return dict(filas)
+
+    def olvidar(self, trabajo, etapa):
+        # Borra las filas de una etapa; el trabajo sigue registrado
+        with self._lock, self._con:
+            self._con.execute("DELETE FROM filas WHERE trabajo = ? AND etapa = ?", (trabajo, etapa))
+
+    def reiniciar(self, trabajo):
+        with self._lock, self._con:
+            self._con.execute("DELETE FROM filas WHERE trabajo = ?", (trabajo,))
+            self._con.execute("DELETE FROM trabajos WHERE id = ?", (trabajo,))
+        shutil.rmtree(os.path.join(self.directorio, trabajo), ignore_errors=True)
+
+    def cerrar(self):
+        self._con.close()
+
+
+class ReanudacionRender:
+    # Documentos ya generados de un trabajo: se guardan en disco junto al diario
+    # para poder armar el ZIP completo al reanudar sin volver a renderizarlos.
+    def __init__(self, diario, trabajo):
+        self.diario = diario
+        self.trabajo = trabajo
+        self._dir_docs = os.path.join(diario.directorio_trabajo(trabajo), "docs")
+        os.makedirs(self._dir_docs, exist_ok=True)
+        self._hechas = diario.completadas(trabajo, ETAPA_RENDER)
+
+    @property
+    def cantidad(self):
+        return len(self._hechas)
+
+    def hecho(self, id_interno):
+        return id_interno in self._hechas
+
+    def _ruta(self, id_interno):
+        return os.path.join(self._dir_docs, hashlib.sha1(id_interno.encode("utf-8")).hexdigest())
+
+    def leer(self, id_interno):
+        with open(self._ruta(id_interno), "rb") as f:
+            return f.read()
+
+    def guardar(self, id_interno, datos):
+        ruta = self._ruta(id_interno)
+        # Escritura atómica: un corte a mitad no deja un .docx truncado marcado como hecho
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(datos)
+        os.replace(ruta + ".tmp", ruta)
+        self.diario.registrar(self.trabajo, ETAPA_RENDER, id_interno, ESTADO_OK)
+        self._hechas.add(id_interno)
+
+    def terminar(self):
+        # El trabajo se completó y sus documentos ya están en el ZIP de salida (y en
+        # la caché de documentos): las copias solo servían para reanudar y se borran
+        # para que .trabajos no crezca sin límite. Sin las copias las filas ya no se
+        # pueden tomar del disco, así que también se olvidan.
+        self.diario.olvidar(self.trabajo, ETAPA_RENDER)
+        shutil.rmtree(self._dir_docs, ignore_errors=True)
+        self._hechas = set()
@@ -0,0 +1,254 @@
+import os
+import tempfile
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+
+from cache_documentos import prefijo_huella
+from contexto import contextos_por_fila, preparar_textos
+from diario import ids_internos
+from indice_plantilla import indexar_plantilla
+from plantilla import hash_bytes, obtener_plantilla_compilada
+from plantilla_pdf import obtener_plantilla_pdf
+
+# ------------------------
+# Motor de generación de documentos (.docx o .pdf)
+# ------------------------
+# Este módulo no depende de Streamlit para que los procesos del pool
+# puedan importarlo sin levantar la app.
+
+SALIDA_DOCX = "docx"
+SALIDA_PDF = "pdf"
+
+# De dónde salió cada documento del ZIP
+ORIGEN_RENDER = "render"
+ORIGEN_CACHE = "caché"
+ORIGEN_DIARIO = "diario"
+
+# Plantilla compilada una sola vez en cada proceso del pool. Solo se usa dentro
+# de los procesos del pool: en el servidor de Streamlit todas las sesiones
+# comparten los globales del módulo, así que ahí la plantilla va por parámetro.
+_plantilla_worker = None
+
+
+def workers_disponibles():
+    return os.cpu_count() or 1
+
+
+def abrir_zip_salida(comprimir=False, directorio=None):
+    # ZIP de salida escrito directamente a un archivo temporal en disco, entrada
+    # por entrada, en vez de acumularlo en memoria.
+    # Los .docx ya vienen comprimidos por dentro, así que por defecto se guardan
+    # sin recomprimir (ZIP_STORED).
+    fd, ruta = tempfile.mkstemp(suffix=".zip", dir=directorio)
+    os.close(fd)
+    compresion = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+    return ruta, zipfile.ZipFile(ruta, "w", compresion)
+
+
+def borrar_archivo_temporal(ruta):
+    if ruta and os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def renderizar_docx(plantilla_bytes, contexto):
+    return obtener_plantilla_compilada(plantilla_bytes).renderizar(contexto)
+
+
+def previsualizar_documento(plantilla_bytes, contexto):
+    # Documento real de una fila, con la misma plantilla compilada que usa la
+    # generación. Devuelve (docx, parrafos, error); parrafos: [(ubicacion, texto)]
+    # del documento ya renderizado.
+    try:
+        docx = renderizar_docx(plantilla_bytes, contexto)
+    except Exception as e:
+        return None, None, f"Error al generar la previsualización: {e}"
+    indice, error = indexar_plantilla(docx)
+    if error:
+        return None, None, error
+    return docx, [(p["ubicacion"], p["texto"]) for p in indice.parrafos], None
+
+
+def _compilar_plantilla(plantilla_bytes, salida=SALIDA_DOCX):
+    if salida == SALIDA_PDF:
+        return obtener_plantilla_pdf(plantilla_bytes)
+    return obtener_plantilla_compilada(plantilla_bytes)
+
+
+def _inicializar_worker(plantilla_bytes, salida=SALIDA_DOCX):
+    global _plantilla_worker
+    _plantilla_worker = _compilar_plantilla(plantilla_bytes, salida)
+
+
+def _renderizar_lote(lote, plantilla=None):
+    # lote: lista de (idx, id_interno, nombre_archivo, contexto, huella).
+    # Un contexto None es una fila que no hay que renderizar: ya está en el
+    # diario de una ejecución anterior o en la caché de documentos (huella).
+    # Cada fila devuelve también la duración del render y el largo de su celda
+    # más larga, para las mediciones de rendimiento.
+    # Sin `plantilla` se usa la del proceso del pool (_inicializar_worker).
+    if plantilla is None:
+        plantilla = _plantilla_worker
+    renderizados = []
+    for idx, id_interno, nombre_archivo, contexto, huella in lote:
+        if contexto is None:
+            renderizados.append((idx, id_interno, nombre_archivo, None, 0.0, 0, huella))
+            continue
+        inicio = time.perf_counter()
+        datos = plantilla.renderizar(contexto)
+        renderizados.append((
+            idx, id_interno, nombre_archivo, datos,
+            time.perf_counter() - inicio,
+            max(map(len, contexto.values()), default=0),
+            huella
+        ))
+    return renderizados
+
+
+def _hay_que_renderizar(lote):
+    return any(contexto is not None for _, _, _, contexto, _ in lote)
+
+
+def _lotes_de_trabajo(df, contextos, nombres_archivo, tam_lote, reanudacion=None, cache=None, prefijo_cache=""):
+    ids = ids_internos(df)
+
+    lote = []
+    for idx, (id_interno, contexto, nombre_archivo) in enumerate(zip(ids, contextos, nombres_archivo), start=1):
+        huella = None
+        if reanudacion is not None and reanudacion.hecho(id_interno):
+            contexto = None
+        elif cache is not None:
+            # Mismos valores + misma plantilla = mismo documento: se reutiliza
+            huella = cache.huella(prefijo_cache, contexto)
+            if cache.contiene(huella):
+                contexto = None
+        lote.append((idx, id_interno, nombre_archivo, contexto, huella))
+        if len(lote) >= tam_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _etapa(medidor, nombre, unidades=None):
+    return medidor.etapa(nombre, unidades) if medidor is not None else nullcontext()
+
+
+def generar_documentos(df, plantilla_bytes, mapeo, nombres_archivo, zf,
+                       workers=1, tam_lote=50, al_avanzar=None, formatos=None,
+                       reanudacion=None, salida=SALIDA_DOCX, medidor=None, cache=None):
+    # Genera un documento por fila (.docx, o .pdf directo con salida=SALIDA_PDF)
+    # y los escribe en `zf` en el mismo orden de la base.
+    # `nombres_archivo` viene ya evaluado para toda la base (ver nombres.ReglaNombre).
+    # Con `reanudacion` (diario.ReanudacionRender) las filas ya generadas se toman
+    # del disco y cada documento nuevo queda registrado apenas se escribe.
+    # Con workers > 1 el render se reparte en lotes entre varios procesos y este
+    # proceso actúa como único escritor del ZIP.
+    # Con `medidor` (medicion.Medidor) se registran los tiempos por etapa y por fila.
+    # Con `cache` (cache_documentos.CacheDocumentos) solo se renderizan las filas
+    # cuyo documento no está ya en la caché; cada resultado dice su "origen".
+    with _etapa(medidor, "④ generación: total", len(df)):
+        resultados = _generar_documentos(
+            df, plantilla_bytes, mapeo, nombres_archivo, zf, workers, tam_lote,
+            al_avanzar, formatos, reanudacion, salida, medidor, cache
+        )
+    if cache is not None:
+        cache.expulsar()
+    return resultados
+
+
+def _generar_documentos(df, plantilla_bytes, mapeo, nombres_archivo, zf, workers, tam_lote,
+                        al_avanzar, formatos, reanudacion, salida, medidor, cache):
+    resultados = []
+    total = len(df)
+    # Textos formateados una sola vez por columna
+    with _etapa(medidor, "④ generación: contextos", len(df)):
+        contextos = contextos_por_fila(preparar_textos(df, mapeo.values(), formatos), mapeo)
+    lotes = _lotes_de_trabajo(
+        df, contextos, nombres_archivo, max(1, int(tam_lote)), reanudacion,
+        cache, prefijo_huella(hash_bytes(plantilla_bytes), salida)
+    )
+
+    def escribir(lote_renderizado):
+        for idx, id_interno, nombre_archivo, datos, segundos_render, celda_mas_larga, huella in lote_renderizado:
+            inicio = time.perf_counter()
+            if datos is None and huella is not None:
+                datos = cache.leer(huella)
+                origen, etapa_disco = ORIGEN_CACHE, "④ generación: lectura de caché"
+                if datos is None:
+                    # Se borró de la caché después de revisarla: se renderiza aquí,
+                    # con la plantilla de esta misma llamada (docx o pdf según `salida`)
+                    _, _, _, datos, segundos_render, celda_mas_larga, _ = _renderizar_lote(
+                        [(idx, id_interno, nombre_archivo, contextos[idx - 1], huella)],
+                        _compilar_plantilla(plantilla_bytes, salida)
+                    )[0]
+                    cache.guardar(huella, datos)
+                    origen = ORIGEN_RENDER
+                    if reanudacion is not None:
+                        reanudacion.guardar(id_interno, datos)
+            elif datos is None:
+                datos = reanudacion.leer(id_interno)
+                origen, etapa_disco = ORIGEN_DIARIO, "④ generación: lectura del diario"
+            else:
+                origen, etapa_disco = ORIGEN_RENDER, "④ generación: escritura en disco"
+                if reanudacion is not None:
+                    reanudacion.guardar(id_interno, datos)
+                if huella is not None:
+                    cache.guardar(huella, datos)
+            medio = time.perf_counter()
+            zf.writestr(nombre_archivo, datos)
+            fin = time.perf_counter()
+            resultados.append({
+                "fila": idx,
+                "nombre_archivo": nombre_archivo,
+                "origen": origen
+            })
+
+            if medidor is not None:
+                # Con el pool, el render suma lo que tardó cada proceso
+                if segundos_render:
+                    medidor.fila("④ generación: render", idx, segundos_render,
+                                 celda_mas_larga=celda_mas_larga, bytes=len(datos))
+                if reanudacion is not None or cache is not None:
+                    medidor.fila(etapa_disco, idx, medio - inicio)
+                medidor.fila("④ generación: escritura ZIP", idx, fin - medio, bytes=len(datos))
+        if al_avanzar is not None and total:
+            al_avanzar(len(resultados) / total)
+
+    if workers <= 1 or total <= tam_lote:
+        # Camino serial: mismo código de render, sin pool. La plantilla solo se
+        # compila si algún documento hay que renderizarlo.
+        plantilla = None
+        for lote in lotes:
+            if plantilla is None and _hay_que_renderizar(lote):
+                with _etapa(medidor, "④ generación: compilación de plantilla"):
+                    plantilla = _compilar_plantilla(plantilla_bytes, salida)
+            escribir(_renderizar_lote(lote, plantilla))
+    else:
+        # "spawn" evita heredar los hilos del servidor de Streamlit con fork
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_inicializar_worker,
+            initargs=(plantilla_bytes, salida)
+        ) as pool:
+            # Limitamos los lotes en vuelo para no acumular resultados en memoria
+            en_vuelo = []
+            max_en_vuelo = workers * 2
+            for lote in lotes:
+                if _hay_que_renderizar(lote):
+                    en_vuelo.append(pool.submit(_renderizar_lote, lote))
+                else:
+                    # Todo el lote sale del diario o de la caché: no pasa por el pool
+                    listo = Future()
+                    listo.set_result(_renderizar_lote(lote))
+                    en_vuelo.append(listo)
+                if len(en_vuelo) >= max_en_vuelo:
+                    escribir(en_vuelo.pop(0).result())
+            for futuro in en_vuelo:
+                escribir(futuro.result())
+
+    return resultados
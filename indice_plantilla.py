@@ -0,0 +1,149 @@
+import re
+import zipfile
+from collections import Counter
+from io import BytesIO
+
+from nombres import PATRON_PLACEHOLDER
+
+# ------------------------
+# Índice de variables de la plantilla Word
+# ------------------------
+# Una sola pasada por todas las partes del .docx que tienen texto (cuerpo,
+# encabezados, pies de página, notas) arma el índice placeholder -> dónde aparece,
+# en qué párrafos y cuántas veces. Recorre el XML directamente, así que también
+# encuentra las variables dentro de tablas y cuadros de texto, y como el texto de
+# cada párrafo se arma juntando todos sus runs, una variable que Word partió en
+# varios runs ({{NOM + BRE}}) se detecta completa.
+#
+# La app lo cachea por hash de la plantilla y lo usa el paso ③ para la
+# vinculación, la previsualización y el aviso de variables sin vincular.
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+_P = _W + "p"
+_R = _W + "r"
+_T = _W + "t"
+_TAB = _W + "tab"
+_BR = _W + "br"
+_CR = _W + "cr"
+_TBL = _W + "tbl"
+_TXBX = _W + "txbxContent"
+_FALLBACK = _MC + "Fallback"
+
+# Partes con texto, en el orden en que se muestran
+_PARTES = [
+    (r"word/document\.xml", "cuerpo"),
+    (r"word/header(\d*)\.xml", "encabezado"),
+    (r"word/footer(\d*)\.xml", "pie de página"),
+    (r"word/footnotes\.xml", "notas al pie"),
+    (r"word/endnotes\.xml", "notas al final"),
+]
+
+
+def _partes_con_texto(nombres):
+    partes = []
+    for patron, etiqueta in _PARTES:
+        encontradas = []
+        for nombre in nombres:
+            coincidencia = re.fullmatch(patron, nombre)
+            if coincidencia:
+                numero = coincidencia.group(1) if coincidencia.groups() else ""
+                encontradas.append((int(numero or 0), nombre, f"{etiqueta} {numero}".strip()))
+        partes.extend((nombre, etiqueta) for _, nombre, etiqueta in sorted(encontradas))
+    return partes
+
+
+def _parrafos_de_parte(raiz, etiqueta):
+    # [(ubicacion, texto)] de los párrafos con texto, en el orden del documento
+    numero_tabla = {tabla: i for i, tabla in enumerate(raiz.iter(_TBL), start=1)}
+
+    # Cada pedazo de texto va al párrafo más cercano que lo contiene: así el texto
+    # de un cuadro de texto no se mezcla con el del párrafo donde está anclado
+    textos = {}
+    for elemento in raiz.iter(_T, _TAB, _BR, _CR):
+        parrafo = next(elemento.iterancestors(_P), None)
+        if parrafo is None:
+            continue
+        if elemento.tag == _T:
+            pedazo = elemento.text or ""
+        elif elemento.getparent().tag != _R:
+            # w:tab también define las tabulaciones en las propiedades del párrafo
+            continue
+        else:
+            pedazo = "\t" if elemento.tag == _TAB else "\n"
+        textos.setdefault(parrafo, []).append(pedazo)
+
+    resultado = []
+    for parrafo in raiz.iter(_P):
+        texto = "".join(textos.get(parrafo, ()))
+        if not texto.strip():
+            continue
+
+        ubicacion = etiqueta
+        en_cuadro = False
+        tabla = None
+        for ancestro in parrafo.iterancestors():
+            if ancestro.tag == _FALLBACK:
+                # Copia del cuadro de texto para versiones viejas de Word
+                break
+            if ancestro.tag == _TXBX:
+                en_cuadro = True
+            elif ancestro.tag == _TBL and tabla is None:
+                tabla = ancestro
+        else:
+            if en_cuadro:
+                ubicacion += " · cuadro de texto"
+            elif tabla is not None:
+                ubicacion += f" · tabla {numero_tabla[tabla]}"
+            resultado.append((ubicacion, texto))
+    return resultado
+
+
+class IndicePlaceholders:
+    def __init__(self, parrafos):
+        # parrafos: [(ubicacion, texto)] de todo el documento
+        self.parrafos = []
+        # placeholder -> {"veces", "parrafos" (ids), "ubicaciones"}
+        self.por_placeholder = {}
+
+        for id_parrafo, (ubicacion, texto) in enumerate(parrafos, start=1):
+            veces = Counter(re.findall(PATRON_PLACEHOLDER, texto))
+            self.parrafos.append({
+                "id": id_parrafo,
+                "ubicacion": ubicacion,
+                "texto": texto,
+                "placeholders": sorted(veces)
+            })
+            for ph, n in veces.items():
+                entrada = self.por_placeholder.setdefault(ph, {"veces": 0, "parrafos": [], "ubicaciones": []})
+                entrada["veces"] += n
+                entrada["parrafos"].append(id_parrafo)
+                if ubicacion not in entrada["ubicaciones"]:
+                    entrada["ubicaciones"].append(ubicacion)
+
+    @property
+    def placeholders(self):
+        return sorted(self.por_placeholder)
+
+    @property
+    def parrafos_con_variables(self):
+        return [p for p in self.parrafos if p["placeholders"]]
+
+    def sin_vincular(self, mapeo):
+        return [ph for ph in self.placeholders if ph not in mapeo]
+
+
+def indexar_plantilla(contenido):
+    # Devuelve (indice, error)
+    from lxml import etree
+
+    try:
+        parrafos = []
+        with zipfile.ZipFile(BytesIO(contenido), "r") as zf:
+            for nombre, etiqueta in _partes_con_texto(zf.namelist()):
+                raiz = etree.fromstring(zf.read(nombre))
+                parrafos.extend(_parrafos_de_parte(raiz, etiqueta))
+        return IndicePlaceholders(parrafos), None
+    except Exception as e:
+        return None, f"Error al leer el Word: {e}"
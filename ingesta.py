@@ -0,0 +1,138 @@
+import csv
+import importlib.util
+import re
+import time
+from io import BytesIO
+
+import pandas as pd
+
+from nombres import PATRON_PLACEHOLDER
+
+# ------------------------
+# Lectura de la base (Excel, CSV, Parquet)
+# ------------------------
+# Reciben los bytes del archivo subido para que la app pueda cachear el
+# resultado por hash del contenido. Las variables de la plantilla Word las
+# detecta indice_plantilla.
+
+FORMATOS_BASE = ["xlsx", "xls", "csv", "parquet"]
+
+# Paquete que pandas necesita para leer cada formato (ver requirements.txt)
+PAQUETE_POR_FORMATO = {
+    "xlsx": "openpyxl",
+    "xls": "xlrd",
+    "parquet": "pyarrow",
+}
+
+# Columnas de texto con pocos valores distintos (JUZGADO, ABOGADO...) se guardan
+# como categorías: cada valor se almacena una sola vez.
+PROPORCION_MAX_CATEGORICA = 0.5
+
+
+def _motor_excel(extension):
+    # calamine (Rust) es varias veces más rápido que openpyxl; se usa si está instalado
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "xlrd" if extension == "xls" else "openpyxl"
+
+
+def _separador_csv(muestra):
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def _leer_csv(contenido, usecols):
+    for codificacion in ("utf-8-sig", "latin-1"):
+        try:
+            muestra = contenido[:65536].decode(codificacion, errors="ignore")
+            return pd.read_csv(
+                BytesIO(contenido),
+                sep=_separador_csv(muestra),
+                encoding=codificacion,
+                usecols=usecols
+            )
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("No se pudo detectar la codificación del CSV.")
+
+
+def _leer_parquet(contenido, columnas):
+    if columnas is not None:
+        import pyarrow.parquet as pq
+
+        disponibles = pq.read_schema(BytesIO(contenido)).names
+        columnas = [c for c in disponibles if c in columnas]
+    return pd.read_parquet(BytesIO(contenido), columns=columnas)
+
+
+def _a_categorias(df):
+    total = len(df)
+    if total == 0:
+        return df
+    for col in df.columns:
+        serie = df[col]
+        # Texto: object, o StringDtype (el tipo por defecto del texto desde pandas 3)
+        es_texto = pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)
+        if es_texto and serie.nunique(dropna=True) <= total * PROPORCION_MAX_CATEGORICA:
+            df[col] = serie.astype("category")
+    return df
+
+
+def columnas_requeridas(mapeo, regla_nombre, plantillas_texto=()):
+    # Columnas que de verdad usa la configuración: vinculación de la plantilla,
+    # regla del nombre de archivo y plantillas de correo
+    columnas = ["ID_INTERNO"] + list(mapeo.values())
+    for texto in [regla_nombre, *plantillas_texto]:
+        columnas.extend(re.findall(PATRON_PLACEHOLDER, texto or ""))
+    return list(dict.fromkeys(columnas))
+
+
+def leer_base(contenido, nombre_archivo, columnas=None):
+    # Devuelve (df, info, error). `columnas` limita la lectura a esas columnas
+    # (las que no existan en el archivo se ignoran). `info` trae el tiempo de
+    # carga y la memoria ocupada para dimensionar el servidor.
+    extension = nombre_archivo.rsplit(".", 1)[-1].lower()
+    usecols = None
+    if columnas is not None:
+        columnas = set(columnas)
+        usecols = lambda c: c in columnas
+
+    inicio = time.perf_counter()
+    try:
+        if extension == "csv":
+            motor = "pandas (C)"
+            df = _leer_csv(contenido, usecols)
+        elif extension == "parquet":
+            motor = "pyarrow"
+            df = _leer_parquet(contenido, columnas)
+        else:
+            motor = _motor_excel(extension)
+            df = pd.read_excel(BytesIO(contenido), engine=motor, usecols=usecols)
+    except ImportError as e:
+        paquete = PAQUETE_POR_FORMATO.get(extension)
+        if paquete is None:
+            return None, None, f"Error al leer la base: {e}"
+        return None, None, (
+            f"Para leer archivos .{extension} falta instalar el paquete {paquete} "
+            f"(pip install {paquete})."
+        )
+    except Exception as e:
+        return None, None, f"Error al leer la base: {e}"
+
+    # Creamos un ID interno por fila para usar más adelante
+    if "ID_INTERNO" not in df.columns:
+        df.insert(0, "ID_INTERNO", range(1, len(df) + 1))
+    df = _a_categorias(df)
+
+    info = {
+        "motor": motor,
+        "segundos": time.perf_counter() - inicio,
+        "filas": len(df),
+        "columnas": len(df.columns),
+        "memoria_mb": df.memory_usage(deep=True).sum() / (1024 * 1024),
+        "tamano_archivo_mb": len(contenido) / (1024 * 1024),
+    }
+    return df, info, None
+
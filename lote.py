@@ -0,0 +1,505 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from configuracion import leer_configuracion, leer_perfil_smtp
+from contexto import preparar_textos
+from indice_plantilla import indexar_plantilla
+from ingesta import leer_base
+from medicion import Medidor
+from nombres import ReglaNombre, con_extension
+from particiones import SalidaParticionada, grupos_por_nombre
+from pdfs import IndicePdfs, mapping_de_generados
+from plantilla import hash_bytes
+
+# ------------------------
+# Modo por lotes (sin navegador)
+# ------------------------
+# Corre los mismos pasos de la app desde la línea de comandos, para cron o para
+# un servidor con más núcleos:
+#
+#   python lote.py --base base.xlsx --plantilla plantilla.docx \
+#       --config configuracion.json --salida salida/ --formato pdf --workers 8
+#
+#   python lote.py ... --pdfs convertidos.zip --enviar --smtp perfil_smtp.json
+#
+#   python lote.py ... --agrupar-por JUZGADO --max-mb 500
+#
+#   python lote.py ... --enviar --smtp perfil_smtp.json --agrupar-correos --max-adjuntos 20
+#
+# La configuración es el JSON que se descarga en el paso ④ de la app. El avance
+# queda en el mismo diario que usa la app, así que una corrida interrumpida se
+# reanuda sin repetir documentos ni correos. El diario y la caché están en
+# .trabajos junto al código, desde cualquier carpeta en que se corra (o en
+# GENERADOR_DIR_TRABAJOS).
+
+log = logging.getLogger("generador.lote")
+
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(
+        description="Genera los documentos de toda la base y, opcionalmente, envía los correos."
+    )
+    parser.add_argument("--base", required=True, help="Base en Excel, CSV o Parquet.")
+    parser.add_argument("--plantilla", required=True, help="Plantilla Word (.docx).")
+    parser.add_argument("--config", required=True, help="Configuración JSON descargada de la app.")
+    parser.add_argument("--salida", default="salida", help="Carpeta donde se dejan el ZIP y los reportes.")
+    parser.add_argument("--formato", choices=["docx", "pdf"], default="docx")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tam-lote", type=int, default=50)
+    parser.add_argument("--comprimir", action="store_true", help="Comprimir los documentos dentro del ZIP.")
+    parser.add_argument("--max-mb", type=float, help="Partir la salida en ZIP de como máximo este tamaño.")
+    parser.add_argument("--max-documentos", type=int, help="Partir la salida en ZIP de esta cantidad de documentos.")
+    parser.add_argument("--agrupar-por", metavar="COLUMNA", help="Un ZIP por cada valor de la columna (ej. JUZGADO).")
+    parser.add_argument("--sin-diario", action="store_true", help="No guardar ni reanudar el avance.")
+    parser.add_argument("--sin-cache", action="store_true", help="Renderizar todo aunque el documento no haya cambiado.")
+    parser.add_argument("--pdfs", help="ZIP con los PDF convertidos por fuera (si --formato docx).")
+    parser.add_argument("--enviar", action="store_true", help="Enviar un correo por fila con su PDF.")
+    parser.add_argument("--smtp", help="Perfil SMTP en JSON (obligatorio con --enviar).")
+    parser.add_argument("--limite-mensaje-mb", type=float, help="Tamaño máximo de un correo en el proveedor.")
+    parser.add_argument(
+        "--agrupar-correos", action="store_true",
+        help="Un solo correo con todos los PDF de las filas con los mismos Para, CC y BCC "
+             "(plantillas en \"correo_grupo\" de la configuración)."
+    )
+    parser.add_argument("--max-adjuntos", type=int, default=10, help="Máximo de PDF por correo agrupado.")
+    parser.add_argument("--max-mb-correo", type=float, help="Máximo de MB de adjuntos (en base64) por correo agrupado.")
+    parser.add_argument("--log", help="Archivo donde también se escribe el registro.")
+    parser.add_argument("--mediciones", help="Archivo JSON lines con los tiempos por etapa y por fila.")
+    return parser.parse_args(argv)
+
+
+def _configurar_log(ruta_log):
+    manejadores = [logging.StreamHandler(sys.stdout)]
+    if ruta_log:
+        manejadores.append(logging.FileHandler(ruta_log, encoding="utf-8"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=manejadores
+    )
+
+
+def _reportar_avance(etiqueta, cada=0.05):
+    # Escribe el avance cada 5 % para no llenar el registro
+    siguiente = [cada]
+
+    def al_avanzar(fraccion):
+        if fraccion >= siguiente[0] or fraccion >= 1:
+            log.info("%s: %.0f %%", etiqueta, fraccion * 100)
+            while siguiente[0] <= fraccion:
+                siguiente[0] += cada
+
+    return al_avanzar
+
+
+def _reportar_mediciones(medidor):
+    for etapa in medidor.resumen():
+        log.info(
+            "Medición %s: %.3f s, %s unidades/s, p95 %s ms, memoria pico %s MB",
+            etapa["etapa"], etapa["segundos"], etapa["por_segundo"], etapa["p95_ms"], etapa["rss_pico_mb"]
+        )
+    for lenta in medidor.filas_lentas()[:5]:
+        log.info("Fila lenta: %s", lenta)
+
+
+def generar(df, plantilla_bytes, config, nombres_base, args, diario, medidor):
+    from cache_documentos import CacheDocumentos
+    from diario import DIR_TRABAJOS, ReanudacionRender, huella_base, id_trabajo
+    from generacion import ORIGEN_CACHE, generar_documentos
+
+    extension = "." + args.formato
+    reanudacion = None
+    if diario is not None:
+        tipo_render = "render" if args.formato == "docx" else "render_pdf"
+        trabajo_render = id_trabajo(
+            tipo_render,
+            hash_bytes(plantilla_bytes),
+            huella_base(df),
+            config["mapeo"],
+            config["formatos"]
+        )
+        diario.iniciar(trabajo_render, tipo_render, len(df))
+        reanudacion = ReanudacionRender(diario, trabajo_render)
+        if reanudacion.cantidad:
+            log.info("Reanudando: %d documentos ya generados en una corrida anterior.", reanudacion.cantidad)
+
+    cache = None
+    if not args.sin_cache:
+        cache = CacheDocumentos(os.path.join(DIR_TRABAJOS, "cache_documentos"))
+
+    nombres_archivo = con_extension(nombres_base, extension)
+    grupo_por_nombre = None
+    if args.agrupar_por:
+        grupo_por_nombre = grupos_por_nombre(
+            nombres_archivo,
+            preparar_textos(df, [args.agrupar_por], config["formatos"])[args.agrupar_por]
+        )
+
+    def al_completar(parte):
+        log.info(
+            "ZIP completo: %s (%d documentos, %.1f MB)",
+            parte["ruta"], parte["documentos"], parte["bytes"] / (1024 * 1024)
+        )
+
+    salida_zip = SalidaParticionada(
+        args.salida,
+        "documentos_generados",
+        extension,
+        comprimir=args.comprimir,
+        max_mb=args.max_mb,
+        max_documentos=args.max_documentos,
+        grupo_por_nombre=grupo_por_nombre,
+        al_completar=al_completar
+    )
+    inicio = time.perf_counter()
+    try:
+        resultados = generar_documentos(
+            df,
+            plantilla_bytes,
+            config["mapeo"],
+            nombres_archivo,
+            salida_zip,
+            workers=args.workers,
+            tam_lote=args.tam_lote,
+            al_avanzar=_reportar_avance("Generación"),
+            formatos=config["formatos"],
+            reanudacion=reanudacion,
+            salida=args.formato,
+            medidor=medidor,
+            cache=cache
+        )
+    finally:
+        salida_zip.cerrar()
+    if reanudacion is not None:
+        reanudacion.terminar()
+    segundos = time.perf_counter() - inicio
+
+    log.info(
+        "Se generaron %d documentos %s en %.1f s (%.1f doc/s) en %d ZIP.",
+        len(resultados), extension, segundos, len(resultados) / max(segundos, 1e-9), len(salida_zip.partes)
+    )
+    if cache is not None:
+        reutilizados = sum(1 for r in resultados if r["origen"] == ORIGEN_CACHE)
+        log.info("Reutilizados sin cambios desde la caché: %d documentos.", reutilizados)
+
+    return salida_zip.rutas, resultados
+
+
+def indice_de_generados(rutas_zip, resultados):
+    indice_pdfs = IndicePdfs(rutas_zip)
+    pdf_mapping = mapping_de_generados(resultados)
+    indice_pdfs.asociar(pdf_mapping)
+    return indice_pdfs, pdf_mapping
+
+
+def emparejar(ruta_pdfs, nombres_base):
+    indice_pdfs = IndicePdfs(ruta_pdfs)
+    pdf_mapping, sobrantes = indice_pdfs.emparejar(con_extension(nombres_base, ".pdf"))
+    indice_pdfs.asociar(pdf_mapping)
+
+    sin_pdf = sum(1 for item in pdf_mapping if not item["encontrado"])
+    log.info(
+        "PDF asociados: %d de %d (%d sin PDF o ambiguos, %d archivos del ZIP sin registro).",
+        len(pdf_mapping) - sin_pdf, len(pdf_mapping), sin_pdf, len(sobrantes)
+    )
+    return indice_pdfs, pdf_mapping
+
+
+def enviar(df, huella_archivo, config, perfil, indice_pdfs, pdf_mapping, args, diario, medidor):
+    import pandas as pd
+
+    from correo import (
+        SesionSmtp,
+        columnas_de_plantillas,
+        compilar_plantillas,
+        preparar_mensajes,
+        preparar_mensajes_agrupados,
+        renderizar_correos,
+    )
+    from despacho import DespachadorSmtp, filas_de, filas_pendientes, limites_sugeridos, resultados_por_fila
+    from diario import ESTADO_ERROR, ESTADO_OK, ETAPA_ENVIO, huella_configuracion, id_trabajo, ids_internos
+    from validacion import limite_mensaje_sugerido, resumen_validacion, validar_envio
+
+    plantillas_correo = compilar_plantillas(config["correo"])
+    plantillas_grupo = compilar_plantillas(config["correo_grupo"]) if args.agrupar_correos else None
+    limite_mensaje_mb = args.limite_mensaje_mb or limite_mensaje_sugerido(perfil["host"])
+    with medidor.etapa("⑥ envío: render de correos", len(df)):
+        correos = renderizar_correos(
+            plantillas_correo,
+            preparar_textos(df, columnas_de_plantillas(plantillas_correo), config["formatos"])
+        )
+
+    # ---- Validación previa de toda la base ----
+    with medidor.etapa("⑥ validación previa", len(df)):
+        reporte = validar_envio(
+            correos,
+            pdf_mapping,
+            indice_pdfs.tamanos(),
+            limite_mensaje_mb
+        )
+    ruta_validacion = os.path.join(args.salida, "validacion_envio.csv")
+    reporte.to_csv(ruta_validacion, index=False)
+    for problema, filas in resumen_validacion(reporte).items():
+        if filas:
+            log.warning("Validación: %d filas con %s.", filas, problema)
+    log.info(
+        "Validación: %d de %d filas sin problemas. Reporte: %s",
+        int(reporte["ok"].sum()), len(reporte), ruta_validacion
+    )
+
+    total_filas = len(df)
+    ids_filas = ids_internos(df)
+    filas_ya_enviadas = set()
+    trabajo_envio = None
+    if diario is not None:
+        # Mismo trabajo que en la app: solo depende del archivo de la base
+        trabajo_envio = id_trabajo("envio", huella_archivo)
+        configuracion_envio = huella_configuracion(
+            {campo: plantilla.texto for campo, plantilla in plantillas_correo.items()},
+            perfil["remitente_correo"],
+            perfil["host"],
+            None if plantillas_grupo is None else (
+                {campo: plantilla.texto for campo, plantilla in plantillas_grupo.items()},
+                args.max_adjuntos,
+                args.max_mb_correo or limite_mensaje_mb
+            )
+        )
+        ya_enviados = diario.completadas(trabajo_envio, ETAPA_ENVIO)
+        filas_ya_enviadas = {
+            fila for fila, id_interno in enumerate(ids_filas, start=1) if id_interno in ya_enviados
+        }
+        if filas_ya_enviadas:
+            log.info("%d correos ya se enviaron en una corrida anterior; no se repiten.", len(filas_ya_enviadas))
+            if diario.descripcion(trabajo_envio) not in (None, "", configuracion_envio):
+                log.warning(
+                    "Las plantillas de correo, el remitente o el servidor cambiaron desde esa corrida: "
+                    "las filas pendientes salen con la configuración actual."
+                )
+        diario.iniciar(trabajo_envio, "envio", total_filas, configuracion_envio)
+
+    por_minuto_sugerido, por_dia_sugerido = limites_sugeridos(perfil["host"])
+    por_minuto = perfil["por_minuto"] or por_minuto_sugerido
+    maximo_diario = perfil["maximo_diario"] if perfil["maximo_diario"] is not None else por_dia_sugerido
+
+    pendientes = total_filas - len(filas_ya_enviadas)
+    al_avanzar = _reportar_avance("Envío")
+    procesados = [0]
+
+    def al_resultado(resultado):
+        # Un correo agrupado registra todas sus filas
+        filas = filas_de(resultado)
+        if trabajo_envio is not None:
+            for fila in filas:
+                diario.registrar(
+                    trabajo_envio,
+                    ETAPA_ENVIO,
+                    ids_filas[fila - 1],
+                    ESTADO_OK if resultado["enviado"] else ESTADO_ERROR,
+                    resultado["error"]
+                )
+        if not resultado["enviado"]:
+            log.warning(
+                "Fila(s) %s sin enviar: %s", ", ".join(str(fila) for fila in filas), resultado["error"]
+            )
+        if resultado["intentos"]:
+            medidor.fila(
+                "⑥ envío: SMTP", filas[0], resultado["segundos"],
+                intentos=resultado["intentos"], adjuntos=len(filas)
+            )
+        procesados[0] += len(filas)
+        al_avanzar(procesados[0] / pendientes)
+
+    despachador = DespachadorSmtp(
+        lambda: SesionSmtp(
+            perfil["host"],
+            perfil["puerto"],
+            perfil["usuario"],
+            perfil["clave"],
+            cifrado=perfil["cifrado"],
+            rset_cada=int(perfil["rset_cada"]),
+            reconectar_cada=int(perfil["reconectar_cada"])
+        ),
+        sesiones=int(perfil["sesiones"]),
+        por_minuto=int(por_minuto),
+        maximo_diario=int(maximo_diario)
+    )
+    if plantillas_grupo is None:
+        mensajes = preparar_mensajes(
+            correos,
+            indice_pdfs.obtener,
+            perfil["remitente_nombre"],
+            perfil["remitente_correo"],
+            omitir=filas_ya_enviadas
+        )
+    else:
+        mensajes = preparar_mensajes_agrupados(
+            correos,
+            preparar_textos(df, columnas_de_plantillas(plantillas_grupo), config["formatos"]),
+            plantillas_grupo,
+            indice_pdfs.obtener,
+            perfil["remitente_nombre"],
+            perfil["remitente_correo"],
+            max_adjuntos=args.max_adjuntos,
+            max_mb=args.max_mb_correo or limite_mensaje_mb,
+            omitir=filas_ya_enviadas
+        )
+    if pendientes:
+        log.info(
+            "Enviando %d filas%s con %d sesiones SMTP (máx. %d correos por minuto).",
+            pendientes, "" if plantillas_grupo is None else " agrupadas por destinatario",
+            despachador.sesiones, por_minuto
+        )
+        with medidor.etapa("⑥ envío: total", pendientes):
+            resultados_envio = despachador.enviar_todos(mensajes, al_resultado=al_resultado)
+    else:
+        log.info("No hay filas pendientes de envío: todas se enviaron en corridas anteriores.")
+        resultados_envio = []
+    correos_enviados = sum(1 for r in resultados_envio if r["enviado"])
+
+    # Una fila del resultado por fila de la base, con el correo en que viajó
+    resultados_envio = resultados_por_fila(resultados_envio)
+    resultados_envio += [
+        {"fila": fila, "enviado": True, "error": "", "intentos": 0, "segundos": 0.0, "correo": None}
+        for fila in filas_ya_enviadas
+    ]
+    # Lo que no alcanzó a salir por el cupo diario se envía en la próxima ejecución
+    sin_enviar_por_cupo = filas_pendientes(resultados_envio, total_filas)
+    resultados_envio += sin_enviar_por_cupo
+    resultados_envio.sort(key=lambda r: r["fila"])
+
+    resultados_envio_df = pd.DataFrame(resultados_envio)
+    resultados_envio_df.insert(1, "para", correos["para"].to_numpy()[resultados_envio_df["fila"] - 1])
+    ruta_csv = os.path.join(args.salida, "resultado_envio.csv")
+    resultados_envio_df.to_csv(ruta_csv, index=False)
+
+    enviados = int(resultados_envio_df["enviado"].sum())
+    log.info(
+        "Se enviaron %d de %d filas en %d correos. Conexiones SMTP usadas: %d. Resultado: %s",
+        enviados, total_filas, correos_enviados, despachador.conexiones, ruta_csv
+    )
+    if sin_enviar_por_cupo:
+        log.warning(
+            "Se agotó el cupo diario: %d filas quedaron pendientes para la próxima corrida.",
+            len(sin_enviar_por_cupo)
+        )
+    return enviados == total_filas
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    os.makedirs(args.salida, exist_ok=True)
+    _configurar_log(args.log)
+
+    if args.enviar and not args.smtp:
+        log.error("Con --enviar hay que indicar el perfil SMTP (--smtp).")
+        return 2
+    if args.max_adjuntos < 1:
+        log.error("--max-adjuntos debe ser al menos 1.")
+        return 2
+    if args.enviar and args.formato == "docx" and not args.pdfs:
+        log.error("Para enviar hay que generar PDF (--formato pdf) o indicar el ZIP de PDF (--pdfs).")
+        return 2
+
+    config, error = leer_configuracion(args.config)
+    if error:
+        log.error(error)
+        return 2
+    if args.enviar and args.agrupar_correos and not (
+        config["correo_grupo"]["asunto"] and config["correo_grupo"]["cuerpo"]
+    ):
+        log.error("Con --agrupar-correos la configuración debe tener el asunto y el cuerpo en \"correo_grupo\".")
+        return 2
+
+    perfil = None
+    if args.enviar:
+        perfil, error = leer_perfil_smtp(args.smtp)
+        if error:
+            log.error(error)
+            return 2
+        if not perfil["host"] or (perfil["cifrado"] != "ninguno" and (not perfil["usuario"] or not perfil["clave"])):
+            log.error("El perfil SMTP debe tener host, usuario y contraseña (o la variable GENERADOR_SMTP_CLAVE).")
+            return 2
+
+    # ---- ① Base ----
+    with open(args.base, "rb") as f:
+        contenido_base = f.read()
+    huella_archivo = hash_bytes(contenido_base)
+    df, info_carga, error = leer_base(contenido_base, os.path.basename(args.base))
+    if error:
+        log.error(error)
+        return 1
+    medidor = Medidor(args.mediciones)
+    medidor.sumar("① lectura de la base", info_carga["segundos"], info_carga["filas"])
+    log.info(
+        "Base leída con %s en %.2f s: %d filas × %d columnas.",
+        info_carga["motor"], info_carga["segundos"], info_carga["filas"], info_carga["columnas"]
+    )
+    if args.agrupar_por and args.agrupar_por not in df.columns:
+        log.error("La columna de --agrupar-por no existe en la base: %s", args.agrupar_por)
+        return 2
+
+    # ---- ② Plantilla ----
+    with open(args.plantilla, "rb") as f:
+        plantilla_bytes = f.read()
+    with medidor.etapa("② índice de variables de la plantilla"):
+        indice, error = indexar_plantilla(plantilla_bytes)
+    if error:
+        log.error(error)
+        return 1
+    sin_vincular = indice.sin_vincular(config["mapeo"])
+    if sin_vincular:
+        log.warning("Variables de la plantilla sin vincular (quedan vacías): %s", ", ".join(sin_vincular))
+
+    # ---- ④ Nombres de archivo ----
+    regla = ReglaNombre(config["regla_nombre"], config["mapeo"], df.columns)
+    if regla.no_resolvibles:
+        log.warning("Variables del nombre sin columna (quedan vacías): %s", ", ".join(regla.no_resolvibles))
+    with medidor.etapa("④ nombres de archivo", len(df)):
+        nombres_base, nombres_duplicados = regla.evaluar(
+            preparar_textos(df, regla.columnas_necesarias, config["formatos"])
+        )
+    if nombres_duplicados:
+        log.warning(
+            "La regla genera %d nombres repetidos; se les agrega un consecutivo (_2, _3...).",
+            len(nombres_duplicados)
+        )
+
+    diario = None
+    if not args.sin_diario:
+        from diario import DiarioTrabajos
+
+        diario = DiarioTrabajos()
+        log.info("Diario y caché de documentos en %s", diario.directorio)
+
+    try:
+        # ---- ④ Generación ----
+        rutas_zip, resultados = generar(df, plantilla_bytes, config, nombres_base, args, diario, medidor)
+
+        if not args.enviar:
+            return 0
+
+        # ---- ⑤ PDF: los recién generados o los convertidos por fuera ----
+        if args.formato == "pdf":
+            indice_pdfs, pdf_mapping = indice_de_generados(rutas_zip, resultados)
+        else:
+            with medidor.etapa("⑤ emparejamiento de PDF", len(nombres_base)):
+                indice_pdfs, pdf_mapping = emparejar(args.pdfs, nombres_base)
+
+        # ---- ⑥ Envío ----
+        try:
+            completo = enviar(df, huella_archivo, config, perfil, indice_pdfs, pdf_mapping, args, diario, medidor)
+        finally:
+            indice_pdfs.cerrar()
+        return 0 if completo else 1
+    finally:
+        _reportar_mediciones(medidor)
+        medidor.cerrar()
+        if diario is not None:
+            diario.cerrar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Windows: sin memoria pico, el resto de las mediciones funciona igual
+    resource = None
+
+# ------------------------
+# Mediciones de rendimiento por etapa y por fila
+# ------------------------
+# Cada etapa (lectura de la base, render, ZIP, SMTP...) acumula su tiempo total y
+# la cantidad de unidades procesadas; las etapas por fila guardan además la
+# duración de cada fila para sacar percentiles y las filas más lentas (ej. una
+# celda enorme). Opcionalmente cada medición se escribe como una línea JSON para
+# analizarla por fuera o comparar corridas en producción.
+
+
+def memoria_pico_mb():
+    # (proceso, procesos hijos); ru_maxrss viene en KB en Linux y en bytes en macOS
+    if resource is None:
+        return None, None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (
+        round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    )
+
+
+class Medidor:
+    def __init__(self, ruta_jsonl=None, max_filas_lentas=20):
+        self.max_filas_lentas = max_filas_lentas
+        self._etapas = {}
+        self._lock = threading.Lock()
+        self._archivo = None
+        self.escribir_en(ruta_jsonl)
+
+    def escribir_en(self, ruta_jsonl):
+        # Cambia (o apaga con None) el archivo de líneas JSON
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+            self.ruta_jsonl = ruta_jsonl
+            if ruta_jsonl:
+                self._archivo = open(ruta_jsonl, "a", encoding="utf-8")
+
+    def _etapa(self, nombre):
+        etapa = self._etapas.get(nombre)
+        if etapa is None:
+            etapa = {"segundos": 0.0, "unidades": 0, "duraciones": [], "lentas": [], "memoria": (None, None)}
+            self._etapas[nombre] = etapa
+        return etapa
+
+    def _escribir(self, evento):
+        if self._archivo is not None:
+            evento["ts"] = round(time.time(), 3)
+            self._archivo.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+    @contextmanager
+    def etapa(self, nombre, unidades=None):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.perf_counter() - inicio, unidades)
+
+    def sumar(self, nombre, segundos, unidades=None):
+        memoria = memoria_pico_mb()
+        with self._lock:
+            etapa = self._etapa(nombre)
+            etapa["segundos"] += segundos
+            etapa["unidades"] += unidades or 0
+            etapa["memoria"] = memoria
+            self._escribir({
+                "tipo": "etapa",
+                "etapa": nombre,
+                "segundos": round(segundos, 6),
+                "unidades": unidades,
+                "rss_pico_mb": memoria[0],
+            })
+            if self._archivo is not None:
+                self._archivo.flush()
+
+    def fila(self, nombre, fila, segundos, **detalle):
+        # Duración de una fila dentro de una etapa (también suma al total de la etapa);
+        # `detalle` ayuda a explicar las filas lentas
+        with self._lock:
+            etapa = self._etapa(nombre)
+            etapa["segundos"] += segundos
+            etapa["unidades"] += 1
+            etapa["duraciones"].append(segundos)
+            if len(etapa["duraciones"]) % 256 == 1:
+                etapa["memoria"] = memoria_pico_mb()
+            lentas = etapa["lentas"]
+            if len(lentas) < self.max_filas_lentas or segundos > lentas[-1][0]:
+                lentas.append((segundos, fila, detalle))
+                lentas.sort(key=lambda x: -x[0])
+                del lentas[self.max_filas_lentas:]
+            self._escribir({"tipo": "fila", "etapa": nombre, "fila": fila, "segundos": round(segundos, 6), **detalle})
+
+    def resumen(self, prefijo=""):
+        # Una fila por etapa: total, unidades/s, percentiles por fila (ms) y memoria pico.
+        # `prefijo` filtra las etapas de un paso (ej. "④")
+        filas = []
+        with self._lock:
+            for nombre, etapa in self._etapas.items():
+                if not nombre.startswith(prefijo):
+                    continue
+                duraciones = np.array(etapa["duraciones"]) * 1000
+                p50, p95, p99 = np.percentile(duraciones, [50, 95, 99]) if len(duraciones) else (None,) * 3
+                filas.append({
+                    "etapa": nombre,
+                    "segundos": round(etapa["segundos"], 3),
+                    "unidades": etapa["unidades"],
+                    "por_segundo": round(etapa["unidades"] / etapa["segundos"], 1)
+                    if etapa["unidades"] and etapa["segundos"] > 0 else None,
+                    "p50_ms": None if p50 is None else round(p50, 2),
+                    "p95_ms": None if p95 is None else round(p95, 2),
+                    "p99_ms": None if p99 is None else round(p99, 2),
+                    "max_ms": round(duraciones.max(), 2) if len(duraciones) else None,
+                    "rss_pico_mb": etapa["memoria"][0],
+                    "rss_pico_workers_mb": etapa["memoria"][1],
+                })
+        return filas
+
+    def filas_lentas(self, prefijo=""):
+        resultado = []
+        with self._lock:
+            for nombre, etapa in self._etapas.items():
+                if not nombre.startswith(prefijo):
+                    continue
+                for segundos, fila, detalle in etapa["lentas"]:
+                    resultado.append({"etapa": nombre, "fila": fila, "ms": round(segundos * 1000, 2), **detalle})
+        resultado.sort(key=lambda x: -x["ms"])
+        return resultado
+
+    def reiniciar(self, prefijo=""):
+        # Borra las etapas que empiezan con `prefijo` (todas por defecto)
+        with self._lock:
+            self._etapas = {n: e for n, e in self._etapas.items() if not n.startswith(prefijo)}
+
+    def cerrar(self):
+        self.escribir_en(None)
@@ -0,0 +1,109 @@
+import re
+
+import pandas as pd
+
+# ------------------------
+# Regla de nombres de archivo compilada
+# ------------------------
+# La regla (ej. "Memorial_{{RADICADO}}_{{DEMANDADO}}.docx") se compila una vez en
+# una lista de textos fijos y columnas. Luego se evalúa para toda la base de una
+# sola pasada, concatenando columnas completas, y los pasos ④ y ⑤ comparten el
+# mismo resultado.
+
+PATRON_PLACEHOLDER = r"{{\s*([^}]+?)\s*}}"
+
+# Caracteres que Windows / los ZIP no aceptan en nombres de archivo
+_CARACTERES_INVALIDOS = r'[<>:"/\\|?*\x00-\x1f]'
+
+_EXTENSIONES_CONOCIDAS = r"\.(docx|pdf)$"
+
+
+def sanitizar_nombres(serie):
+    return (
+        serie.str.replace(_CARACTERES_INVALIDOS, "_", regex=True)
+        .str.strip()
+        # Windows tampoco acepta nombres que terminan en punto
+        .str.rstrip(".")
+    )
+
+
+class ReglaNombre:
+    def __init__(self, regla, mapeo, columnas):
+        self.regla = regla
+        partes = re.split(PATRON_PLACEHOLDER, regla)
+        self.literales = partes[0::2]
+        self.placeholders = partes[1::2]
+
+        # Decidimos una sola vez de dónde sale cada variable: mapeo o columna directa
+        self.columnas = []
+        for ph in self.placeholders:
+            if ph in mapeo and mapeo[ph] in columnas:
+                self.columnas.append(mapeo[ph])
+            elif ph in columnas:
+                self.columnas.append(ph)
+            else:
+                self.columnas.append(None)
+
+    @property
+    def resolvibles(self):
+        return [ph for ph, col in zip(self.placeholders, self.columnas) if col is not None]
+
+    @property
+    def no_resolvibles(self):
+        return [ph for ph, col in zip(self.placeholders, self.columnas) if col is None]
+
+    @property
+    def columnas_necesarias(self):
+        return [col for col in dict.fromkeys(self.columnas) if col is not None]
+
+    def evaluar(self, textos):
+        # textos: DataFrame de valores ya formateados (ver contexto.preparar_textos).
+        # Devuelve los nombres base (sin extensión), saneados y sin duplicados,
+        # y un dict nombre_repetido -> cantidad de filas que lo generaban.
+        nombres = pd.Series(self.literales[0], index=textos.index, dtype=object)
+        for col, literal in zip(self.columnas, self.literales[1:]):
+            if col is not None:
+                nombres = nombres + textos[col].astype(str)
+            nombres = nombres + literal
+
+        nombres = sanitizar_nombres(
+            nombres.str.replace(_EXTENSIONES_CONOCIDAS, "", regex=True, flags=re.IGNORECASE)
+        )
+
+        # Si después de reemplazar quedó vacío, usamos un fallback con el consecutivo
+        consecutivos = pd.Series(range(1, len(nombres) + 1), index=nombres.index)
+        vacios = nombres == ""
+        nombres = nombres.where(~vacios, "documento_" + consecutivos.astype(str))
+
+        return _resolver_duplicados(nombres)
+
+
+def _resolver_duplicados(nombres):
+    # Los ZIP y Windows no distinguen mayúsculas: comparamos en minúsculas
+    claves = nombres.str.lower()
+    repetidos = claves.duplicated(keep=False)
+    if not repetidos.any():
+        return nombres.tolist(), {}
+
+    duplicados = nombres[repetidos].groupby(claves[repetidos]).agg(["first", "size"])
+    reporte = dict(zip(duplicados["first"], duplicados["size"]))
+
+    # Segunda, tercera... aparición: Nombre_2, Nombre_3...
+    ocurrencia = claves.groupby(claves).cumcount()
+    nombres = nombres.where(ocurrencia == 0, nombres + "_" + (ocurrencia + 1).astype(str))
+
+    # Un sufijo puede chocar con otro nombre que ya existía: repetimos hasta que no haya choques
+    usados = set()
+    finales = []
+    for nombre in nombres.tolist():
+        candidato, n = nombre, 1
+        while candidato.lower() in usados:
+            n += 1
+            candidato = f"{nombre}_{n}"
+        usados.add(candidato.lower())
+        finales.append(candidato)
+    return finales, reporte
+
+
+def con_extension(nombres_base, extension):
+    return [nombre + extension for nombre in nombres_base]
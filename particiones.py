@@ -0,0 +1,156 @@
+import os
+import zipfile
+from collections import OrderedDict
+
+from nombres import sanitizar_nombres
+
+# ------------------------
+# ZIP de salida partido en varias partes
+# ------------------------
+# Con bases grandes un solo ZIP llega a varios GB: el navegador no lo descarga
+# bien y el equipo igual lo reparte por juzgado o por abogado. La salida se puede
+# partir por tamaño máximo, por cantidad de documentos y/o por una columna de
+# agrupación (ej. JUZGADO): cada grupo va en su propio ZIP, y si además hay un
+# límite, el grupo se parte en _parte001, _parte002...
+#
+# Se usa igual que el zipfile.ZipFile de salida (writestr), así que el motor de
+# generación no cambia. Cada parte se escribe en disco a medida que se llena y se
+# cierra apenas está completa (al llegar al límite o al último documento de su
+# grupo); mientras se escribe lleva el sufijo ".parcial", así que un archivo con
+# el nombre final ya se puede descargar o copiar.
+#
+# Con una base sin ordenar hay tantas partes a medio llenar como grupos, y el
+# sistema limita los archivos abiertos (ulimit -n). Solo quedan abiertos los ZIP
+# usados más recientemente; los demás se cierran y se reabren para agregar
+# (modo "a") cuando les llega otro documento.
+
+SIN_GRUPO = "sin_grupo"
+
+MAX_ZIP_ABIERTOS = 64
+
+
+def grupos_por_nombre(nombres_archivo, valores):
+    # valores: Serie con el texto ya formateado de la columna de agrupación,
+    # en el mismo orden que nombres_archivo
+    grupos = sanitizar_nombres(valores.astype(str)).replace("", SIN_GRUPO)
+    return dict(zip(nombres_archivo, grupos))
+
+
+class SalidaParticionada:
+    def __init__(self, directorio, prefijo, extension="", comprimir=False, max_mb=None, max_documentos=None,
+                 grupo_por_nombre=None, al_completar=None, max_abiertos=MAX_ZIP_ABIERTOS):
+        # Los ZIP se llaman prefijo[_grupo][_parteNNN]extension.zip
+        # (ej. documentos_generados_JUZGADO 1_parte001.docx.zip).
+        # al_completar(parte) se llama cada vez que una parte queda cerrada.
+        self.directorio = directorio
+        self.prefijo = prefijo
+        self.extension = extension
+        self.compresion = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.max_documentos = int(max_documentos) if max_documentos else None
+        self.grupo_por_nombre = grupo_por_nombre
+        self.al_completar = al_completar
+        self.max_abiertos = max(1, int(max_abiertos))
+
+        # Partes cerradas, en el orden en que se completaron:
+        # {"nombre", "ruta", "grupo", "documentos", "bytes"}
+        self.partes = []
+        # nombre del documento -> nombre del ZIP donde quedó
+        self.parte_de = {}
+
+        # Partes sin completar; de ellas, las que tienen el ZIP abierto (LRU)
+        self._abiertas = {}
+        self._con_archivo = OrderedDict()
+        self._numeros = {}
+        # Documentos que faltan por grupo, para cerrar cada grupo apenas se completa
+        self._pendientes = {}
+        if grupo_por_nombre is not None:
+            for grupo in grupo_por_nombre.values():
+                self._pendientes[grupo] = self._pendientes.get(grupo, 0) + 1
+
+    @property
+    def rutas(self):
+        return [parte["ruta"] for parte in self.partes]
+
+    def _nombre_parte(self, grupo):
+        numero = self._numeros.get(grupo, 0) + 1
+        self._numeros[grupo] = numero
+        nombre = self.prefijo
+        if grupo is not None:
+            nombre += f"_{grupo}"
+        if self.max_bytes or self.max_documentos:
+            nombre += f"_parte{numero:03d}"
+        return nombre + self.extension + ".zip"
+
+    def _abrir_parte(self, grupo):
+        nombre = self._nombre_parte(grupo)
+        ruta = os.path.join(self.directorio, nombre)
+        parte = {
+            "nombre": nombre,
+            "ruta": ruta,
+            "grupo": grupo,
+            "documentos": 0,
+            "bytes": 0,
+            "zf": None
+        }
+        self._abiertas[grupo] = parte
+        self._abrir_archivo(parte, "w")
+        return parte
+
+    def _abrir_archivo(self, parte, modo):
+        while len(self._con_archivo) >= self.max_abiertos:
+            # Se cierra el ZIP usado hace más tiempo; la parte sigue sin completar
+            grupo, _ = self._con_archivo.popitem(last=False)
+            suspendida = self._abiertas[grupo]
+            suspendida["zf"].close()
+            suspendida["zf"] = None
+        parte["zf"] = zipfile.ZipFile(parte["ruta"] + ".parcial", modo, self.compresion)
+        self._con_archivo[parte["grupo"]] = None
+
+    def _cerrar_parte(self, grupo):
+        parte = self._abiertas.pop(grupo)
+        zf = parte.pop("zf")
+        if zf is not None:
+            zf.close()
+            del self._con_archivo[grupo]
+        os.replace(parte["ruta"] + ".parcial", parte["ruta"])
+        self.partes.append(parte)
+        if self.al_completar is not None:
+            self.al_completar(parte)
+
+    def _llena(self, parte, tam):
+        if self.max_documentos and parte["documentos"] >= self.max_documentos:
+            return True
+        # Siempre entra al menos un documento, aunque solo ya pase del límite
+        return bool(self.max_bytes and parte["documentos"] and parte["bytes"] + tam > self.max_bytes)
+
+    def writestr(self, nombre, datos):
+        grupo = None if self.grupo_por_nombre is None else self.grupo_por_nombre.get(nombre, SIN_GRUPO)
+
+        parte = self._abiertas.get(grupo)
+        if parte is not None and self._llena(parte, len(datos)):
+            self._cerrar_parte(grupo)
+            parte = None
+        if parte is None:
+            parte = self._abrir_parte(grupo)
+        elif parte["zf"] is None:
+            self._abrir_archivo(parte, "a")
+        else:
+            self._con_archivo.move_to_end(grupo)
+
+        parte["zf"].writestr(nombre, datos)
+        parte["documentos"] += 1
+        # Tamaño aproximado: el de los documentos, sin los encabezados del ZIP
+        parte["bytes"] += len(datos)
+        self.parte_de[nombre] = parte["nombre"]
+
+        if grupo in self._pendientes:
+            self._pendientes[grupo] -= 1
+            if self._pendientes[grupo] == 0:
+                self._cerrar_parte(grupo)
+
+    def cerrar(self):
+        # Cierra las partes que quedaron abiertas y devuelve todas las partes
+        for grupo in list(self._abiertas):
+            self._cerrar_parte(grupo)
+        return self.partes
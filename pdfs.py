@@ -0,0 +1,145 @@
+import re
+import unicodedata
+import zipfile
+from collections import Counter
+from io import BytesIO
+
+# ------------------------
+# Índice de PDFs adjuntos
+# ------------------------
+# Se construye una sola vez cuando se sube el ZIP del paso ⑤: deja el ZIP abierto
+# (el directorio central se lee una vez) y un dict fila -> archivo dentro del ZIP,
+# para que el paso ⑥ obtenga cada adjunto en O(1). También se construye sobre el
+# ZIP en disco cuando los PDF se generan directamente en el paso ④ (o sobre todas
+# sus partes, si la salida se partió en varios ZIP).
+#
+# Los convertidores dejan los PDF en subcarpetas, con ".PDF" en mayúsculas o con
+# tildes descompuestas (NFD). Por eso el emparejamiento usa una clave normalizada
+# (solo el nombre del archivo, NFC, sin mayúsculas, espacios colapsados) en un
+# dict clave -> archivos: una pasada por el ZIP y una por la base.
+
+ESTADO_ENCONTRADO = "encontrado"
+ESTADO_AMBIGUO = "ambiguo"
+ESTADO_NO_ENCONTRADO = "no encontrado"
+
+
+def clave_normalizada(nombre):
+    base = re.split(r"[\\/]", nombre)[-1]
+    base = unicodedata.normalize("NFC", base)
+    return " ".join(base.split()).casefold()
+
+
+def _es_archivo_util(nombre):
+    # Sin carpetas ni los metadatos que agrega el compresor de macOS
+    return not nombre.endswith("/") and not nombre.startswith("__MACOSX/")
+
+
+def mapping_de_generados(resultados):
+    # PDF generados en el paso ④: cada fila ya sabe cuál es su archivo
+    return [
+        {
+            "fila": r["fila"],
+            "nombre_esperado": r["nombre_archivo"],
+            "archivo_zip": r["nombre_archivo"],
+            "estado": ESTADO_ENCONTRADO,
+            "encontrado": True
+        }
+        for r in resultados
+    ]
+
+
+class IndicePdfs:
+    def __init__(self, zip_origen):
+        # zip_origen: bytes del ZIP subido, ruta del ZIP generado o lista de rutas
+        # (las partes del ZIP generado)
+        origenes = zip_origen if isinstance(zip_origen, list) else [zip_origen]
+        self._zips = []
+        # archivo -> ZIP que lo contiene
+        self._zip_de = {}
+        self.nombres = []
+        for origen in origenes:
+            if isinstance(origen, bytes):
+                origen = BytesIO(origen)
+            zf = zipfile.ZipFile(origen, "r")
+            self._zips.append(zf)
+            for nombre in zf.namelist():
+                if _es_archivo_util(nombre):
+                    self.nombres.append(nombre)
+                    self._zip_de.setdefault(nombre, zf)
+        self._por_fila = {}
+
+        self._por_clave = {}
+        for nombre in self.nombres:
+            self._por_clave.setdefault(clave_normalizada(nombre), []).append(nombre)
+
+    def buscar(self, nombre_esperado):
+        # Devuelve (archivo_en_zip, estado)
+        candidatos = self._por_clave.get(clave_normalizada(nombre_esperado), [])
+        if len(candidatos) == 1:
+            return candidatos[0], ESTADO_ENCONTRADO
+        if not candidatos:
+            return None, ESTADO_NO_ENCONTRADO
+        # Varios archivos con la misma clave: solo vale si uno coincide exacto
+        if nombre_esperado in candidatos:
+            return nombre_esperado, ESTADO_ENCONTRADO
+        return None, ESTADO_AMBIGUO
+
+    def emparejar(self, nombres_esperados):
+        # nombres_esperados: nombre .pdf de cada fila, en el orden de la base.
+        # Devuelve (pdf_mapping, sobrantes): el mapping trae por fila el archivo
+        # del ZIP y el estado; sobrantes son los archivos que ninguna fila usa.
+        claves = [clave_normalizada(n) for n in nombres_esperados]
+        filas_por_clave = Counter(claves)
+
+        pdf_mapping = []
+        usados = set()
+        for fila, (nombre_esperado, clave) in enumerate(zip(nombres_esperados, claves), start=1):
+            archivo, estado = self.buscar(nombre_esperado)
+            if estado == ESTADO_ENCONTRADO and filas_por_clave[clave] > 1 and archivo != nombre_esperado:
+                # Dos filas esperan el "mismo" archivo (ej. solo cambian mayúsculas):
+                # no adjuntamos el mismo PDF a dos destinatarios
+                archivo, estado = None, ESTADO_AMBIGUO
+            if archivo is not None:
+                usados.add(archivo)
+
+            pdf_mapping.append({
+                "fila": fila,
+                "nombre_esperado": nombre_esperado,
+                "archivo_zip": archivo,
+                "estado": estado,
+                "encontrado": estado == ESTADO_ENCONTRADO
+            })
+
+        sobrantes = [n for n in self.nombres if n not in usados]
+        return pdf_mapping, sobrantes
+
+    def asociar(self, pdf_mapping):
+        # pdf_mapping: lista de {"fila", "nombre_esperado", "encontrado"} del paso ⑤
+        # ("archivo_zip" si el archivo dentro del ZIP tiene otra ruta o escritura)
+        self._por_fila = {
+            item["fila"]: (
+                item["nombre_esperado"],
+                item.get("archivo_zip") or item["nombre_esperado"],
+                item["encontrado"]
+            )
+            for item in pdf_mapping
+        }
+
+    def obtener(self, fila):
+        # Devuelve (nombre_pdf, bytes, ok); el adjunto lleva el nombre esperado
+        esperado, archivo, encontrado = self._por_fila.get(fila, (None, None, False))
+        if not encontrado or esperado is None:
+            return None, None, False
+
+        zf = self._zip_de.get(archivo)
+        if zf is None:
+            return esperado, None, False
+        return esperado, zf.read(archivo), True
+
+    def tamanos(self):
+        # archivo -> tamaño en bytes, del directorio central (sin leer los PDF)
+        return {info.filename: info.file_size for zf in self._zips for info in zf.infolist()}
+
+    def cerrar(self):
+        for zf in self._zips:
+            zf.close()
@@ -0,0 +1,163 @@
+import copy
+import hashlib
+import re
+import zipfile
+from collections import OrderedDict
+from io import BytesIO
+
+# ------------------------
+# Plantilla Word compilada una sola vez
+# ------------------------
+# DocxTemplate vuelve a descomprimir la plantilla, re-parsear el XML y recompilar
+# Jinja en cada render. Aquí hacemos ese trabajo una vez por plantilla y por fila
+# solo sustituimos el contexto y serializamos las partes que tienen variables.
+# Las demás partes del paquete (imágenes, estilos, fuentes...) se copian tal cual.
+#
+# El contexto que usamos son solo textos (placeholder -> valor), así que el
+# render nunca agrega partes nuevas al paquete (imágenes, subdocumentos).
+
+MAX_PLANTILLAS_EN_CACHE = 4
+
+_MARCADOR_CUERPO = "__CUERPO_PLANTILLA__"
+
+# Notas al pie y al final: DocxTemplate.render solo renderiza las notas al pie,
+# pero el índice de la plantilla también ofrece vincular las notas al final
+_TIPOS_NOTAS = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.endnotes+xml",
+)
+
+_cache_plantillas = OrderedDict()
+
+
+def hash_bytes(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _es_parte_xml(nombre):
+    return nombre.endswith(".xml") or nombre.endswith(".rels")
+
+
+class PlantillaCompilada:
+    def __init__(self, plantilla_bytes):
+        from docx.oxml.ns import nsmap, qn
+        from docxtpl import DocxTemplate
+        from lxml import etree
+
+        self._etree = etree
+        self._nsmap = nsmap
+        self.hash = hash_bytes(plantilla_bytes)
+
+        self._tpl = DocxTemplate(BytesIO(plantilla_bytes))
+        self._tpl.render_init()
+        docx = self._tpl.docx
+
+        # ---- Cuerpo (word/document.xml) ----
+        self._nombre_documento = docx.part.partname.lstrip("/")
+        self._cuerpo = self._compilar(self._tpl.patch_xml(self._tpl.get_xml()))
+
+        # Serializamos el documento sin el cuerpo para luego solo pegar el cuerpo renderizado
+        raiz = copy.deepcopy(docx.element)
+        cuerpo = raiz.find(qn("w:body"))
+        raiz.replace(cuerpo, etree.Comment(_MARCADOR_CUERPO))
+        documento_xml = etree.tostring(raiz, encoding="UTF-8", standalone=True)
+        self._prefijo, self._sufijo = documento_xml.split(
+            f"<!--{_MARCADOR_CUERPO}-->".encode("utf-8")
+        )
+
+        # ---- Encabezados y pies de página ----
+        self._partes = {}
+        for uri in (self._tpl.HEADER_URI, self._tpl.FOOTER_URI):
+            for _, parte in self._tpl.get_headers_footers(uri):
+                xml = self._tpl.get_part_xml(parte)
+                codificacion = self._tpl.get_headers_footers_encoding(xml)
+                self._partes[parte.partname.lstrip("/")] = (
+                    self._compilar(self._tpl.patch_xml(xml)),
+                    codificacion
+                )
+
+        # ---- Notas al pie y al final ----
+        for parte in docx.part.package.parts:
+            if parte.content_type in _TIPOS_NOTAS:
+                self._partes[parte.partname.lstrip("/")] = (
+                    self._compilar(self._tpl.patch_xml(parte.blob.decode("utf-8"))),
+                    "utf-8"
+                )
+
+        # ---- Resto del paquete: bytes crudos en el orden original ----
+        self._entradas = []
+        with zipfile.ZipFile(BytesIO(plantilla_bytes), "r") as zf:
+            for info in zf.infolist():
+                datos = zf.read(info.filename)
+                if info.filename == "docProps/core.xml" and b"{{" in datos:
+                    # Propiedades del documento con variables (título, asunto...)
+                    self._partes[info.filename] = (
+                        self._compilar(datos.decode("utf-8")),
+                        "utf-8"
+                    )
+                self._entradas.append((info.filename, info.date_time, datos))
+
+    @staticmethod
+    def _compilar(xml):
+        from jinja2 import Template
+
+        # Mismo preprocesamiento que DocxTemplate.render_xml_part
+        return Template(re.sub(r"<w:p([ >])", r"\n<w:p\1", xml))
+
+    def _renderizar_parte(self, plantilla, contexto):
+        xml = plantilla.render(contexto)
+        xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", xml)
+        xml = (
+            xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self._tpl.resolve_listing(xml)
+
+    def _numerar_docpr(self, arbol):
+        # Como DocxTemplate.fix_docpr_ids, pero con el contador local a este
+        # render: la plantilla compilada se comparte entre hilos (la generación
+        # y la previsualización de varias sesiones), así que no guarda estado
+        for numero, elemento in enumerate(arbol.xpath("//wp:docPr", namespaces=self._nsmap), start=1001):
+            elemento.attrib["id"] = str(numero)
+
+    def renderizar(self, contexto):
+        etree = self._etree
+
+        # Cuerpo: mismas correcciones que hace DocxTemplate.render
+        arbol = self._tpl.fix_tables(self._renderizar_parte(self._cuerpo, contexto))
+        self._numerar_docpr(arbol)
+        renderizadas = {
+            self._nombre_documento: self._prefijo + etree.tostring(arbol, encoding="UTF-8") + self._sufijo
+        }
+
+        for nombre, (plantilla, codificacion) in self._partes.items():
+            xml = self._renderizar_parte(plantilla, contexto).encode(codificacion)
+            renderizadas[nombre] = etree.tostring(
+                etree.fromstring(xml), encoding="UTF-8", standalone=True
+            )
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for nombre, fecha, datos in self._entradas:
+                info = zipfile.ZipInfo(nombre, date_time=fecha)
+                # Las imágenes y fuentes ya vienen comprimidas: se copian sin recomprimir
+                info.compress_type = zipfile.ZIP_DEFLATED if _es_parte_xml(nombre) else zipfile.ZIP_STORED
+                zf.writestr(info, renderizadas.get(nombre, datos))
+        return buffer.getvalue()
+
+
+def obtener_plantilla_compilada(plantilla_bytes):
+    # Cache LRU por hash del contenido: la misma plantilla se compila una sola vez
+    clave = hash_bytes(plantilla_bytes)
+    plantilla = _cache_plantillas.get(clave)
+    if plantilla is not None:
+        _cache_plantillas.move_to_end(clave)
+        return plantilla
+
+    plantilla = PlantillaCompilada(plantilla_bytes)
+    _cache_plantillas[clave] = plantilla
+    if len(_cache_plantillas) > MAX_PLANTILLAS_EN_CACHE:
+        _cache_plantillas.popitem(last=False)
+    return plantilla
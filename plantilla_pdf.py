@@ -0,0 +1,126 @@
+import os
+from collections import OrderedDict
+from io import BytesIO
+
+from correo import PlantillaTexto
+from plantilla import hash_bytes
+
+# ------------------------
+# Plantilla PDF (render directo con fpdf2)
+# ------------------------
+# Alternativa a convertir los .docx por fuera de la app: cada fila se escribe
+# directamente como PDF a partir de los párrafos de la plantilla Word (texto,
+# alineación y negrita de párrafo completo). Los párrafos se leen y se dividen
+# en textos fijos y variables una sola vez por plantilla.
+#
+# No reproduce tablas, imágenes, encabezados ni estilos de carácter del Word:
+# sirve para memoriales de texto corrido.
+
+MAX_PLANTILLAS_EN_CACHE = 4
+
+# Fuente TrueType opcional (ej. DejaVuSans.ttf) para caracteres fuera de latin-1
+FUENTE_PDF = os.environ.get("GENERADOR_FUENTE_PDF", "")
+
+TAMANO_LETRA = 12
+ALTO_LINEA = 6
+MARGEN_MM = 25
+
+# Las fuentes base de PDF (Helvetica) solo cubren latin-1: la tipografía
+# "inteligente" de Word se cambia por su equivalente simple
+_TIPOGRAFIA_LATIN1 = str.maketrans({
+    "‘": "'",
+    "’": "'",
+    "“": '"',
+    "”": '"',
+    "–": "-",
+    "—": "-",
+    "…": "...",
+    "•": "-",
+})
+
+# WD_ALIGN_PARAGRAPH -> alineación de fpdf2
+_ALINEACIONES = {
+    1: "C",
+    2: "R",
+    3: "J",
+}
+
+_cache_plantillas = OrderedDict()
+
+
+def _parrafo_en_negrita(parrafo):
+    runs = [r for r in parrafo.runs if r.text.strip()]
+    return bool(runs) and all(r.bold for r in runs)
+
+
+class PlantillaPdf:
+    def __init__(self, plantilla_bytes):
+        from docx import Document
+
+        self.hash = hash_bytes(plantilla_bytes)
+
+        # (PlantillaTexto, alineación, negrita); los párrafos vacíos quedan como espacio
+        self._parrafos = []
+        for parrafo in Document(BytesIO(plantilla_bytes)).paragraphs:
+            alineacion = _ALINEACIONES.get(parrafo.alignment, "L")
+            self._parrafos.append(
+                (PlantillaTexto(parrafo.text), alineacion, _parrafo_en_negrita(parrafo))
+            )
+
+        # Como en el .docx (Jinja), una variable sin valor en el contexto queda vacía
+        self._vacias = {
+            nombre: "" for plantilla, _, _ in self._parrafos for nombre in plantilla.columnas
+        }
+
+    def _texto(self, texto):
+        if FUENTE_PDF:
+            return texto
+        return texto.translate(_TIPOGRAFIA_LATIN1).encode("latin-1", "replace").decode("latin-1")
+
+    def renderizar(self, contexto):
+        from fpdf import FPDF
+
+        pdf = FPDF(format="Letter")
+        pdf.set_margins(MARGEN_MM, MARGEN_MM, MARGEN_MM)
+        pdf.set_auto_page_break(True, margin=MARGEN_MM)
+        if FUENTE_PDF:
+            pdf.add_font("Plantilla", "", FUENTE_PDF)
+            pdf.add_font("Plantilla", "B", FUENTE_PDF)
+            familia = "Plantilla"
+        else:
+            familia = "Helvetica"
+        pdf.add_page()
+
+        contexto = {**self._vacias, **contexto}
+        for plantilla, alineacion, negrita in self._parrafos:
+            texto = plantilla.renderizar(contexto)
+            if not texto.strip():
+                pdf.ln(ALTO_LINEA)
+                continue
+            pdf.set_font(familia, "B" if negrita else "", TAMANO_LETRA)
+            pdf.multi_cell(
+                0,
+                ALTO_LINEA,
+                self._texto(texto),
+                align=alineacion,
+                new_x="LMARGIN",
+                new_y="NEXT"
+            )
+            pdf.ln(ALTO_LINEA / 2)
+
+        return bytes(pdf.output())
+
+
+def obtener_plantilla_pdf(plantilla_bytes):
+    # Cache LRU por hash del contenido, igual que plantilla.obtener_plantilla_compilada
+    clave = hash_bytes(plantilla_bytes)
+    plantilla = _cache_plantillas.get(clave)
+    if plantilla is not None:
+        _cache_plantillas.move_to_end(clave)
+        return plantilla
+
+    plantilla = PlantillaPdf(plantilla_bytes)
+    _cache_plantillas[clave] = plantilla
+    if len(_cache_plantillas) > MAX_PLANTILLAS_EN_CACHE:
+        _cache_plantillas.popitem(last=False)
+    return plantilla
@@ -0,0 +1,69 @@
+import socketserver
+import threading
+
+# ------------------------
+# Servidor SMTP local que descarta los correos
+# ------------------------
+# Lo usan las pruebas del envío y benchmark.py: responde como un proveedor real
+# (EHLO, DATA, QUIT) sin entregar nada, y puede rechazar los primeros mensajes
+# con un 451 para probar los reintentos.
+
+class _ManejadorSmtp(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 sumidero ESMTP\r\n")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea[:4].upper()
+            if comando == b"DATA":
+                self.wfile.write(b"354 Fin con <CRLF>.<CRLF>\r\n")
+                while True:
+                    linea = self.rfile.readline()
+                    if not linea or linea == b".\r\n":
+                        break
+                with self.server.lock:
+                    # Simula un proveedor que nos frena: rechazo temporal del mensaje
+                    rechazar = self.server.rechazos_temporales > 0
+                    if rechazar:
+                        self.server.rechazos_temporales -= 1
+                        self.server.rechazados += 1
+                    else:
+                        self.server.recibidos += 1
+                if rechazar:
+                    self.wfile.write(b"451 4.7.0 Demasiados mensajes, intente luego\r\n")
+                else:
+                    self.wfile.write(b"250 OK\r\n")
+            elif comando == b"EHLO":
+                self.wfile.write(b"250-sumidero\r\n250 8BITMIME\r\n")
+            elif comando == b"QUIT":
+                self.wfile.write(b"221 Chao\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class SumideroSmtp(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rechazos_temporales=0):
+        # rechazos_temporales: cuántos de los primeros mensajes se responden con 451
+        super().__init__(("127.0.0.1", 0), _ManejadorSmtp)
+        self.lock = threading.Lock()
+        self.recibidos = 0
+        self.rechazados = 0
+        self.rechazos_temporales = rechazos_temporales
+        self._hilo = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def puerto(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
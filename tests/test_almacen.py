@@ -0,0 +1,65 @@
+import io
+import os
+import time
+
+from almacen import AlmacenArtefactos
+
+_KB = 1024
+
+
+def _envejecer(ruta, segundos):
+    hace = time.time() - segundos
+    os.utime(ruta, (hace, hace))
+
+
+def test_guardar_y_leer_por_hash(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path))
+    clave = almacen.guardar(b"plantilla")
+    # Un archivo abierto se copia por pedazos y da la misma clave
+    assert almacen.guardar(io.BytesIO(b"plantilla")) == clave
+    assert almacen.leer(clave) == b"plantilla"
+    assert len(os.listdir(os.path.join(str(tmp_path), "archivos"))) == 1
+
+
+def test_expulsa_lo_vencido_por_ttl(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path), ttl_horas=1)
+    vieja = almacen.guardar(b"vieja")
+    nueva = almacen.guardar(b"nueva")
+    salida = almacen.nueva_salida()
+    _envejecer(almacen.ruta(vieja), 2 * 3600)
+    _envejecer(salida, 2 * 3600)
+
+    assert almacen.expulsar() == 2
+    assert almacen.leer(vieja) is None
+    assert almacen.leer(nueva) == b"nueva"
+    assert not almacen.usar_salida(salida)
+
+
+def test_expulsa_lo_usado_hace_mas_tiempo_al_pasar_el_limite(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path), max_mb=1)
+    primera = almacen.guardar(b"1" * (400 * _KB))
+    segunda = almacen.guardar(b"2" * (400 * _KB))
+    _envejecer(almacen.ruta(primera), 20)
+    _envejecer(almacen.ruta(segunda), 10)
+    # Usar la primera la deja como la más reciente
+    assert almacen.contiene(primera)
+
+    tercera = almacen.guardar(b"3" * (400 * _KB))
+
+    assert almacen.ruta(segunda) is None
+    assert almacen.leer(primera) == b"1" * (400 * _KB)
+    assert almacen.leer(tercera) == b"3" * (400 * _KB)
+
+
+def test_leer_un_hash_expulsado(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path))
+    clave = almacen.guardar(b"plantilla")
+    # Otra sesión (u otro proceso) expulsó el archivo
+    os.remove(almacen.ruta(clave))
+
+    assert almacen.leer(clave) is None
+    assert almacen.ruta(clave) is None
+    assert not almacen.contiene(clave)
+    # Volver a guardarlo lo recupera con la misma clave
+    assert almacen.guardar(b"plantilla") == clave
+    assert almacen.leer(clave) == b"plantilla"
@@ -0,0 +1,71 @@
+import os
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from cache_documentos import CacheDocumentos
+
+
+def test_guardar_leer_y_expulsar(tmp_path):
+    cache = CacheDocumentos(str(tmp_path), max_mb=1)
+    cache.guardar("a", b"x" * (700 * 1024))
+    cache.guardar("b", b"y" * (700 * 1024))
+    assert cache.contiene("a") and cache.leer("b") == b"y" * (700 * 1024)
+
+    assert cache.expulsar() == 1
+    assert cache.cantidad == 1
+    # El índice se vuelve a armar desde el directorio
+    assert CacheDocumentos(str(tmp_path)).cantidad == 1
+
+
+def test_leer_un_archivo_borrado_por_otro_proceso(tmp_path):
+    cache = CacheDocumentos(str(tmp_path))
+    cache.guardar("a", b"documento")
+    otra = CacheDocumentos(str(tmp_path))
+    otra.vaciar()
+
+    assert cache.contiene("a")
+    assert cache.leer("a") is None
+    assert not cache.contiene("a")
+    assert cache.tamano == 0
+
+
+def test_generacion_renderiza_si_la_cache_perdio_el_documento(tmp_path):
+    pytest.importorskip("docxtpl")
+    from docx import Document
+
+    from generacion import ORIGEN_CACHE, ORIGEN_RENDER, generar_documentos
+
+    documento = Document()
+    documento.add_paragraph("Proceso {{RADICADO}}")
+    buffer = BytesIO()
+    documento.save(buffer)
+    plantilla_bytes = buffer.getvalue()
+
+    df = pd.DataFrame({"RADICADO": ["1", "2"]})
+    nombres = ["1.docx", "2.docx"]
+    directorio = str(tmp_path / "cache")
+
+    def generar(cache):
+        ruta = str(tmp_path / "salida.zip")
+        with zipfile.ZipFile(ruta, "w") as zf:
+            resultados = generar_documentos(
+                df, plantilla_bytes, {"RADICADO": "RADICADO"}, nombres, zf, cache=cache
+            )
+        with zipfile.ZipFile(ruta) as zf:
+            return resultados, sorted(zf.namelist())
+
+    generar(CacheDocumentos(directorio))
+    resultados, _ = generar(CacheDocumentos(directorio))
+    assert [r["origen"] for r in resultados] == [ORIGEN_CACHE, ORIGEN_CACHE]
+
+    # Otra instancia (ej. lote.py) borra los archivos después de que esta armó su índice
+    cache = CacheDocumentos(directorio)
+    for nombre in os.listdir(directorio):
+        os.remove(os.path.join(directorio, nombre))
+    resultados, contenido = generar(cache)
+    assert [r["origen"] for r in resultados] == [ORIGEN_RENDER, ORIGEN_RENDER]
+    assert contenido == nombres
+    assert cache.cantidad == 2
@@ -0,0 +1,74 @@
+import json
+
+from configuracion import (
+    CAMPOS_CORREO,
+    CAMPOS_CORREO_GRUPO,
+    PERFIL_SMTP_POR_DEFECTO,
+    VARIABLE_CLAVE_SMTP,
+    configuracion_a_json,
+    leer_configuracion,
+    leer_perfil_smtp,
+)
+
+
+def _escribir(tmp_path, nombre, contenido):
+    ruta = tmp_path / nombre
+    ruta.write_text(contenido if isinstance(contenido, str) else json.dumps(contenido), encoding="utf-8")
+    return str(ruta)
+
+
+def test_configuracion_descargada_se_vuelve_a_leer(tmp_path):
+    texto = configuracion_a_json(
+        {"RADICADO": "RADICADO"}, {"VALOR": "moneda"}, "{{RADICADO}}", {"para": "{{EMAIL}}"}
+    )
+    config, error = leer_configuracion(_escribir(tmp_path, "config.json", texto))
+
+    assert error is None
+    assert config["mapeo"] == {"RADICADO": "RADICADO"}
+    assert config["formatos"] == {"VALOR": "moneda"}
+    # Los campos que faltan quedan vacíos
+    assert list(config["correo"]) == CAMPOS_CORREO
+    assert config["correo"]["para"] == "{{EMAIL}}" and config["correo"]["asunto"] == ""
+    assert config["correo_grupo"] == {campo: "" for campo in CAMPOS_CORREO_GRUPO}
+
+
+def test_configuracion_invalida(tmp_path):
+    _, error = leer_configuracion(_escribir(tmp_path, "sin_mapeo.json", {"mapeo": {}}))
+    assert error == "La configuración no tiene variables vinculadas (mapeo)."
+
+    _, error = leer_configuracion(_escribir(tmp_path, "lista.json", [1, 2]))
+    assert error == "Error al leer la configuración: se esperaba un objeto JSON."
+
+    _, error = leer_configuracion(_escribir(tmp_path, "rota.json", "{mapeo"))
+    assert error.startswith("Error al leer la configuración:")
+
+    _, error = leer_configuracion(str(tmp_path / "no_existe.json"))
+    assert error.startswith("Error al leer la configuración:")
+
+
+def test_perfil_smtp_con_valores_por_defecto_y_clave_del_entorno(tmp_path, monkeypatch):
+    monkeypatch.setenv(VARIABLE_CLAVE_SMTP, "secreta")
+    perfil, error = leer_perfil_smtp(_escribir(tmp_path, "perfil.json", {"usuario": "area@ejemplo.co"}))
+
+    assert error is None
+    assert perfil["clave"] == "secreta"
+    assert perfil["remitente_correo"] == "area@ejemplo.co"
+    assert perfil["host"] == PERFIL_SMTP_POR_DEFECTO["host"]
+    assert perfil["sesiones"] == PERFIL_SMTP_POR_DEFECTO["sesiones"]
+
+
+def test_perfil_smtp_con_clave_en_el_archivo(tmp_path, monkeypatch):
+    monkeypatch.setenv(VARIABLE_CLAVE_SMTP, "del entorno")
+    perfil, error = leer_perfil_smtp(_escribir(tmp_path, "perfil.json", {
+        "host": "127.0.0.1",
+        "cifrado": "ninguno",
+        "clave": "del archivo",
+        "remitente_correo": "notificaciones@ejemplo.co",
+    }))
+
+    assert error is None
+    assert perfil["clave"] == "del archivo"
+    assert perfil["remitente_correo"] == "notificaciones@ejemplo.co"
+
+    _, error = leer_perfil_smtp(_escribir(tmp_path, "roto.json", "no es json"))
+    assert error.startswith("Error al leer el perfil SMTP:")
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from contexto import contextos_por_fila, formatear_columna, preparar_textos
+
+
+def test_enteros_leidos_como_float():
+    serie = pd.Series([1234.0, np.nan, 5.0])
+    assert formatear_columna(serie).tolist() == ["1234", "", "5"]
+
+
+def test_enteros_fuera_de_int64_y_no_finitos():
+    # Radicados largos leídos como número y valores infinitos no deben romper el formato
+    assert formatear_columna(pd.Series([1.1e22, np.nan])).tolist() == ["11000000000000000000000", ""]
+    assert formatear_columna(pd.Series([np.inf, 3.0])).tolist() == ["inf", "3"]
+    assert formatear_columna(pd.Series([1.1e22, 2.4]), "entero").tolist() == ["11000000000000000000000", "2"]
+
+
+def test_formatos_por_columna():
+    assert formatear_columna(pd.Series([1234567.891, None]), "numero").tolist() == ["1.234.567,89", ""]
+    assert formatear_columna(pd.Series([1500000, 25]), "moneda").tolist() == ["$ 1.500.000", "$ 25"]
+    assert formatear_columna(pd.Series(["2024-03-05", "sin fecha"]), "fecha").tolist() == ["05/03/2024", "sin fecha"]
+    assert formatear_columna(pd.Series(["7.6", "x"]), "entero").tolist() == ["8", "x"]
+    fechas = pd.Series([pd.Timestamp("2024-01-02"), pd.Timestamp("2024-01-03 10:30")])
+    assert formatear_columna(fechas).tolist() == ["02/01/2024 00:00", "03/01/2024 10:30"]
+
+
+def test_categorias_y_contextos():
+    df = pd.DataFrame({
+        "JUZGADO": pd.Series(["J1", None, "J1"], dtype="category"),
+        "RADICADO": [1.0, 2.0, 3.0],
+    })
+    textos = preparar_textos(df, ["JUZGADO", "RADICADO", "NO_EXISTE"])
+    assert list(textos.columns) == ["JUZGADO", "RADICADO"]
+    assert textos["JUZGADO"].tolist() == ["J1", "", "J1"]
+    assert contextos_por_fila(textos, {"JUZ": "JUZGADO", "OTRO": "NO_EXISTE"})[2] == {"JUZ": "J1", "OTRO": ""}
+
+
+def test_fechas_iso_y_dia_mes_anio():
+    serie = pd.Series(["2024-03-05", "05/03/2024", "sin fecha", None], dtype=object)
+    assert formatear_columna(serie, "fecha").tolist() == ["05/03/2024", "05/03/2024", "sin fecha", ""]
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from correo import (
+    PlantillaTexto,
+    claves_de_destinatarios,
+    compilar_plantillas,
+    preparar_mensajes_agrupados,
+    renderizar_correos,
+)
+
+
+def test_plantilla_texto_por_fila_y_por_lote():
+    plantilla = PlantillaTexto("Proceso {{ RADICADO }} - {{NO_EXISTE}}")
+    assert plantilla.columnas == ["RADICADO", "NO_EXISTE"]
+    assert plantilla.renderizar({"RADICADO": "1"}) == "Proceso 1 - {{NO_EXISTE}}"
+    textos = pd.DataFrame({"RADICADO": ["1", "2"]})
+    assert plantilla.renderizar_todas(textos).tolist() == ["Proceso 1 - {{NO_EXISTE}}", "Proceso 2 - {{NO_EXISTE}}"]
+
+
+def test_claves_de_destinatarios_ignoran_orden_y_mayusculas():
+    correos = pd.DataFrame({
+        "para": ["A@x.co, b@x.co", "b@x.co,a@x.co", "a@x.co"],
+        "cc": ["", " ", "c@x.co"],
+        "bcc": ["", "", ""],
+    })
+    claves = claves_de_destinatarios(correos).tolist()
+    assert claves[0] == claves[1] == "a@x.co,b@x.co||"
+    assert claves[2] == "a@x.co|c@x.co|"
+
+
+def _agrupados(max_adjuntos=10, max_mb=20, obtener_pdf=None):
+    textos = pd.DataFrame({
+        "EMAIL": ["j1@x.co", "j2@x.co", "J1@x.co", "j1@x.co"],
+        "JUZGADO": ["Juzgado 1", "Juzgado 2", "Juzgado 1", "Juzgado 1"],
+        "RADICADO": ["10", "20", "30", "40"],
+    })
+    correos = renderizar_correos(
+        compilar_plantillas({"para": "{{EMAIL}}", "cc": "", "bcc": "", "asunto": "", "cuerpo": ""}),
+        textos
+    )
+    plantillas_grupo = compilar_plantillas({
+        "asunto": "{{JUZGADO}} ({{CANTIDAD}}) parte {{PARTE}}",
+        "cuerpo": "Procesos:\n{{DETALLE}}",
+        "linea": "- {{RADICADO}}",
+    })
+    obtener_pdf = obtener_pdf or (lambda fila: (f"{fila}.pdf", b"x" * 1000, True))
+    return list(preparar_mensajes_agrupados(
+        correos, textos, plantillas_grupo, obtener_pdf, "Área", "area@x.co",
+        max_adjuntos=max_adjuntos, max_mb=max_mb
+    ))
+
+
+def test_un_correo_por_destinatario_con_todos_sus_pdf():
+    mensajes = _agrupados()
+    assert [filas for filas, _, _ in mensajes] == [(1, 3, 4), (2,)]
+
+    msg = mensajes[0][1]
+    assert msg["Subject"] == "Juzgado 1 (3) parte 1"
+    assert msg.get_body().get_content().strip() == "Procesos:\n- 10\n- 30\n- 40"
+    assert [a.get_filename() for a in msg.iter_attachments()] == ["1.pdf", "3.pdf", "4.pdf"]
+
+
+def test_grupo_partido_por_cantidad_y_pdf_faltante():
+    def obtener_pdf(fila):
+        return f"{fila}.pdf", b"x", fila != 3
+
+    mensajes = _agrupados(max_adjuntos=1, obtener_pdf=obtener_pdf)
+    assert sorted((filas, error is None) for filas, _, error in mensajes) == [
+        ((1,), True), ((2,), True), ((3,), False), ((4,), True)
+    ]
+    asuntos = {filas: msg["Subject"] for filas, msg, _ in mensajes if msg is not None}
+    assert asuntos[(4,)] == "Juzgado 1 (1) parte 2"
+
+
+def test_grupo_partido_por_tamano():
+    # 1000 bytes de PDF ocupan 1333 en base64: caben de a uno en 0.002 MB
+    mensajes = _agrupados(max_mb=0.002)
+    assert sorted(filas for filas, _, _ in mensajes) == [(1,), (2,), (3,), (4,)]
@@ -0,0 +1,138 @@
+import smtplib
+
+import pandas as pd
+
+from correo import (
+    CIFRADO_NINGUNO,
+    SesionSmtp,
+    compilar_plantillas,
+    preparar_mensajes,
+    renderizar_correos,
+)
+from despacho import (
+    ERROR_CUPO_DIARIO,
+    DespachadorSmtp,
+    LimitadorTasa,
+    es_error_temporal,
+    filas_pendientes,
+    resultados_por_fila,
+)
+from tests.sumidero import SumideroSmtp
+
+
+def _correos(n):
+    plantillas = compilar_plantillas({
+        "para": "{{EMAIL}}",
+        "cc": "",
+        "bcc": "",
+        "asunto": "Memorial {{RADICADO}}",
+        "cuerpo": "Proceso {{RADICADO}}",
+    })
+    textos = pd.DataFrame({
+        "EMAIL": [f"juzgado{i}@ejemplo.co" for i in range(1, n + 1)],
+        "RADICADO": [str(i) for i in range(1, n + 1)],
+    })
+    return renderizar_correos(plantillas, textos)
+
+
+def _pdf(fila):
+    return f"{fila}.pdf", b"%PDF-1.4\n%%EOF\n", True
+
+
+def _despachador(sumidero, sesiones=1, **kwargs):
+    return DespachadorSmtp(
+        lambda: SesionSmtp("127.0.0.1", sumidero.puerto, "", "", cifrado=CIFRADO_NINGUNO, timeout=5),
+        sesiones=sesiones,
+        por_minuto=60000,
+        espera_base=0.01,
+        **kwargs
+    )
+
+
+def test_envia_todos_con_varias_sesiones():
+    with SumideroSmtp() as sumidero:
+        despachador = _despachador(sumidero, sesiones=3)
+        resultados = despachador.enviar_todos(
+            preparar_mensajes(_correos(10), _pdf, "Área Judicial", "area@ejemplo.co")
+        )
+
+    assert [r["fila"] for r in resultados] == list(range(1, 11))
+    assert all(r["enviado"] and r["intentos"] == 1 for r in resultados)
+    assert sumidero.recibidos == 10
+
+
+def test_451_se_reintenta_y_baja_la_tasa():
+    with SumideroSmtp(rechazos_temporales=1) as sumidero:
+        despachador = _despachador(sumidero)
+        resultados = despachador.enviar_todos(
+            preparar_mensajes(_correos(3), _pdf, "Área Judicial", "area@ejemplo.co")
+        )
+
+    assert all(r["enviado"] for r in resultados)
+    assert [r["intentos"] for r in resultados] == [2, 1, 1]
+    assert sumidero.rechazados == 1 and sumidero.recibidos == 3
+    limitador = despachador.limitador
+    assert limitador.tasa < limitador.tasa_objetivo
+    # El reintento abrió una conexión nueva
+    assert despachador.conexiones == 2
+
+
+def test_errores_de_preparacion_y_cupo_diario():
+    correos = _correos(4)
+    correos.loc[1, "para"] = ""
+    pedidos = []
+
+    def mensajes():
+        for mensaje in preparar_mensajes(correos, _pdf, "Área Judicial", "area@ejemplo.co"):
+            pedidos.append(mensaje[0])
+            yield mensaje
+
+    with SumideroSmtp() as sumidero:
+        despachador = _despachador(sumidero, maximo_diario=2)
+        resultados = despachador.enviar_todos(mensajes())
+
+    assert [r["enviado"] for r in resultados] == [True, False, True]
+    assert resultados[1]["error"] == "No hay destinatarios válidos en PARA."
+    assert sumidero.recibidos == 2
+    # Con el cupo agotado no se arma el mensaje de la fila 4: queda pendiente
+    assert pedidos == [1, 2, 3]
+    pendientes = filas_pendientes(resultados_por_fila(resultados), 4)
+    assert [(r["fila"], r["error"]) for r in pendientes] == [(4, ERROR_CUPO_DIARIO)]
+
+
+def test_los_reintentos_no_gastan_cupo_diario():
+    with SumideroSmtp(rechazos_temporales=2) as sumidero:
+        despachador = _despachador(sumidero, maximo_diario=2)
+        resultados = despachador.enviar_todos(
+            preparar_mensajes(_correos(3), _pdf, "Área Judicial", "area@ejemplo.co")
+        )
+
+    assert [(r["fila"], r["enviado"], r["intentos"]) for r in resultados] == [(1, True, 3), (2, True, 1)]
+    assert despachador.limitador.usados == 2
+    assert sumidero.recibidos == 2
+
+
+def test_resultados_agrupados_por_fila():
+    resultados = [
+        {"fila": (1, 3), "enviado": True, "error": "", "intentos": 1, "segundos": 0.1},
+        {"fila": (2,), "enviado": False, "error": "x", "intentos": 0, "segundos": 0.0},
+    ]
+    por_fila = resultados_por_fila(resultados)
+    assert [(r["fila"], r["correo"]) for r in por_fila] == [(1, 1), (3, 1), (2, 2)]
+
+
+def test_errores_temporales():
+    assert es_error_temporal(smtplib.SMTPDataError(451, b"luego"))
+    assert not es_error_temporal(smtplib.SMTPDataError(550, b"no"))
+    assert es_error_temporal(smtplib.SMTPRecipientsRefused({"a@x.co": (450, b"luego")}))
+    assert not es_error_temporal(smtplib.SMTPRecipientsRefused({"a@x.co": (450, b""), "b@x.co": (550, b"")}))
+
+
+def test_limitador_frena_y_acelera_sin_pasar_los_limites():
+    limitador = LimitadorTasa(por_minuto=60)
+    for _ in range(10):
+        limitador.frenar()
+    assert limitador.tasa == limitador.tasa_minima
+    for _ in range(100):
+        limitador.acelerar()
+    assert limitador.tasa == limitador.tasa_objetivo
@@ -0,0 +1,45 @@
+import os
+
+from diario import ESTADO_OK, ETAPA_ENVIO, ETAPA_RENDER, DiarioTrabajos, ReanudacionRender, huella_configuracion
+
+
+def test_reanudacion_guarda_y_lee_documentos(tmp_path):
+    diario = DiarioTrabajos(str(tmp_path))
+    reanudacion = ReanudacionRender(diario, "render-prueba")
+    reanudacion.guardar("1", b"documento 1")
+
+    otra = ReanudacionRender(diario, "render-prueba")
+    assert otra.hecho("1") and not otra.hecho("2")
+    assert otra.leer("1") == b"documento 1"
+    diario.cerrar()
+
+
+def test_terminar_borra_las_copias_y_las_filas(tmp_path):
+    diario = DiarioTrabajos(str(tmp_path))
+    diario.iniciar("render-prueba", "render", 2)
+    reanudacion = ReanudacionRender(diario, "render-prueba")
+    reanudacion.guardar("1", b"documento 1")
+    reanudacion.guardar("2", b"documento 2")
+
+    reanudacion.terminar()
+
+    assert not os.path.exists(os.path.join(str(tmp_path), "render-prueba", "docs"))
+    assert diario.completadas("render-prueba", ETAPA_RENDER) == set()
+    assert ReanudacionRender(diario, "render-prueba").cantidad == 0
+    diario.cerrar()
+
+
+def test_descripcion_se_actualiza_al_reiniciar_el_trabajo(tmp_path):
+    diario = DiarioTrabajos(str(tmp_path))
+    assert diario.descripcion("envio-prueba") is None
+
+    diario.iniciar("envio-prueba", "envio", 2, huella_configuracion({"asunto": "Notificacon"}))
+    diario.registrar("envio-prueba", ETAPA_ENVIO, "1", ESTADO_OK)
+    corregida = huella_configuracion({"asunto": "Notificación"})
+    assert diario.descripcion("envio-prueba") != corregida
+
+    # Corregir el asunto no cambia el trabajo: lo ya enviado sigue registrado
+    diario.iniciar("envio-prueba", "envio", 2, corregida)
+    assert diario.descripcion("envio-prueba") == corregida
+    assert diario.completadas("envio-prueba", ETAPA_ENVIO) == {"1"}
+    diario.cerrar()
@@ -0,0 +1,88 @@
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("docxtpl")
+
+from cache_documentos import CacheDocumentos
+from diario import DiarioTrabajos, ReanudacionRender
+from generacion import ORIGEN_CACHE, ORIGEN_DIARIO, ORIGEN_RENDER, generar_documentos
+
+MAPEO = {"RADICADO": "RADICADO", "DEMANDADO": "DEMANDADO"}
+
+
+@pytest.fixture(scope="module")
+def plantilla_bytes():
+    from docx import Document
+
+    documento = Document()
+    documento.add_paragraph("Proceso {{RADICADO}}")
+    documento.add_paragraph("Contra {{DEMANDADO}}")
+    buffer = BytesIO()
+    documento.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "RADICADO": [f"2024-{i:05d}" for i in range(1, 8)],
+        "DEMANDADO": [f"Persona {i}" for i in range(1, 8)],
+    })
+
+
+def _generar(ruta, df, plantilla_bytes, **opciones):
+    nombres = [f"{radicado}.docx" for radicado in df["RADICADO"]]
+    with zipfile.ZipFile(ruta, "w") as zf:
+        resultados = generar_documentos(df, plantilla_bytes, MAPEO, nombres, zf, **opciones)
+    with zipfile.ZipFile(ruta) as zf:
+        entradas = [(nombre, zf.read(nombre)) for nombre in zf.namelist()]
+    return resultados, entradas
+
+
+def test_serial_y_pool_generan_el_mismo_zip(tmp_path, df, plantilla_bytes):
+    _, serial = _generar(str(tmp_path / "serial.zip"), df, plantilla_bytes, workers=1)
+    resultados, pool = _generar(str(tmp_path / "pool.zip"), df, plantilla_bytes, workers=2, tam_lote=2)
+
+    assert [nombre for nombre, _ in serial] == [f"{r}.docx" for r in df["RADICADO"]]
+    assert pool == serial
+    assert [r["fila"] for r in resultados] == list(range(1, len(df) + 1))
+    assert {r["origen"] for r in resultados} == {ORIGEN_RENDER}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_reanudar_toma_las_filas_hechas_del_diario(tmp_path, df, plantilla_bytes, workers):
+    _, completo = _generar(str(tmp_path / "completo.zip"), df, plantilla_bytes)
+
+    diario = DiarioTrabajos(str(tmp_path / "trabajos"))
+    # Corte después de las tres primeras filas
+    _generar(str(tmp_path / "corte.zip"), df.head(3), plantilla_bytes,
+             reanudacion=ReanudacionRender(diario, "render-prueba"))
+
+    resultados, reanudado = _generar(
+        str(tmp_path / "reanudado.zip"), df, plantilla_bytes, workers=workers, tam_lote=2,
+        reanudacion=ReanudacionRender(diario, "render-prueba")
+    )
+    diario.cerrar()
+
+    assert reanudado == completo
+    assert [r["origen"] for r in resultados] == [ORIGEN_DIARIO] * 3 + [ORIGEN_RENDER] * 4
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cache_reutiliza_los_documentos_sin_cambios(tmp_path, df, plantilla_bytes, workers):
+    cache = CacheDocumentos(str(tmp_path / "cache"))
+    _, primero = _generar(str(tmp_path / "primero.zip"), df, plantilla_bytes, cache=cache)
+
+    cambiado = df.copy()
+    cambiado.loc[4, "DEMANDADO"] = "Otra persona"
+    resultados, segundo = _generar(
+        str(tmp_path / "segundo.zip"), cambiado, plantilla_bytes, workers=workers, tam_lote=2, cache=cache
+    )
+    _, esperado = _generar(str(tmp_path / "esperado.zip"), cambiado, plantilla_bytes)
+
+    assert segundo == esperado
+    assert segundo[:4] == primero[:4]
+    assert [r["origen"] for r in resultados] == [ORIGEN_CACHE] * 4 + [ORIGEN_RENDER] + [ORIGEN_CACHE] * 2
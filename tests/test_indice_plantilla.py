@@ -0,0 +1,119 @@
+import re
+import zipfile
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("docxtpl")
+
+from indice_plantilla import indexar_plantilla
+
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_V = "urn:schemas-microsoft-com:vml"
+_TIPO_NOTAS = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+_REL_NOTAS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes"
+
+_CUADRO_DE_TEXTO = (
+    f'<w:r xmlns:w="{_W}" xmlns:v="{_V}"><w:pict><v:shape><v:textbox><w:txbxContent>'
+    "<w:p><w:r><w:t>Contra {{DEMANDADO}}</w:t></w:r></w:p>"
+    "</w:txbxContent></v:textbox></v:shape></w:pict></w:r>"
+)
+
+_NOTAS = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:footnotes xmlns:w="{_W}">'
+    '<w:footnote w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></w:footnote>'
+    '<w:footnote w:id="1"><w:p><w:r><w:t>Expediente {{EXPEDIENTE}}</w:t></w:r></w:p></w:footnote>'
+    "</w:footnotes>"
+)
+
+
+@pytest.fixture(scope="module")
+def plantilla_bytes():
+    from docx import Document
+    from docx.oxml import parse_xml
+
+    documento = Document()
+    seccion = documento.sections[0]
+    seccion.header.paragraphs[0].text = "{{JUZGADO}}"
+    seccion.footer.paragraphs[0].text = "{{CIUDAD}}, {{FECHA}}"
+
+    # Word partió la variable en dos runs
+    parrafo = documento.add_paragraph("Señor(a) ")
+    parrafo.add_run("{{NOM")
+    parrafo.add_run("BRE}}").bold = True
+
+    tabla = documento.add_table(rows=1, cols=2)
+    tabla.cell(0, 0).text = "Radicado"
+    tabla.cell(0, 1).text = "{{RADICADO}} / {{RADICADO}}"
+    documento.add_paragraph("Proceso {{RADICADO}}")
+
+    anclado = documento.add_paragraph("Anclado")
+    anclado._p.append(parse_xml(_CUADRO_DE_TEXTO))
+
+    buffer = BytesIO()
+    documento.save(buffer)
+
+    # Notas al pie: python-docx no las crea
+    with zipfile.ZipFile(BytesIO(buffer.getvalue())) as zf:
+        partes = {nombre: zf.read(nombre) for nombre in zf.namelist()}
+    partes["word/footnotes.xml"] = _NOTAS.encode("utf-8")
+    partes["[Content_Types].xml"] = partes["[Content_Types].xml"].replace(
+        b"</Types>",
+        f'<Override PartName="/word/footnotes.xml" ContentType="{_TIPO_NOTAS}"/></Types>'.encode("utf-8")
+    )
+    partes["word/_rels/document.xml.rels"] = partes["word/_rels/document.xml.rels"].replace(
+        b"</Relationships>",
+        f'<Relationship Id="rIdNotas" Type="{_REL_NOTAS}" Target="footnotes.xml"/></Relationships>'.encode("utf-8")
+    )
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for nombre, datos in partes.items():
+            zf.writestr(nombre, datos)
+    return buffer.getvalue()
+
+
+def test_ubicaciones_y_conteos(plantilla_bytes):
+    indice, error = indexar_plantilla(plantilla_bytes)
+    assert error is None
+
+    assert indice.placeholders == ["CIUDAD", "DEMANDADO", "EXPEDIENTE", "FECHA", "JUZGADO", "NOMBRE", "RADICADO"]
+    ubicaciones = {ph: info["ubicaciones"] for ph, info in indice.por_placeholder.items()}
+    assert ubicaciones == {
+        "JUZGADO": ["encabezado 1"],
+        "CIUDAD": ["pie de página 1"],
+        "FECHA": ["pie de página 1"],
+        "NOMBRE": ["cuerpo"],
+        "RADICADO": ["cuerpo · tabla 1", "cuerpo"],
+        "DEMANDADO": ["cuerpo · cuadro de texto"],
+        "EXPEDIENTE": ["notas al pie"],
+    }
+    assert indice.por_placeholder["RADICADO"]["veces"] == 3
+    assert len(indice.por_placeholder["RADICADO"]["parrafos"]) == 2
+    assert indice.sin_vincular({"NOMBRE": "NOMBRE", "RADICADO": "RADICADO"}) == [
+        "CIUDAD", "DEMANDADO", "EXPEDIENTE", "FECHA", "JUZGADO"
+    ]
+
+    textos = {p["texto"]: p for p in indice.parrafos}
+    # La variable partida en runs se lee completa
+    assert textos["Señor(a) {{NOMBRE}}"]["placeholders"] == ["NOMBRE"]
+    # El texto del cuadro no se mezcla con el párrafo donde está anclado
+    assert textos["Anclado"]["placeholders"] == []
+
+
+def test_la_previsualizacion_llena_las_mismas_variables_que_el_indice(plantilla_bytes):
+    from generacion import previsualizar_documento
+
+    indice, _ = indexar_plantilla(plantilla_bytes)
+    contexto = {ph: f"[[{ph}]]" for ph in indice.placeholders}
+    _, parrafos, error = previsualizar_documento(plantilla_bytes, contexto)
+    assert error is None
+
+    llenadas = {}
+    for ubicacion, texto in parrafos:
+        assert "{{" not in texto
+        for ph in re.findall(r"\[\[(\w+)\]\]", texto):
+            ubicaciones = llenadas.setdefault(ph, [])
+            if ubicacion not in ubicaciones:
+                ubicaciones.append(ubicacion)
+
+    assert llenadas == {ph: info["ubicaciones"] for ph, info in indice.por_placeholder.items()}
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from ingesta import columnas_requeridas, leer_base
+
+CSV = (
+    "RADICADO,JUZGADO,EMAIL\n"
+    "1,Juzgado 1,a@x.co\n"
+    "2,Juzgado 1,b@x.co\n"
+    "3,Juzgado 2,c@x.co\n"
+    "4,Juzgado 1,d@x.co\n"
+).encode("utf-8")
+
+
+def test_columnas_de_texto_repetidas_pasan_a_categoria():
+    df, info, error = leer_base(CSV, "base.csv")
+    assert error is None
+    assert isinstance(df["JUZGADO"].dtype, pd.CategoricalDtype)
+    assert not isinstance(df["EMAIL"].dtype, pd.CategoricalDtype)
+    assert df["ID_INTERNO"].tolist() == [1, 2, 3, 4]
+    assert info["filas"] == 4
+
+
+def test_leer_solo_columnas_usadas():
+    columnas = columnas_requeridas({"RAD": "RADICADO"}, "{{JUZGADO}}_{{RADICADO}}")
+    assert columnas == ["ID_INTERNO", "RADICADO", "JUZGADO"]
+    df, _, error = leer_base(CSV, "base.csv", columnas)
+    assert error is None
+    assert list(df.columns) == ["ID_INTERNO", "RADICADO", "JUZGADO"]
+
+
+def test_falta_el_paquete_del_formato(monkeypatch):
+    import ingesta
+
+    def sin_pyarrow(contenido, columnas):
+        raise ImportError("Missing optional dependency 'pyarrow'.")
+
+    monkeypatch.setattr(ingesta, "_leer_parquet", sin_pyarrow)
+    df, _, error = leer_base(b"PAR1", "base.parquet")
+    assert df is None
+    assert error == "Para leer archivos .parquet falta instalar el paquete pyarrow (pip install pyarrow)."
@@ -0,0 +1,102 @@
+import json
+import os
+import subprocess
+import sys
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("docxtpl")
+pytest.importorskip("fpdf")
+
+from tests.sumidero import SumideroSmtp
+
+LOTE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lote.py")
+
+
+@pytest.fixture
+def archivos(tmp_path):
+    from docx import Document
+
+    pd.DataFrame({
+        "RADICADO": [f"2024-{i:05d}" for i in range(1, 5)],
+        "DEMANDADO": ["Ana", "Luis", "Marta", "Pedro"],
+        "EMAIL": [f"juzgado{i}@ejemplo.co" for i in range(1, 5)],
+    }).to_csv(tmp_path / "base.csv", index=False)
+
+    documento = Document()
+    documento.add_paragraph("Proceso {{RADICADO}} contra {{DEMANDADO}}")
+    buffer = BytesIO()
+    documento.save(buffer)
+    (tmp_path / "plantilla.docx").write_bytes(buffer.getvalue())
+
+    def configuracion(asunto):
+        (tmp_path / "config.json").write_text(json.dumps({
+            "mapeo": {"RADICADO": "RADICADO", "DEMANDADO": "DEMANDADO"},
+            "regla_nombre": "{{RADICADO}}",
+            "correo": {"para": "{{EMAIL}}", "asunto": asunto, "cuerpo": "Proceso {{RADICADO}}"},
+        }), encoding="utf-8")
+
+    configuracion("Memorial {{RADICADO}}")
+    return tmp_path, configuracion
+
+
+def _correr(directorio, sumidero, maximo_diario=None):
+    (directorio / "perfil.json").write_text(json.dumps({
+        "host": "127.0.0.1",
+        "puerto": sumidero.puerto,
+        "cifrado": "ninguno",
+        "remitente_correo": "area@ejemplo.co",
+        "sesiones": 2,
+        "por_minuto": 60000,
+        "maximo_diario": maximo_diario,
+    }), encoding="utf-8")
+    entorno = dict(os.environ, GENERADOR_DIR_TRABAJOS=str(directorio / "trabajos"))
+    proceso = subprocess.run(
+        [
+            sys.executable, LOTE,
+            "--base", str(directorio / "base.csv"),
+            "--plantilla", str(directorio / "plantilla.docx"),
+            "--config", str(directorio / "config.json"),
+            "--salida", str(directorio / "salida"),
+            "--formato", "pdf",
+            "--workers", "1",
+            "--enviar",
+            "--smtp", str(directorio / "perfil.json"),
+        ],
+        cwd=str(directorio),
+        env=entorno,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    resultado = pd.read_csv(directorio / "salida" / "resultado_envio.csv")
+    return proceso.returncode, proceso.stdout, resultado
+
+
+def test_corrida_sin_navegador_se_reanuda_sin_repetir_correos(archivos):
+    directorio, configuracion = archivos
+    with SumideroSmtp() as sumidero:
+        # Primera corrida: el cupo diario corta el envío a la mitad
+        codigo, registro, resultado = _correr(directorio, sumidero, maximo_diario=2)
+        assert codigo == 1, registro
+        assert sumidero.recibidos == 2
+        assert resultado["enviado"].tolist() == [True, True, False, False]
+        assert "2 filas quedaron pendientes" in registro
+
+        # Se corrige el asunto antes de reanudar: el trabajo es el mismo
+        configuracion("Memorial del proceso {{RADICADO}}")
+        codigo, registro, resultado = _correr(directorio, sumidero)
+        assert codigo == 0, registro
+        assert sumidero.recibidos == 4
+        assert resultado["enviado"].all()
+        assert "2 correos ya se enviaron en una corrida anterior" in registro
+        assert "cambiaron desde esa corrida" in registro
+        assert "Enviando 2 filas" in registro
+
+        # Todo enviado: no se abre ninguna conexión
+        codigo, registro, _ = _correr(directorio, sumidero)
+        assert codigo == 0, registro
+        assert sumidero.recibidos == 4
+        assert "No hay filas pendientes de envío" in registro
@@ -0,0 +1,59 @@
+import json
+
+from medicion import Medidor
+
+
+def test_etapas_suman_tiempo_unidades_y_percentiles():
+    medidor = Medidor(max_filas_lentas=2)
+    medidor.sumar("① lectura de la base", 0.5, 100)
+    medidor.sumar("① lectura de la base", 0.25, 50)
+    for fila, segundos in enumerate([0.001, 0.002, 0.003, 0.100], start=1):
+        medidor.fila("④ generación: render", fila, segundos, bytes=10)
+
+    resumen = {etapa["etapa"]: etapa for etapa in medidor.resumen()}
+    lectura = resumen["① lectura de la base"]
+    assert lectura["segundos"] == 0.75 and lectura["unidades"] == 150
+    assert lectura["por_segundo"] == 200.0
+    assert lectura["p50_ms"] is None
+
+    render = resumen["④ generación: render"]
+    assert render["unidades"] == 4
+    assert render["p50_ms"] == 2.5
+    assert render["max_ms"] == 100.0
+
+    # Solo las `max_filas_lentas` más lentas, de mayor a menor
+    assert medidor.filas_lentas("④") == [
+        {"etapa": "④ generación: render", "fila": 4, "ms": 100.0, "bytes": 10},
+        {"etapa": "④ generación: render", "fila": 3, "ms": 3.0, "bytes": 10},
+    ]
+    assert [e["etapa"] for e in medidor.resumen("④")] == ["④ generación: render"]
+
+    medidor.reiniciar("④")
+    assert [e["etapa"] for e in medidor.resumen()] == ["① lectura de la base"]
+
+
+def test_etapa_como_contexto():
+    medidor = Medidor()
+    with medidor.etapa("⑥ envío: total", 3):
+        pass
+    etapa = medidor.resumen()[0]
+    assert etapa["etapa"] == "⑥ envío: total" and etapa["unidades"] == 3
+
+
+def test_escribe_una_linea_json_por_medicion(tmp_path):
+    ruta = tmp_path / "mediciones.jsonl"
+    medidor = Medidor(str(ruta))
+    medidor.sumar("① lectura de la base", 0.5, 100)
+    medidor.fila("⑥ envío: SMTP", 7, 0.2, intentos=2)
+    medidor.cerrar()
+    # Después de cerrar no se escribe nada más
+    medidor.sumar("① lectura de la base", 0.1, 1)
+
+    eventos = [json.loads(linea) for linea in ruta.read_text(encoding="utf-8").splitlines()]
+    assert [(e["tipo"], e["etapa"]) for e in eventos] == [
+        ("etapa", "① lectura de la base"),
+        ("fila", "⑥ envío: SMTP"),
+    ]
+    assert eventos[0]["unidades"] == 100 and eventos[0]["segundos"] == 0.5
+    assert eventos[1]["fila"] == 7 and eventos[1]["intentos"] == 2
+    assert all("ts" in e for e in eventos)
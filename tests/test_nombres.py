@@ -0,0 +1,31 @@
+import pandas as pd
+
+from nombres import ReglaNombre, con_extension, sanitizar_nombres
+
+
+def test_regla_con_mapeo_y_columnas_directas():
+    regla = ReglaNombre("Memorial_{{RAD}}_{{DEMANDADO}}_{{NO_EXISTE}}.docx", {"RAD": "RADICADO"}, ["RADICADO", "DEMANDADO"])
+    assert regla.columnas_necesarias == ["RADICADO", "DEMANDADO"]
+    assert regla.no_resolvibles == ["NO_EXISTE"]
+
+    textos = pd.DataFrame({"RADICADO": ["1", "2"], "DEMANDADO": ["Pérez", "Gómez"]})
+    nombres, duplicados = regla.evaluar(textos)
+    assert nombres == ["Memorial_1_Pérez_", "Memorial_2_Gómez_"]
+    assert duplicados == {}
+    assert con_extension(nombres, ".pdf")[0] == "Memorial_1_Pérez_.pdf"
+
+
+def test_sanitiza_y_usa_consecutivo_si_queda_vacio():
+    assert sanitizar_nombres(pd.Series(['a/b:c*d. ', ' x?.'])).tolist() == ["a_b_c_d", "x_"]
+
+    regla = ReglaNombre("{{NOMBRE}}", {}, ["NOMBRE"])
+    nombres, _ = regla.evaluar(pd.DataFrame({"NOMBRE": ["", "...", "ok.docx"]}))
+    assert nombres == ["documento_1", "documento_2", "ok"]
+
+
+def test_duplicados_sin_distinguir_mayusculas():
+    regla = ReglaNombre("{{NOMBRE}}", {}, ["NOMBRE"])
+    nombres, duplicados = regla.evaluar(pd.DataFrame({"NOMBRE": ["Acta", "ACTA", "acta_2", "Acta"]}))
+    assert len({n.lower() for n in nombres}) == 4
+    assert nombres[:2] == ["Acta", "ACTA_2"]
+    assert duplicados == {"Acta": 3}
@@ -0,0 +1,74 @@
+import os
+import zipfile
+
+import pandas as pd
+
+from particiones import SIN_GRUPO, SalidaParticionada, grupos_por_nombre
+
+
+def _contenido(ruta):
+    with zipfile.ZipFile(ruta) as zf:
+        return {nombre: zf.read(nombre) for nombre in zf.namelist()}
+
+
+def test_sin_limites_un_solo_zip(tmp_path):
+    salida = SalidaParticionada(str(tmp_path), "docs", ".docx")
+    salida.writestr("a.docx", b"a")
+    salida.writestr("b.docx", b"b")
+    partes = salida.cerrar()
+
+    assert [parte["nombre"] for parte in partes] == ["docs.docx.zip"]
+    assert _contenido(partes[0]["ruta"]) == {"a.docx": b"a", "b.docx": b"b"}
+    assert not any(nombre.endswith(".parcial") for nombre in os.listdir(tmp_path))
+
+
+def test_parte_por_cantidad_y_por_tamano(tmp_path):
+    por_cantidad = SalidaParticionada(str(tmp_path / "cantidad"), "docs", max_documentos=2)
+    os.makedirs(por_cantidad.directorio)
+    for i in range(5):
+        por_cantidad.writestr(f"{i}.pdf", b"x")
+    assert [parte["documentos"] for parte in por_cantidad.cerrar()] == [2, 2, 1]
+
+    por_tamano = SalidaParticionada(str(tmp_path / "tamano"), "docs", max_mb=1)
+    os.makedirs(por_tamano.directorio)
+    mitad = b"x" * (600 * 1024)
+    for i in range(3):
+        por_tamano.writestr(f"{i}.pdf", mitad)
+    partes = por_tamano.cerrar()
+    assert [parte["documentos"] for parte in partes] == [1, 1, 1]
+    assert partes[0]["nombre"] == "docs_parte001.zip"
+
+
+def test_grupos_cierran_cada_zip_al_completarse(tmp_path):
+    nombres = ["1.pdf", "2.pdf", "3.pdf"]
+    grupos = grupos_por_nombre(nombres, pd.Series(["Juzgado 1", "", "Juzgado 1"]))
+    assert grupos["2.pdf"] == SIN_GRUPO
+
+    completadas = []
+    salida = SalidaParticionada(
+        str(tmp_path), "docs", ".pdf", grupo_por_nombre=grupos, al_completar=completadas.append
+    )
+    salida.writestr("1.pdf", b"1")
+    salida.writestr("2.pdf", b"2")
+    assert [parte["grupo"] for parte in completadas] == [SIN_GRUPO]
+    salida.writestr("3.pdf", b"3")
+    salida.cerrar()
+
+    assert salida.parte_de["3.pdf"] == "docs_Juzgado 1.pdf.zip"
+    assert _contenido(os.path.join(str(tmp_path), "docs_Juzgado 1.pdf.zip")) == {"1.pdf": b"1", "3.pdf": b"3"}
+
+
+def test_muchos_grupos_sin_pasar_del_limite_de_archivos_abiertos(tmp_path):
+    # Base sin ordenar: cada grupo recibe documentos intercalados con los demás
+    nombres = [f"{fila}.pdf" for fila in range(300)]
+    grupo_por_nombre = {nombre: f"g{fila % 100}" for fila, nombre in enumerate(nombres)}
+    salida = SalidaParticionada(str(tmp_path), "docs", grupo_por_nombre=grupo_por_nombre, max_abiertos=4)
+    for nombre in nombres:
+        salida.writestr(nombre, nombre.encode())
+        assert sum(parte["zf"] is not None for parte in salida._abiertas.values()) <= 4
+    partes = salida.cerrar()
+
+    assert len(partes) == 100
+    assert _contenido(os.path.join(str(tmp_path), "docs_g7.zip")) == {
+        "7.pdf": b"7.pdf", "107.pdf": b"107.pdf", "207.pdf": b"207.pdf"
+    }
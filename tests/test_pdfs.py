@@ -0,0 +1,92 @@
+import unicodedata
+import zipfile
+from io import BytesIO
+
+from pdfs import ESTADO_AMBIGUO, ESTADO_ENCONTRADO, ESTADO_NO_ENCONTRADO, IndicePdfs, clave_normalizada
+
+
+def _zip(archivos):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for nombre, datos in archivos.items():
+            zf.writestr(nombre, datos)
+    return buffer.getvalue()
+
+
+def test_obtener_por_fila_con_el_nombre_esperado():
+    indice = IndicePdfs(_zip({"salida/1.pdf": b"uno", "2.pdf": b"dos", "salida/": b""}))
+    indice.asociar([
+        {"fila": 1, "nombre_esperado": "1.pdf", "archivo_zip": "salida/1.pdf", "encontrado": True},
+        {"fila": 2, "nombre_esperado": "2.pdf", "encontrado": True},
+        {"fila": 3, "nombre_esperado": "3.pdf", "encontrado": False},
+    ])
+
+    assert indice.obtener(1) == ("1.pdf", b"uno", True)
+    assert indice.obtener(2) == ("2.pdf", b"dos", True)
+    assert indice.obtener(3) == (None, None, False)
+    # Fila que no está en el mapping
+    assert indice.obtener(99) == (None, None, False)
+    indice.cerrar()
+
+
+def test_archivo_que_no_esta_en_el_zip():
+    indice = IndicePdfs(_zip({"1.pdf": b"uno"}))
+    indice.asociar([{"fila": 1, "nombre_esperado": "otro.pdf", "encontrado": True}])
+    assert indice.obtener(1) == ("otro.pdf", None, False)
+    indice.cerrar()
+
+
+def test_varias_partes_del_zip_generado(tmp_path):
+    rutas = []
+    for parte, archivos in enumerate([{"1.pdf": b"uno"}, {"2.pdf": b"dos"}], start=1):
+        ruta = tmp_path / f"parte_{parte}.zip"
+        ruta.write_bytes(_zip(archivos))
+        rutas.append(str(ruta))
+
+    indice = IndicePdfs(rutas)
+    pdf_mapping, sobrantes = indice.emparejar(["1.pdf", "2.pdf"])
+    indice.asociar(pdf_mapping)
+
+    assert [item["estado"] for item in pdf_mapping] == [ESTADO_ENCONTRADO] * 2
+    assert sobrantes == []
+    assert indice.obtener(2) == ("2.pdf", b"dos", True)
+    assert indice.tamanos() == {"1.pdf": 3, "2.pdf": 3}
+    indice.cerrar()
+
+
+def test_emparejar_ignora_carpetas_tildes_y_mayusculas():
+    nfd = unicodedata.normalize("NFD", "Peña Muñoz.pdf")
+    indice = IndicePdfs(_zip({
+        f"convertidos/{nfd}": b"nfd",
+        "convertidos/sub/RADICADO 2024.PDF": b"mayusculas",
+        "__MACOSX/convertidos/._1.pdf": b"metadatos",
+    }))
+    pdf_mapping, sobrantes = indice.emparejar(["Peña Muñoz.pdf", "radicado  2024.pdf", "1.pdf"])
+    indice.asociar(pdf_mapping)
+
+    assert [(item["archivo_zip"], item["estado"]) for item in pdf_mapping] == [
+        (f"convertidos/{nfd}", ESTADO_ENCONTRADO),
+        ("convertidos/sub/RADICADO 2024.PDF", ESTADO_ENCONTRADO),
+        (None, ESTADO_NO_ENCONTRADO),
+    ]
+    assert sobrantes == []
+    # El adjunto lleva el nombre esperado, no la ruta del ZIP
+    assert indice.obtener(1) == ("Peña Muñoz.pdf", b"nfd", True)
+    assert clave_normalizada(nfd) == clave_normalizada("PEÑA MUÑOZ.pdf")
+    indice.cerrar()
+
+
+def test_nombres_repetidos_son_ambiguos():
+    indice = IndicePdfs(_zip({"a/1.pdf": b"a", "b/1.pdf": b"b", "2.pdf": b"dos", "Doc.pdf": b"doc"}))
+    pdf_mapping, sobrantes = indice.emparejar(["1.pdf", "2.pdf", "doc.pdf", "DOC.pdf"])
+
+    # Dos archivos con la misma clave y ninguno coincide exacto
+    assert pdf_mapping[0]["estado"] == ESTADO_AMBIGUO and not pdf_mapping[0]["encontrado"]
+    assert pdf_mapping[1]["estado"] == ESTADO_ENCONTRADO
+    # Dos filas esperan el mismo archivo: no se adjunta a ninguna de las dos
+    assert [item["estado"] for item in pdf_mapping[2:]] == [ESTADO_AMBIGUO, ESTADO_AMBIGUO]
+    assert sorted(sobrantes) == ["Doc.pdf", "a/1.pdf", "b/1.pdf"]
+
+    # Si uno de los repetidos coincide exacto, ese es el archivo
+    assert indice.buscar("a/1.pdf") == ("a/1.pdf", ESTADO_ENCONTRADO)
+    indice.cerrar()
@@ -0,0 +1,142 @@
+import base64
+import re
+import zipfile
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("docxtpl")
+
+from plantilla import PlantillaCompilada
+
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_TIPO_NOTAS = "application/vnd.openxmlformats-officedocument.wordprocessingml.{}+xml"
+_REL_NOTAS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/{}"
+
+
+def _notas_xml(raiz, etiqueta, texto):
+    return (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<w:{raiz} xmlns:w="{_W}">'
+        f'<w:{etiqueta} w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></w:{etiqueta}>'
+        f'<w:{etiqueta} w:type="continuationSeparator" w:id="0"><w:p><w:r><w:continuationSeparator/></w:r></w:p></w:{etiqueta}>'
+        f'<w:{etiqueta} w:id="1"><w:p><w:r><w:t>{texto}</w:t></w:r></w:p></w:{etiqueta}>'
+        f'</w:{raiz}>'
+    )
+
+
+def _plantilla_con_notas():
+    from docx import Document
+
+    documento = Document()
+    documento.add_paragraph("Proceso {{RADICADO}}")
+    buffer = BytesIO()
+    documento.save(buffer)
+
+    partes = {}
+    with zipfile.ZipFile(BytesIO(buffer.getvalue())) as zf:
+        for nombre in zf.namelist():
+            partes[nombre] = zf.read(nombre)
+
+    partes["word/footnotes.xml"] = _notas_xml("footnotes", "footnote", "Nota {{RADICADO}}").encode("utf-8")
+    partes["word/endnotes.xml"] = _notas_xml("endnotes", "endnote", "Final {{DEMANDADO}}").encode("utf-8")
+    tipos = partes["[Content_Types].xml"].decode("utf-8")
+    partes["[Content_Types].xml"] = tipos.replace(
+        "</Types>",
+        f'<Override PartName="/word/footnotes.xml" ContentType="{_TIPO_NOTAS.format("footnotes")}"/>'
+        f'<Override PartName="/word/endnotes.xml" ContentType="{_TIPO_NOTAS.format("endnotes")}"/>'
+        "</Types>"
+    ).encode("utf-8")
+    relaciones = partes["word/_rels/document.xml.rels"].decode("utf-8")
+    partes["word/_rels/document.xml.rels"] = relaciones.replace(
+        "</Relationships>",
+        f'<Relationship Id="rIdNotas1" Type="{_REL_NOTAS.format("footnotes")}" Target="footnotes.xml"/>'
+        f'<Relationship Id="rIdNotas2" Type="{_REL_NOTAS.format("endnotes")}" Target="endnotes.xml"/>'
+        "</Relationships>"
+    ).encode("utf-8")
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for nombre, datos in partes.items():
+            zf.writestr(nombre, datos)
+    return buffer.getvalue()
+
+
+def _textos(docx_bytes, nombre):
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as zf:
+        xml = zf.read(nombre).decode("utf-8")
+    return re.findall(r"<w:t(?: [^>]*)?>([^<]*)</w:t>", xml)
+
+
+def _render_docxtpl(plantilla_bytes, contexto):
+    from docxtpl import DocxTemplate
+
+    tpl = DocxTemplate(BytesIO(plantilla_bytes))
+    tpl.render(contexto)
+    buffer = BytesIO()
+    tpl.save(buffer)
+    return buffer.getvalue()
+
+
+CONTEXTO = {"RADICADO": "123", "DEMANDADO": "Pérez"}
+
+
+def test_cuerpo_y_notas_al_pie_iguales_que_docxtpl():
+    plantilla_bytes = _plantilla_con_notas()
+    compilada = PlantillaCompilada(plantilla_bytes).renderizar(CONTEXTO)
+    referencia = _render_docxtpl(plantilla_bytes, CONTEXTO)
+
+    for parte in ("word/document.xml", "word/footnotes.xml"):
+        assert _textos(compilada, parte) == _textos(referencia, parte)
+    assert "Nota 123" in _textos(compilada, "word/footnotes.xml")
+
+
+def test_notas_al_final_renderizadas():
+    compilada = PlantillaCompilada(_plantilla_con_notas()).renderizar(CONTEXTO)
+    assert "Final Pérez" in _textos(compilada, "word/endnotes.xml")
+
+
+def test_reutiliza_la_plantilla_entre_filas():
+    plantilla = PlantillaCompilada(_plantilla_con_notas())
+    plantilla.renderizar(CONTEXTO)
+    segunda = plantilla.renderizar({"RADICADO": "456", "DEMANDADO": "Gómez"})
+    assert _textos(segunda, "word/footnotes.xml")[-1] == "Nota 456"
+    assert _textos(segunda, "word/document.xml") == ["Proceso 456"]
+
+
+# PNG de 1x1 para que el documento tenga w:drawing con wp:docPr
+_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+def _plantilla_con_imagenes():
+    from docx import Document
+
+    documento = Document()
+    documento.add_paragraph("Proceso {{RADICADO}}")
+    documento.add_picture(BytesIO(_PNG))
+    documento.add_picture(BytesIO(_PNG))
+    buffer = BytesIO()
+    documento.save(buffer)
+    return buffer.getvalue()
+
+
+def _ids_docpr(docx_bytes):
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as zf:
+        xml = zf.read("word/document.xml").decode("utf-8")
+    return re.findall(r'<wp:docPr id="(\d+)"', xml)
+
+
+def test_ids_de_imagenes_iguales_en_renders_concurrentes():
+    from concurrent.futures import ThreadPoolExecutor
+
+    plantilla_bytes = _plantilla_con_imagenes()
+    plantilla = PlantillaCompilada(plantilla_bytes)
+    referencia = _render_docxtpl(plantilla_bytes, CONTEXTO)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        renders = list(pool.map(lambda _: plantilla.renderizar(CONTEXTO), range(64)))
+
+    assert _ids_docpr(renders[0]) == _ids_docpr(referencia) == ["1001", "1002"]
+    assert all(render == renders[0] for render in renders)
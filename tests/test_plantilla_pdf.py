@@ -0,0 +1,37 @@
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("fpdf")
+pytest.importorskip("docx")
+
+from plantilla_pdf import PlantillaPdf
+
+
+def _plantilla(*parrafos):
+    from docx import Document
+
+    documento = Document()
+    for texto in parrafos:
+        documento.add_paragraph(texto)
+    buffer = BytesIO()
+    documento.save(buffer)
+    return buffer.getvalue()
+
+
+def test_variables_sin_valor_quedan_vacias_como_en_el_docx(monkeypatch):
+    from fpdf import FPDF
+
+    escritos = []
+    original = FPDF.multi_cell
+
+    def multi_cell(self, w, h, text, *args, **kwargs):
+        escritos.append(text)
+        return original(self, w, h, text, *args, **kwargs)
+
+    monkeypatch.setattr(FPDF, "multi_cell", multi_cell)
+    plantilla = PlantillaPdf(_plantilla("Proceso {{RADICADO}} contra {{DEMANDADO}}", "{{SIN_VINCULAR}}"))
+    pdf = plantilla.renderizar({"RADICADO": "123"})
+
+    assert pdf.startswith(b"%PDF")
+    assert escritos == ["Proceso 123 contra "]
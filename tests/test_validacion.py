@@ -0,0 +1,63 @@
+import pandas as pd
+
+from validacion import (
+    PROBLEMA_CORREO_INVALIDO,
+    PROBLEMA_DUPLICADO,
+    PROBLEMA_PDF_GRANDE,
+    PROBLEMA_PDF_VACIO,
+    PROBLEMA_SIN_PARA,
+    PROBLEMA_SIN_PDF,
+    limite_mensaje_sugerido,
+    resumen_validacion,
+    validar_envio,
+)
+
+
+def _correos(para, cc=None):
+    return pd.DataFrame({
+        "para": para,
+        "cc": cc or [""] * len(para),
+        "bcc": [""] * len(para),
+    })
+
+
+def test_filas_sin_problemas():
+    correos = _correos(["a@x.co", "Juzgado <b@x.co>"])
+    mapping = [(1, "1.pdf", True), (2, "2.pdf", True)]
+    reporte = validar_envio(correos, mapping, {"1.pdf": 1024, "2.pdf": 2048}, 25)
+
+    assert reporte["ok"].all()
+    assert reporte["pdf_kb"].tolist() == [1.0, 2.0]
+    assert set(resumen_validacion(reporte).values()) == {0}
+
+
+def test_detecta_cada_problema():
+    correos = _correos(
+        ["a@x.co", "", "malo@", "d@x.co", "e@x.co", "e@x.co"],
+        cc=["", "c@x.co", "", "", "", ""]
+    )
+    mapping = [
+        (1, "1.pdf", True),
+        (2, "2.pdf", True),
+        (3, "", False),
+        (4, "4.pdf", True),
+        (5, "5.pdf", True),
+        (6, "5.pdf", True),
+    ]
+    tamanos = {"1.pdf": 30 * 1024 * 1024, "2.pdf": 10, "4.pdf": 0, "5.pdf": 10}
+    reporte = validar_envio(correos, mapping, tamanos, 25).set_index("fila")
+
+    assert reporte.loc[1, PROBLEMA_PDF_GRANDE]
+    assert reporte.loc[2, PROBLEMA_SIN_PARA]
+    assert reporte.loc[3, PROBLEMA_CORREO_INVALIDO] and reporte.loc[3, "correos_invalidos"] == "malo@"
+    assert reporte.loc[3, PROBLEMA_SIN_PDF]
+    assert reporte.loc[4, PROBLEMA_PDF_VACIO]
+    assert reporte.loc[5, PROBLEMA_DUPLICADO] and reporte.loc[6, PROBLEMA_DUPLICADO]
+    assert not reporte["ok"].any()
+    assert reporte.loc[3, "problemas"] == f"{PROBLEMA_CORREO_INVALIDO}; {PROBLEMA_SIN_PDF}"
+
+
+def test_limite_por_proveedor():
+    assert limite_mensaje_sugerido(" SMTP.gmail.com ") == 25
+    assert limite_mensaje_sugerido("smtp.office365.com") == 35
+    assert limite_mensaje_sugerido("relay.interno") == 25
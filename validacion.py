@@ -0,0 +1,122 @@
+import pandas as pd
+
+# ------------------------
+# Validación de toda la base antes del envío masivo
+# ------------------------
+# Revisa todas las filas de una vez, con operaciones sobre columnas completas
+# (sin un bucle por fila): direcciones de Para / CC / BCC ya renderizadas, filas
+# sin destinatarios, PDF faltantes, vacíos o más grandes de lo que acepta el
+# proveedor, y el mismo destinatario recibiendo el mismo adjunto en dos filas.
+# El resultado es un reporte con una fila por registro para descargar.
+
+# Tamaño máximo de mensaje por proveedor (MB). El adjunto viaja en base64, que
+# ocupa 4/3 del tamaño del PDF.
+LIMITE_MENSAJE_MB_PROVEEDOR = {
+    "smtp.gmail.com": 25,
+    "smtp.office365.com": 35,
+    "smtp-mail.outlook.com": 20,
+}
+
+LIMITE_MENSAJE_MB_POR_DEFECTO = 25
+
+_CRECIMIENTO_BASE64 = 4 / 3
+
+# Sintaxis práctica: algo@dominio.tld, sin espacios ni separadores
+_PATRON_CORREO = r"[^@\s,;<>\"]+@[^@\s,;<>\"]+\.[^@\s,;<>\".]+"
+
+PROBLEMA_SIN_PARA = "sin destinatarios en Para"
+PROBLEMA_CORREO_INVALIDO = "correo con formato inválido"
+PROBLEMA_SIN_PDF = "sin PDF (no encontrado o ambiguo)"
+PROBLEMA_PDF_VACIO = "PDF vacío (0 bytes)"
+PROBLEMA_PDF_GRANDE = "adjunto más grande que el límite del proveedor"
+PROBLEMA_DUPLICADO = "mismo destinatario y adjunto que otra fila"
+
+PROBLEMAS = [
+    PROBLEMA_SIN_PARA,
+    PROBLEMA_CORREO_INVALIDO,
+    PROBLEMA_SIN_PDF,
+    PROBLEMA_PDF_VACIO,
+    PROBLEMA_PDF_GRANDE,
+    PROBLEMA_DUPLICADO,
+]
+
+
+def limite_mensaje_sugerido(host):
+    return LIMITE_MENSAJE_MB_PROVEEDOR.get((host or "").strip().lower(), LIMITE_MENSAJE_MB_POR_DEFECTO)
+
+
+def _direcciones(correos, campos):
+    # Una fila por dirección: fila (1..n), campo y dirección; igual que
+    # procesar_lista_correos, separadas por coma y sin vacías
+    partes = []
+    for campo in campos:
+        serie = correos[campo].astype(str).str.split(",").explode().str.strip()
+        serie = serie[serie != ""]
+        partes.append(pd.DataFrame({"fila": serie.index, "campo": campo, "direccion": serie.to_numpy()}))
+    direcciones = pd.concat(partes, ignore_index=True)
+
+    # "Nombre <correo@dominio>" -> correo@dominio
+    con_nombre = direcciones["direccion"].str.extract(r"<([^<>]*)>\s*$", expand=False)
+    direcciones["correo"] = con_nombre.fillna(direcciones["direccion"]).str.strip().str.lower()
+    direcciones["valido"] = direcciones["correo"].str.fullmatch(_PATRON_CORREO)
+    return direcciones
+
+
+def validar_envio(correos, pdf_mapping, tamanos_pdf, limite_mensaje_mb=LIMITE_MENSAJE_MB_POR_DEFECTO):
+    # correos: DataFrame de correo.renderizar_correos (una fila por registro, en orden).
+    # pdf_mapping: el del paso ⑤; tamanos_pdf: archivo del ZIP -> bytes.
+    # Devuelve el reporte: una fila por registro con una columna booleana por
+    # problema y un texto con todos los problemas de la fila.
+    correos = correos.reset_index(drop=True)
+    correos.index = correos.index + 1
+
+    reporte = pd.DataFrame({
+        "fila": correos.index,
+        "para": correos["para"].to_numpy(),
+        "cc": correos["cc"].to_numpy(),
+        "bcc": correos["bcc"].to_numpy(),
+    }, index=correos.index)
+
+    # ---- Destinatarios ----
+    direcciones = _direcciones(correos, ["para", "cc", "bcc"])
+    con_para = direcciones.loc[direcciones["campo"] == "para", "fila"].unique()
+    reporte[PROBLEMA_SIN_PARA] = ~reporte["fila"].isin(con_para)
+
+    invalidas = direcciones[~direcciones["valido"]]
+    reporte["correos_invalidos"] = invalidas.groupby("fila")["direccion"].agg(", ".join).reindex(
+        reporte.index, fill_value=""
+    )
+    reporte[PROBLEMA_CORREO_INVALIDO] = reporte["correos_invalidos"] != ""
+
+    # ---- Adjuntos ----
+    mapping = pd.DataFrame(pdf_mapping, columns=["fila", "archivo_zip", "encontrado"]).set_index("fila")
+    mapping = mapping.reindex(reporte.index)
+    reporte["pdf"] = mapping["archivo_zip"].fillna("")
+    encontrado = mapping["encontrado"].fillna(False).astype(bool)
+    tamano = mapping["archivo_zip"].map(tamanos_pdf)
+    reporte["pdf_kb"] = (tamano / 1024).round(1)
+
+    reporte[PROBLEMA_SIN_PDF] = ~encontrado
+    reporte[PROBLEMA_PDF_VACIO] = encontrado & (tamano == 0)
+    limite_bytes = limite_mensaje_mb * 1024 * 1024
+    reporte[PROBLEMA_PDF_GRANDE] = encontrado & (tamano * _CRECIMIENTO_BASE64 > limite_bytes)
+
+    # ---- Mismo destinatario + mismo adjunto en filas distintas ----
+    pares = direcciones[["fila", "correo"]].drop_duplicates()
+    pares = pares.assign(pdf=reporte["pdf"].reindex(pares["fila"]).to_numpy())
+    pares = pares[pares["pdf"] != ""]
+    repetidas = pares.loc[pares.duplicated(["correo", "pdf"], keep=False), "fila"].unique()
+    reporte[PROBLEMA_DUPLICADO] = reporte["fila"].isin(repetidas)
+
+    # ---- Texto con todos los problemas de la fila ----
+    problemas = pd.Series("", index=reporte.index, dtype=object)
+    for problema in PROBLEMAS:
+        problemas = problemas + reporte[problema].map({True: problema + "; ", False: ""})
+    reporte["problemas"] = problemas.str.rstrip("; ")
+    reporte["ok"] = reporte["problemas"] == ""
+    return reporte
+
+
+def resumen_validacion(reporte):
+    # problema -> cantidad de filas afectadas
+    return {problema: int(reporte[problema].sum()) for problema in PROBLEMAS}